@@ -0,0 +1,67 @@
+"""近似检索基准：IVFIndex在不同nprobe下的recall@k与QPS，对比精确检索
+
+用法: python benchmarks/bench_ann.py [--size 200000] [--dim 256] [--nprobe 1,4,8,16,32,64]
+
+数据为带噪声的高斯混合（模拟真实语料中的主题聚类），查询取自同一分布。
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import BACKEND_DIR  # noqa: F401  确保backend在sys.path中
+
+from vector_index import IVFIndex, VectorIndex
+
+
+def clustered_vectors(size: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+
+
+def run_queries(search, queries: np.ndarray, k: int) -> tuple:
+    start = time.perf_counter()
+    results = [search(query, k) for query in queries]
+    qps = len(queries) / (time.perf_counter() - start)
+    return results, qps
+
+
+def recall(approx: list, exact: list) -> float:
+    hits = sum(len({i for i, _ in a} & {i for i, _ in e}) for a, e in zip(approx, exact))
+    return hits / sum(len(e) for e in exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.size + args.queries, args.dim, 1000, rng)
+    data, queries = vectors[:args.size], vectors[args.size:]
+    ids = range(args.size)
+    categories = ["c"] * args.size
+
+    exact_index = VectorIndex(args.dim, initial_capacity=args.size)
+    exact_index.add(ids, categories, data)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.train(data, args.nlist)
+    ivf.add(ids, categories, data)
+    print(f"{args.size} x {args.dim}: IVF nlist={ivf.nlist}, train+add {time.perf_counter() - start:.1f}s")
+
+    exact, exact_qps = run_queries(exact_index.search, queries, args.k)
+    print(f"{'exact':>12}: recall@{args.k}=1.000  {exact_qps:8.1f} QPS")
+    for nprobe in (int(n) for n in args.nprobe.split(",")):
+        approx, qps = run_queries(lambda q, k: ivf.search(q, k, nprobe=nprobe), queries, args.k)
+        print(f"{'nprobe=' + str(nprobe):>12}: recall@{args.k}={recall(approx, exact):.3f}  {qps:8.1f} QPS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""爬虫HTTP会话基准：每个请求新建ClientSession vs 共享连接池会话
+
+用法: python benchmarks/bench_crawl_session.py [--requests 500] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from common import ServerThread, summarize
+from fakes import fake_site_app
+
+from crawler import create_session
+
+
+async def _drive(fetch, base_url: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(f"{base_url}/page/{i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed_s": round(elapsed, 3), "throughput_rps": round(total / elapsed, 1), **summarize(latencies)}
+
+
+async def bench_per_request(base_url: str, total: int, concurrency: int) -> dict:
+    async def fetch(url):
+        # 旧版 /crawl 的做法：每次请求一个新会话和新连接器
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, timeout=30) as response:
+                return await response.read()
+
+    return await _drive(fetch, base_url, total, concurrency)
+
+
+async def bench_shared(base_url: str, total: int, concurrency: int) -> dict:
+    session = create_session()
+
+    async def fetch(url):
+        async with session.get(url) as response:
+            return await response.read()
+
+    try:
+        return await _drive(fetch, base_url, total, concurrency)
+    finally:
+        await session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    with ServerThread(fake_site_app()) as server:
+        results = {
+            "per-request": asyncio.run(bench_per_request(server.url, args.requests, args.concurrency)),
+            "shared": asyncio.run(bench_shared(server.url, args.requests, args.concurrency)),
+        }
+
+    for mode, r in results.items():
+        print(f"{mode:>11}: {r['throughput_rps']} req/s, p50={r['p50_ms']}ms p99={r['p99_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""SQLite写入吞吐基准：旧版逐行插入+逐条提交 vs WAL+executemany+显式事务
+
+用法: python benchmarks/bench_db_write.py [--pages 500] [--items 20] [--dim 1024] [--readers 2]
+
+每个页面写入一条pages记录和items条带向量的知识项。旧版写法在基准内按原实现复现
+（默认rollback日志、synchronous=FULL、每条execute、每次调用提交）；
+新版使用DBManager.store_pages/store_knowledge，并可在写入期间开几个读线程测量读延迟。
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from common import summarize
+
+from db_manager import DBManager
+
+
+def _dataset(pages: int, items: int, dim: int):
+    rng = np.random.default_rng(0)
+    for p in range(pages):
+        knowledge = {f"类别{c}": [f"第{p}页第{c}类的第{i}条知识" for i in range(items // 4)] for c in range(4)}
+        vectors = {category: rng.standard_normal((len(values), dim)).tolist()
+                   for category, values in knowledge.items()}
+        yield (f"https://example.com/{p}", f"页面{p}", "正文" * 200), knowledge, vectors
+
+
+def bench_legacy(path: str, data: list) -> float:
+    db = DBManager(path)
+    db.close()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("PRAGMA synchronous=FULL")
+    start = time.perf_counter()
+    for page, knowledge, vectors in data:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO pages (url, title, content) VALUES (?, ?, ?)", page)
+        conn.commit()
+        page_id = cursor.lastrowid
+        for category, items in knowledge.items():
+            for idx, content in enumerate(items):
+                blob = np.array(vectors[category][idx]).tobytes()
+                cursor.execute(
+                    "INSERT INTO knowledge_items (page_id, category, content, vector) VALUES (?, ?, ?, ?)",
+                    (page_id, category, content, blob)
+                )
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def bench_bulk(path: str, data: list, readers: int) -> tuple:
+    db = DBManager(path)
+    stop = threading.Event()
+    latencies = []
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            db.conn.execute("SELECT COUNT(*) FROM knowledge_items WHERE category = ?", ("类别1",)).fetchone()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for page, knowledge, vectors in data:
+        with db.transaction():
+            (page_id,) = db.store_pages([page])
+            db.store_knowledge(page_id, knowledge, vectors)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+
+    data = list(_dataset(args.pages, args.items, args.dim))
+    rows = sum(1 + sum(len(v) for v in knowledge.values()) for _, knowledge, _ in data)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = bench_legacy(os.path.join(tmp, "legacy.db"), data)
+        bulk, latencies = bench_bulk(os.path.join(tmp, "bulk.db"), data, args.readers)
+        sizes = {name: os.path.getsize(os.path.join(tmp, f"{name}.db")) for name in ("legacy", "bulk")}
+
+    print(f"legacy: {legacy:.2f}s, {rows / legacy:.0f} rows/s, db size {sizes['legacy'] / 1e6:.1f} MB")
+    print(f"  bulk: {bulk:.2f}s, {rows / bulk:.0f} rows/s, db size {sizes['bulk'] / 1e6:.1f} MB, "
+          f"concurrent read latency {summarize(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""近似重复查找的延迟基准：分段索引的查找耗时不随页面数线性增长
+
+用法: python benchmarks/bench_dedup.py [--sizes 10000,100000] [--queries 500]
+
+向临时数据库写入随机指纹的页面，然后用"某个已有指纹翻转若干位"作为查询，
+统计find_near_duplicate的延迟和召回（距离不超过3时应全部找到）。
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import summarize
+
+from db_manager import DBManager
+from simhash import SIMHASH_BITS, to_signed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBManager(os.path.join(tmp, "bench.db"))
+            fingerprints = [to_signed(rng.getrandbits(SIMHASH_BITS)) for _ in range(size)]
+            start = time.perf_counter()
+            with db.transaction():
+                for i, fingerprint in enumerate(fingerprints):
+                    db.store_page(f"https://example.com/{i}", "", "", fingerprint)
+            build_s = time.perf_counter() - start
+
+            latencies, found = [], 0
+            for _ in range(args.queries):
+                target = rng.randrange(size)
+                query = fingerprints[target] & ((1 << SIMHASH_BITS) - 1)
+                for bit in rng.sample(range(SIMHASH_BITS), rng.randint(0, 3)):
+                    query ^= 1 << bit
+                start = time.perf_counter()
+                match = db.find_near_duplicate(to_signed(query), 3)
+                latencies.append(time.perf_counter() - start)
+                found += match is not None and match[0] == target + 1
+            db.close()
+        print(f"{size:>8} pages: build {build_s:.2f}s, lookup {summarize(latencies)}, "
+              f"recall {found / args.queries:.3f}")
+
+
+if __name__ == "__main__":
+    main()
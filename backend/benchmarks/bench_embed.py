@@ -0,0 +1,102 @@
+"""向量接口吞吐基准：逐条阻塞调用BGEM3API vs AsyncBGEM3API微批处理 vs 带缓存的重复计算
+
+用法: python benchmarks/bench_embed.py [--texts 2000] [--callers 64] [--delay 0.02]
+
+模拟大量并发调用方各自请求一条文本（例如逐个知识项计算向量），
+对比发往上游的请求数和整体吞吐；最后用同一批文本再跑一遍，测量缓存命中后的吞吐。
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import ServerThread, summarize
+from fakes import EMBEDDING_STATS, fake_embedding_app
+
+import config
+from bge_api import AsyncBGEM3API, BGEM3API
+from db_manager import DBManager
+from embedding_cache import CachedEmbeddingAPI
+
+
+async def _run(get_embeddings, texts: list, callers: int) -> dict:
+    """callers个并发调用方轮流从队列取文本，每次只请求一条"""
+    queue = list(reversed(texts))
+    latencies = []
+
+    async def caller():
+        while queue:
+            text = queue.pop()
+            start = time.perf_counter()
+            await get_embeddings(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_tps": round(len(texts) / elapsed, 1),
+        "latency": summarize(latencies),
+    }
+
+
+async def bench_sync(base_url: str, texts: list, callers: int) -> dict:
+    api = BGEM3API()
+    api.api_base = base_url
+
+    async def get_embeddings(text):
+        # 与旧代码一样在事件循环里直接调用阻塞的requests.post
+        return api.get_embeddings(text)
+
+    return await _run(get_embeddings, texts, callers)
+
+
+async def bench_async(base_url: str, texts: list, callers: int, db_path: str) -> dict:
+    api = AsyncBGEM3API("fake-key", base_url=base_url)
+    db = DBManager(db_path)
+    cached = CachedEmbeddingAPI(api, db)
+    try:
+        cold = await _run(api.get_embeddings, texts, callers)
+        cold["requests"] = api.stats["requests"]
+        await _run(cached.get_embeddings, texts, callers)
+        # 清空进程内缓存，第二遍只能命中SQLite
+        cached.memory = type(cached.memory)(cached.memory.max_entries)
+        warm = await _run(cached.get_embeddings, texts, callers)
+        return {"batched": cold, "cached": warm, "cache_stats": cached.get_stats()}
+    finally:
+        await cached.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--sync-texts", type=int, default=200, help="逐条阻塞调用只跑这么多条，避免太慢")
+    parser.add_argument("--callers", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.02, help="假向量服务每个请求的固定延迟（秒）")
+    args = parser.parse_args()
+
+    texts = [f"第{i}条知识：这是用于向量基准测试的文本内容。" for i in range(args.texts)]
+    app = fake_embedding_app(args.delay)
+    with ServerThread(app) as server, tempfile.TemporaryDirectory() as tmp:
+        base_url = f"{server.url}/v1"
+        sync = asyncio.run(bench_sync(base_url, texts[:args.sync_texts], args.callers))
+        sync_requests = app[EMBEDDING_STATS]["requests"]
+        results = asyncio.run(bench_async(base_url, texts, args.callers, os.path.join(tmp, "bench.db")))
+
+    print(f"   sync: {sync['throughput_tps']:>8.1f} texts/s, {sync_requests} requests for {args.sync_texts} texts, "
+          f"latency p50={sync['latency']['p50_ms']}ms p99={sync['latency']['p99_ms']}ms")
+    batched = results["batched"]
+    print(f"batched: {batched['throughput_tps']:>8.1f} texts/s, {batched['requests']} requests for "
+          f"{args.texts} texts (batch size {config.EMBED_BATCH_SIZE}, wait {config.EMBED_MAX_WAIT_MS}ms), "
+          f"latency p50={batched['latency']['p50_ms']}ms p99={batched['latency']['p99_ms']}ms")
+    cached = results["cached"]
+    print(f" cached: {cached['throughput_tps']:>8.1f} texts/s, "
+          f"latency p50={cached['latency']['p50_ms']}ms p99={cached['latency']['p99_ms']}ms, "
+          f"stats={results['cache_stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""知识项全量读取的内存基准：一次性get_all_knowledge vs 键集分页流式导出
+
+用法: python benchmarks/bench_export.py [--items 200000]
+
+用tracemalloc统计Python堆的峰值，对比两种方式读取全部知识项（并序列化为NDJSON）时的内存占用。
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import common  # noqa: F401  让脚本可以直接import backend下的模块
+
+from db_manager import DBManager
+from knowledge_export import iter_ndjson
+
+
+def _measure(func) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, "bench.db"))
+        with db.transaction():
+            page_id = db.store_page("https://example.com", "测试页面", "正文")
+            for batch in range(0, args.items, 10000):
+                db.store_knowledge(page_id, {f"类别{batch // 10000 % 8}": [
+                    f"第{i}条知识：这是一段用于导出基准测试的中文内容。" for i in range(batch, min(batch + 10000, args.items))
+                ]}, {})
+
+        def load_all():
+            rows = db.get_all_knowledge()
+            return sum(len(chunk) for chunk in iter_ndjson(rows)) and len(rows)
+
+        def stream():
+            count = 0
+            for chunk in iter_ndjson(db.iter_knowledge(1000)):
+                count += chunk.count(b'\n')
+            return count
+
+        for name, func in (("get_all_knowledge", load_all), ("iter_knowledge", stream)):
+            count, elapsed, peak = _measure(func)
+            print(f"{name:>18}: {count} rows in {elapsed:.2f}s, peak Python heap {peak / 1e6:.1f} MB")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""知识图谱查询基准：逐行json.loads(knowledge_json)全表扫描 vs kg_facts索引查询
+
+用法: python benchmarks/bench_graph.py [--facts 1000000] [--facts-per-page 20] [--queries 20]
+
+通过store_knowledge_only写入facts条事实（同时写knowledge_json和图谱表），
+再用两种方式回答同样的问题：某类别的所有值、包含某个值的页面、某个值的共现邻居。
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from common import summarize, vocabulary
+
+from db_manager import DBManager
+
+CATEGORIES = [f"类别{i}" for i in range(12)]
+
+
+def _knowledge(rng: random.Random, words: list, facts: int) -> dict:
+    knowledge = {}
+    for _ in range(facts):
+        # 值的频率近似Zipf分布：少数值在很多页面中出现
+        value = words[min(int(rng.paretovariate(0.8)) - 1, len(words) - 1)] if rng.random() < 0.5 \
+            else rng.choice(words)
+        knowledge.setdefault(rng.choice(CATEGORIES), []).append(value)
+    return knowledge
+
+
+def _scan(db: DBManager):
+    for page_id, knowledge_json in db.conn.execute("SELECT page_id, knowledge_json FROM knowledge"):
+        yield page_id, json.loads(knowledge_json)
+
+
+def scan_category_values(db, category, limit=100):
+    counts = Counter()
+    for _, knowledge in _scan(db):
+        counts.update(set(knowledge.get(category, [])))
+    return counts.most_common(limit)
+
+
+def scan_pages_by_value(db, value, limit=100):
+    pages = [page_id for page_id, knowledge in _scan(db)
+             if any(value in values for values in knowledge.values())]
+    return pages[-limit:]
+
+
+def scan_neighbors(db, value, limit=20):
+    counts = Counter()
+    for _, knowledge in _scan(db):
+        if any(value in values for values in knowledge.values()):
+            counts.update({item for values in knowledge.values() for item in values if item != value})
+    return counts.most_common(limit)
+
+
+def _measure(func, args_list) -> dict:
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", type=int, default=1000000)
+    parser.add_argument("--facts-per-page", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--scan-queries", type=int, default=3, help="全表扫描很慢，只跑这么多次")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = vocabulary(rng, 200000)
+    pages = args.facts // args.facts_per_page
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        for batch in range(0, pages, 1000):
+            with db.transaction():
+                for _ in range(min(1000, pages - batch)):
+                    page_id = db.store_page("https://bench.invalid/", "页面", "")
+                    db.store_knowledge_only(page_id, _knowledge(rng, words, args.facts_per_page))
+        build_s = time.perf_counter() - start
+        facts = db.conn.execute("SELECT COUNT(*) FROM kg_facts").fetchone()[0]
+        size_mb = os.path.getsize(os.path.join(tmp, "bench.db")) / 1e6
+        print(f"stored {pages} pages / {facts} facts in {build_s:.1f}s ({facts / build_s:.0f} facts/s), "
+              f"db {size_mb:.0f}MB")
+
+        popular = [row["value"] for row in db.get_category_values(CATEGORIES[0], args.queries)]
+        values = popular[:args.queries // 2] + rng.sample(words, args.queries - len(popular[:args.queries // 2]))
+        categories = [rng.choice(CATEGORIES) for _ in range(args.queries)]
+        cases = [
+            ("category values", scan_category_values, db.get_category_values, [(c,) for c in categories]),
+            ("pages by value", scan_pages_by_value, db.find_pages_by_value, [(v,) for v in values]),
+            ("neighbors", scan_neighbors, db.get_value_neighbors, [(v,) for v in values]),
+        ]
+        for name, scan, indexed, args_list in cases:
+            scan_stats = _measure(lambda *a: scan(db, *a), args_list[:args.scan_queries])
+            indexed_stats = _measure(indexed, args_list)
+            print(f"{name:>16}: json scan {scan_stats}")
+            print(f"{'':>16}  indexed   {indexed_stats}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""入库流水线端到端吞吐基准：逐页串行（旧版前端的调用顺序） vs IngestPipeline
+
+用法: python benchmarks/bench_ingest.py [--pages 200] [--llm-delay 0.2]
+
+使用本地的假网站、假LLM和假向量服务，统计两种方式把pages个页面完整入库所需的时间。
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import ServerThread
+from fakes import fake_embedding_app, fake_llm_app, fake_site_app
+
+from bge_api import AsyncBGEM3API, embed_knowledge
+from chunking import extract_knowledge_chunked
+from crawler import create_session, fetch_page
+from db_manager import DBManager
+from extractor import create_parse_executor
+from ingest import IngestPipeline, _normalize_knowledge
+from moonshot_api import AsyncMoonshotAPI
+
+
+async def bench_serial(db, urls, llm_url, embed_url) -> float:
+    session = create_session()
+    moonshot = AsyncMoonshotAPI("fake-key", base_url=llm_url)
+    embedder = AsyncBGEM3API("fake-key", base_url=embed_url)
+    start = time.perf_counter()
+    for url in urls:
+        page = await fetch_page(session, url)
+        page_id = db.store_page(url, page.title, page.content)
+        knowledge = _normalize_knowledge((await extract_knowledge_chunked(moonshot, page.content)).knowledge)
+        db.store_knowledge(page_id, knowledge, await embed_knowledge(embedder, knowledge))
+    elapsed = time.perf_counter() - start
+    await session.close()
+    await moonshot.close()
+    await embedder.close()
+    return elapsed
+
+
+async def bench_pipeline(db, urls, llm_url, embed_url, executor) -> float:
+    session = create_session()
+    moonshot = AsyncMoonshotAPI("fake-key", base_url=llm_url)
+    embedder = AsyncBGEM3API("fake-key", base_url=embed_url)
+    pipeline = IngestPipeline(db, session, moonshot, embedder, executor)
+    await pipeline.start()
+    start = time.perf_counter()
+    job_id = await pipeline.submit(urls)
+    while db.get_ingest_job(job_id)["status"] != "finished":
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    await pipeline.stop()
+    await session.close()
+    await moonshot.close()
+    await embedder.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--serial-pages", type=int, default=20, help="串行方式只跑这么多页，避免太慢")
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    executor = create_parse_executor()
+    with ServerThread(fake_site_app()) as site, ServerThread(fake_llm_app(args.llm_delay)) as llm, \
+            ServerThread(fake_embedding_app(dim=256)) as embed, tempfile.TemporaryDirectory() as tmp:
+        urls = [f"{site.url}/page/{i}" for i in range(args.pages)]
+        db = DBManager(os.path.join(tmp, "serial.db"))
+        serial = asyncio.run(bench_serial(db, urls[:args.serial_pages], f"{llm.url}/v1", f"{embed.url}/v1"))
+        db.close()
+        db = DBManager(os.path.join(tmp, "pipeline.db"))
+        pipeline = asyncio.run(bench_pipeline(db, urls, f"{llm.url}/v1", f"{embed.url}/v1", executor))
+        db.close()
+    if executor is not None:
+        executor.shutdown()
+
+    print(f"  serial: {args.serial_pages / serial:.1f} pages/s ({args.serial_pages} pages in {serial:.2f}s)")
+    print(f"pipeline: {args.pages / pipeline:.1f} pages/s ({args.pages} pages in {pipeline:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
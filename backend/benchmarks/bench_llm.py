@@ -0,0 +1,89 @@
+"""/extract 负载基准：同步MoonshotAPI（阻塞事件循环） vs AsyncMoonshotAPI
+
+用法: python benchmarks/bench_llm.py [--requests 64] [--delay 0.2] [--concurrency 32]
+
+模拟单个uvicorn worker内并发到达的提取请求，同时用一个心跳任务
+（相当于/health）测量事件循环被阻塞的程度。
+"""
+import argparse
+import asyncio
+import time
+
+from common import ServerThread, summarize
+from fakes import fake_llm_app
+
+from moonshot_api import AsyncMoonshotAPI, MoonshotAPI
+
+
+async def _probe_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """每隔interval秒醒来一次，记录实际延迟超出预期的部分"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def _run(handler, total: int) -> dict:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(stop, lags))
+
+    async def one(i):
+        start = time.perf_counter()
+        await handler(f"第{i}篇文档的内容")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency": summarize(latencies),
+        "loop_lag": summarize(lags),
+    }
+
+
+async def bench_sync(base_url: str, total: int) -> dict:
+    api = MoonshotAPI("fake-key")
+    api.client = api.client.with_options(base_url=base_url)
+
+    async def handler(content):
+        # 与旧版 /extract 一样，在async处理函数里直接调用同步客户端
+        return api.extract_knowledge(content)
+
+    return await _run(handler, total)
+
+
+async def bench_async(base_url: str, total: int, concurrency: int) -> dict:
+    api = AsyncMoonshotAPI("fake-key", base_url=base_url, max_concurrency=concurrency)
+    try:
+        return await _run(api.extract_knowledge, total)
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.2, help="假LLM每次响应的延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with ServerThread(fake_llm_app(args.delay)) as server:
+        base_url = f"{server.url}/v1"
+        results = {
+            "sync": asyncio.run(bench_sync(base_url, args.requests)),
+            "async": asyncio.run(bench_async(base_url, args.requests, args.concurrency)),
+        }
+
+    for mode, result in results.items():
+        print(f"{mode:>5}: {result['elapsed_s']:.2f}s, {result['throughput_rps']:.1f} req/s, "
+              f"latency p50={result['latency']['p50_ms']}ms p99={result['latency']['p99_ms']}ms, "
+              f"loop lag p99={result['loop_lag']['p99_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
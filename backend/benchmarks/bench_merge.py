@@ -0,0 +1,56 @@
+"""本地合并引擎基准：不同输入规模下 merge_local 的耗时
+
+用法: python benchmarks/bench_merge.py [--sizes 100,1000,5000]
+"""
+import argparse
+import random
+import time
+
+from common import BACKEND_DIR  # noqa: F401  确保backend在sys.path中
+
+from merge_engine import merge_local
+
+CATEGORIES = ["学校名称", "校名", "创建时间", "成立时间", "校训", "地址", "学科", "知名校友", "院系", "简介"]
+
+
+def make_inputs(count: int, seed: int = 0) -> list:
+    """模拟多页面提取结果：类别有别名，值有空白/标点/大小写差异和少量改写"""
+    rng = random.Random(seed)
+    charset = "大学院系科研教授学生校园图书馆实验室历史文化建筑创新技术工程医学法律经济管理艺术体育"
+    base_values = ["".join(rng.choice(charset) for _ in range(rng.randint(4, 16))) + f"（{i}）"
+                   for i in range(count)]
+    inputs = []
+    for _ in range(count):
+        knowledge = {}
+        for category in rng.sample(CATEGORIES, 4):
+            values = []
+            for value in rng.sample(base_values, 3):
+                variant = rng.random()
+                if variant < 0.3:
+                    value = value.replace("（", " (").replace("）", ")")
+                elif variant < 0.4:
+                    value = value + "。"
+                values.append(value)
+            knowledge[category] = values
+        inputs.append(knowledge)
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,5000")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        inputs = make_inputs(size)
+        total_values = sum(len(v) for d in inputs for v in d.values())
+        start = time.perf_counter()
+        result = merge_local(inputs)
+        elapsed = time.perf_counter() - start
+        kept = sum(len(v) for v in result.merged.values())
+        print(f"{size:>6} dicts / {total_values:>6} values -> {len(result.merged)} categories, "
+              f"{kept} values, {len(result.ambiguous)} ambiguous: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
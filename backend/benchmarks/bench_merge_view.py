@@ -0,0 +1,63 @@
+"""增量合并基准：每来一个新来源就把全部来源重新merge_local vs 合并视图增量并入
+
+用法: python benchmarks/bench_merge_view.py [--sources 200] [--updates 50]
+
+先把sources个来源并入一个主题，然后再逐个加入updates个新来源，比较每次更新的耗时；
+另外测量撤回一个来源和直接读取物化结果的耗时。
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench_merge import make_inputs
+from common import summarize
+
+from db_manager import DBManager
+from merge_engine import merge_local
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=50)
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.sources + args.updates)
+    base, updates = inputs[:args.sources], inputs[args.sources:]
+
+    full = []
+    current = list(base)
+    for knowledge in updates:
+        current.append(knowledge)
+        start = time.perf_counter()
+        merge_local(current)
+        full.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, "bench.db"))
+        for i, knowledge in enumerate(base):
+            db.put_merge_source("topic", f"s{i}", knowledge)
+        incremental, retract, read = [], [], []
+        for i, knowledge in enumerate(updates, start=args.sources):
+            start = time.perf_counter()
+            db.put_merge_source("topic", f"s{i}", knowledge)
+            incremental.append(time.perf_counter() - start)
+        for i in range(args.updates):
+            start = time.perf_counter()
+            db.delete_merge_source("topic", f"s{i}")
+            retract.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            db.get_merge_view("topic")
+            read.append(time.perf_counter() - start)
+        db.close()
+
+    print(f"add 1 source to {args.sources}:")
+    print(f"  full re-merge: {summarize(full)}")
+    print(f"  incremental:   {summarize(incremental)}")
+    print(f"retract 1 source: {summarize(retract)}")
+    print(f"read view:        {summarize(read)}")
+
+
+if __name__ == "__main__":
+    main()
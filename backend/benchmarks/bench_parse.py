@@ -0,0 +1,85 @@
+"""HTML解析微基准：各解析后端的 pages/sec，以及进程池并行解析的吞吐
+
+用法: python benchmarks/bench_parse.py [--corpus DIR] [--pages 200] [--workers 4]
+
+--corpus 指向保存下来的 .html 页面目录；不指定时使用生成的中文测试页面。
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import BACKEND_DIR  # noqa: F401  确保backend在sys.path中
+from fakes import sample_html
+
+import extractor
+
+
+def load_corpus(corpus_dir: str, pages: int) -> list:
+    if corpus_dir:
+        paths = sorted(glob.glob(os.path.join(corpus_dir, "*.html")))
+        if not paths:
+            raise SystemExit(f"No .html files found in {corpus_dir}")
+        corpus = []
+        for path in paths:
+            with open(path, "rb") as f:
+                corpus.append(f.read().decode("utf-8", errors="replace"))
+        return corpus
+    # 大小不一的页面：20 ~ 2000 段
+    return [sample_html(i, paragraphs=20 + (i * 37) % 2000) for i in range(pages)]
+
+
+def _legacy_normalize(text: str) -> str:
+    """旧版 extract_content 中的三层生成器"""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def bench_backend(backend: str, corpus: list) -> float:
+    start = time.perf_counter()
+    for html in corpus:
+        extractor.extract_content(html, backend)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def bench_pool(backend: str, corpus: list, workers: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(extractor.extract_content, corpus[:workers], [backend] * workers))  # 预热
+        start = time.perf_counter()
+        list(pool.map(extractor.extract_content, corpus, [backend] * len(corpus), chunksize=4))
+        return len(corpus) / (time.perf_counter() - start)
+
+
+def bench_normalize(corpus: list) -> dict:
+    texts = [extractor._extract_html_parser(html)[1] for html in corpus[:50]]
+    timings = {}
+    for name, func in (("legacy", _legacy_normalize), ("single-pass", extractor.normalize_text)):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        timings[name] = round(len(texts) / (time.perf_counter() - start), 1)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="保存的HTML页面目录")
+    parser.add_argument("--pages", type=int, default=200, help="未指定corpus时生成的页面数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    size_mb = sum(len(html) for html in corpus) / 1024 / 1024
+    print(f"corpus: {len(corpus)} pages, {size_mb:.1f} MB of text")
+
+    for backend in extractor.available_backends():
+        print(f"{backend:>12}: {bench_backend(backend, corpus):8.1f} pages/s inline, "
+              f"{bench_pool(backend, corpus, args.workers):8.1f} pages/s with {args.workers} processes")
+
+    print(f"normalize (texts/s): {bench_normalize(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""关键词检索延迟基准：FTS5 trigram + BM25 vs LIKE全表扫描
+
+用法: python benchmarks/bench_text_search.py [--items 100000] [--queries 200]
+
+向临时数据库写入items条中文知识项，分别用FTS5索引和LIKE扫描执行同一组查询。
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import sentence, summarize, vocabulary
+
+from db_manager import DBManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = vocabulary(rng, 20000)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        with db.transaction():
+            page_id = db.store_page("https://example.com", "测试", "正文")
+            for batch in range(0, args.items, 1000):
+                db.store_knowledge(page_id, {f"类别{batch // 1000 % 8}": [sentence(rng, words) for _ in range(1000)]}, {})
+        print(f"indexed {args.items} items in {time.perf_counter() - start:.2f}s")
+
+        # 查询词长度为3~4的词和任意词各一个
+        long_words = [word for word in words if len(word) >= 3]
+        queries = [rng.choice(long_words) + " " + rng.choice(words) for _ in range(args.queries)]
+        for mode, fts_enabled in (("fts5", True), ("like", False)):
+            db.fts_enabled = fts_enabled
+            latencies = []
+            for query in queries:
+                # LIKE要求所有词同时出现，这里只取第一个词，两边的命中集合大致相当
+                query = query if fts_enabled else query.split()[0]
+                start = time.perf_counter()
+                db.search_knowledge_text(query, args.limit)
+                latencies.append(time.perf_counter() - start)
+            print(f"{mode:>5}: {summarize(latencies)}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""向量检索基准：VectorIndex（矩阵乘积 + argpartition）的单条/批量查询延迟
+
+用法: python benchmarks/bench_vector_search.py [--sizes 10000,100000,1000000] [--dim 1024]
+
+1M x 1024维float32约需4GB内存，内存不足时调小 --dim 或去掉最大规模。
+--legacy 额外在最小规模上跑一遍旧版"逐行frombuffer + Python循环"实现作对比。
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import BACKEND_DIR  # noqa: F401  确保backend在sys.path中
+
+from vector_index import VectorIndex
+
+
+def build_index(size: int, dim: int, rng: np.random.Generator) -> VectorIndex:
+    index = VectorIndex(dim, initial_capacity=size)
+    categories = [f"类别{i % 50}" for i in range(size)]
+    for start in range(0, size, 100000):
+        stop = min(size, start + 100000)
+        index.add(range(start, stop), categories[start:stop],
+                  rng.standard_normal((stop - start, dim), dtype=np.float32))
+    return index
+
+
+def legacy_search(blobs: list, query: list, limit: int) -> list:
+    query_np = np.array(query)
+    results = []
+    for id_, blob in blobs:
+        vector = np.frombuffer(blob).reshape(-1)
+        similarity = np.dot(query_np, vector) / (np.linalg.norm(query_np) * np.linalg.norm(vector))
+        results.append({'id': id_, 'similarity': float(similarity)})
+    results.sort(key=lambda x: x['similarity'], reverse=True)
+    return results[:limit]
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for size in sizes:
+        start = time.perf_counter()
+        index = build_index(size, args.dim, rng)
+        build_s = time.perf_counter() - start
+        queries = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+        repeat = max(1, 200000 // size)
+
+        single_ms = timed(lambda: index.search(queries[0], args.k), repeat)
+        filtered_ms = timed(lambda: index.search(queries[0], args.k, category="类别7"), repeat)
+        batch_ms = timed(lambda: index.search_batch(queries, args.k), max(1, repeat // 4))
+        print(f"{size:>8} x {args.dim}: build {build_s:.2f}s, single {single_ms:.2f} ms, "
+              f"category-filtered {filtered_ms:.2f} ms, batch of {args.batch} {batch_ms:.2f} ms "
+              f"({batch_ms / args.batch:.2f} ms/query)")
+
+        if args.legacy and size == sizes[0]:
+            blobs = [(i, rng.standard_normal(args.dim).tobytes()) for i in range(size)]
+            legacy_ms = timed(lambda: legacy_search(blobs, queries[0].tolist(), args.k), 1)
+            print(f"{'legacy':>8}: single {legacy_ms:.2f} ms")
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""多worker部署基准：serve.py的启动耗时和每个worker的内存占用，向量内存映射共享 vs 各自加载到堆上
+
+用法: python benchmarks/bench_workers.py [--vectors 50000] [--dim 1024] [--workers 2]
+
+在临时数据库中写入vectors条向量，分别以 VECTOR_SIDECAR=1（serve.py导出.npy，各worker内存映射）
+和 VECTOR_SIDECAR=0（各worker从SQLite解码到自己的堆内存）启动serve.py，记录从启动到所有worker的
+/ready都返回200的时间、各worker的RSS和PSS（共享页按映射它的进程数均摊），以及SIGTERM后退出的耗时。
+空数据库上的同样测量作为基线，差值即向量索引给每个worker带来的内存增量。
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from common import BACKEND_DIR, free_port
+
+
+def _fill(db_path: str, vectors: int, dim: int):
+    """写入vectors条随机向量，每个页面100条，分布在10个类别中"""
+    os.environ["DB_PATH"] = db_path
+    from db_manager import DBManager
+    rng = np.random.default_rng(0)
+    db = DBManager(db_path)
+    for start in range(0, vectors, 100):
+        count = min(100, vectors - start)
+        page_id = db.store_page(f"https://bench.invalid/{start}", "页面", "")
+        category = f"类别{start // 100 % 10}"
+        items = [f"知识项{start + i}" for i in range(count)]
+        db.store_knowledge(page_id, {category: items},
+                           {category: rng.standard_normal((count, dim), dtype=np.float32).tolist()})
+    db.close()
+
+
+def _memory_kb(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name.lower()] = int(rest.split()[0])
+    return values
+
+
+def _ready_pids(url: str, workers: int, timeout: float) -> set:
+    """轮询/ready直到workers个不同的worker都返回200；每次新建连接，让请求分散到各个worker"""
+    pids, deadline = set(), time.monotonic() + timeout
+    while len(pids) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"only {len(pids)}/{workers} workers ready after {timeout:.0f}s")
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                pids.add(json.load(response)["pid"])
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    return pids
+
+
+def run_server(db_path: str, workers: int, sidecar: bool, timeout: float = 600) -> dict:
+    port = free_port()
+    env = dict(os.environ, DB_PATH=db_path, VECTOR_SIDECAR="1" if sidecar else "0",
+               LOG_LEVEL="WARNING", MOONSHOT_API_KEY=os.environ.get("MOONSHOT_API_KEY", "bench"))
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+                                   cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            pids = _ready_pids(f"http://127.0.0.1:{port}/ready", workers, timeout)
+            startup_s = time.perf_counter() - start
+            memory = [_memory_kb(pid) for pid in sorted(pids)]
+        except BaseException:
+            process.kill()
+            process.wait()
+            log.seek(0)
+            sys.stderr.write(log.read().decode(errors="replace")[-4000:])
+            raise
+        start = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=120)
+        shutdown_s = time.perf_counter() - start
+    return {
+        "startup_s": round(startup_s, 2),
+        "shutdown_s": round(shutdown_s, 2),
+        "rss_mb": round(sum(m["rss"] for m in memory) / len(memory) / 1024, 1),
+        "pss_mb": round(sum(m["pss"] for m in memory) / len(memory) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_db = os.path.join(tmp, "empty.db")
+        _fill(empty_db, 0, args.dim)
+        vectors_db = os.path.join(tmp, "vectors.db")
+        start = time.perf_counter()
+        _fill(vectors_db, args.vectors, args.dim)
+        print(f"stored {args.vectors} x {args.dim} vectors in {time.perf_counter() - start:.1f}s "
+              f"({args.vectors * args.dim * 4 / 1e6:.0f}MB as float32)")
+
+        baseline = run_server(empty_db, args.workers, sidecar=True)
+        print(f"{'empty db':>14}: {baseline}")
+        for name, sidecar in (("heap", False), ("memory-mapped", True)):
+            result = run_server(vectors_db, args.workers, sidecar)
+            delta = {key: round(result[key] - baseline[key], 1) for key in ("rss_mb", "pss_mb")}
+            print(f"{name:>14}: {result}  per-worker delta vs empty: {delta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""基准测试共用的工具：后台线程中的本地HTTP服务、延迟统计、测试文本生成"""
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+
+from aiohttp import web
+
+# 让基准脚本可以直接 import backend 下的模块
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    """在独立线程的事件循环中运行aiohttp应用，避免被被测代码阻塞"""
+
+    def __init__(self, app: web.Application):
+        self.app = app
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = threading.Event()
+        self._runner = None
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port, backlog=1024)
+        self._loop.run_until_complete(site.start())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+
+    def __enter__(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def percentile(values: list, pct: float) -> float:
+    """简单的最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list) -> dict:
+    """把一组延迟（秒）汇总为毫秒级的p50/p99/max"""
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def vocabulary(rng: random.Random, size: int) -> list:
+    """随机常用汉字组成的2~4字词"""
+    chars = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]
+    return ["".join(rng.choice(chars) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+
+def sentence(rng: random.Random, words: list) -> str:
+    # 词频近似Zipf分布：少数常用词出现得多，大部分词很少出现
+    return "".join(words[min(int(rng.paretovariate(1.0)) - 1, len(words) - 1)] if rng.random() < 0.3
+                   else rng.choice(words) for _ in range(rng.randint(4, 12)))
@@ -0,0 +1,83 @@
+"""对比两次 run_benchmarks.py 的结果
+
+用法: python benchmarks/compare_results.py OLD.json NEW.json [--threshold 10]
+
+按 (suite, name, params) 对齐两份结果，对每个场景的主要指标（p50/p99延迟、吞吐）给出变化百分比，
+变差超过threshold%的行标记为REGRESSION，有回退时退出码为1，便于在CI中使用。
+"""
+import argparse
+import json
+import sys
+
+# 指标名 -> 越大越好时为True
+_METRICS = {
+    "latency.p50_ms": False,
+    "latency.p99_ms": False,
+    "throughput_rps": True,
+    "rows_per_s": True,
+    "pages_per_s": True,
+    "elapsed_s": False,
+}
+
+
+def _key(result: dict) -> tuple:
+    return result["suite"], result["name"], json.dumps(result.get("params", {}), sort_keys=True)
+
+
+def _get(result: dict, path: str):
+    value = result
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(old: dict, new: dict, threshold: float) -> list:
+    """返回 [(场景, 指标, 旧值, 新值, 变化百分比, 是否回退)]"""
+    old_results = {_key(result): result for result in old["results"]}
+    rows = []
+    for result in new["results"]:
+        previous = old_results.get(_key(result))
+        if previous is None:
+            continue
+        label = f"{result['suite']}/{result['name']} {result.get('params', {})}"
+        for metric, higher_is_better in _METRICS.items():
+            before, after = _get(previous, metric), _get(result, metric)
+            # 只在没有吞吐类指标时才比较总耗时，避免同一场景重复报告
+            if before is None or after is None or (metric == "elapsed_s" and any(
+                    _METRICS[name] and name in result for name in _METRICS)):
+                continue
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            regressed = -change > threshold if higher_is_better else change > threshold
+            rows.append((label, metric, before, after, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="变差超过此百分比视为回退")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    if old["meta"].get("platform") != new["meta"].get("platform"):
+        print("warning: results were recorded on different platforms")
+
+    rows = compare(old, new, args.threshold)
+    width = max((len(row[0]) for row in rows), default=0)
+    for label, metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{label:<{width}}  {metric:<16} {before:>10} -> {after:<10} {change:+7.1f}%{flag}")
+    sys.exit(1 if any(row[5] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""离线基准测试使用的假上游服务"""
+import asyncio
+import json
+import os
+import random
+import zlib
+
+from aiohttp import web
+
+# fake_embedding_app的请求计数
+EMBEDDING_STATS = web.AppKey("embedding_stats", dict)
+
+
+def fake_llm_app(delay: float = 0.2) -> web.Application:
+    """兼容OpenAI chat.completions接口的假LLM服务，固定延迟后返回JSON知识"""
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(delay)
+        content = json.dumps({"标题": ["示例"], "消息数": [len(body.get("messages", []))]},
+                             ensure_ascii=False)
+        return web.json_response({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+def sample_html(index: int, paragraphs: int = 20, vary: bool = False) -> str:
+    """生成一个带标题、脚本和多段正文的中文测试页面
+
+    vary=True时每段混入由index决定的随机汉字，各页面正文互不相似，不会被入库去重当作重复页面。
+    """
+    rng = random.Random(index)
+    body = "\n".join(
+        f"<p>第{index}页的第{i}段：这是一段用于基准测试的正文内容，包含一些常见的中文句子。"
+        + ("".join(chr(0x4e00 + rng.randrange(3000)) for _ in range(40)) if vary else "") + "</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        f"<html><head><meta charset=\"utf-8\"><title>测试页面 {index}</title>"
+        f"<script>var x = {index};</script><style>p {{ color: red; }}</style></head>"
+        f"<body><h1>测试页面 {index}</h1>{body}</body></html>"
+    )
+
+
+def fake_site_app(delay: float = 0.0, paragraphs: int = 20, vary: bool = False) -> web.Application:
+    """返回 /page/{n} 测试页面的假网站"""
+
+    async def page(request: web.Request) -> web.Response:
+        if delay:
+            await asyncio.sleep(delay)
+        index = int(request.match_info["n"])
+        return web.Response(text=sample_html(index, paragraphs, vary), content_type="text/html", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", page)
+    return app
+
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def load_corpus(corpus_dir: str = CORPUS_DIR) -> dict:
+    """读取录制的页面：{文件名: (响应体, Content-Type, ETag)}"""
+    with open(os.path.join(corpus_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    corpus = {}
+    for name, meta in manifest.items():
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            corpus[name] = (f.read(), meta.get("content_type", "text/html"), meta.get("etag"))
+    return corpus
+
+
+def corpus_site_app(corpus_dir: str = CORPUS_DIR, delay: float = 0.0) -> web.Application:
+    """原样回放录制页面的假网站：/corpus/{文件名}，忽略查询串，支持If-None-Match条件请求"""
+    corpus = load_corpus(corpus_dir)
+
+    async def page(request: web.Request) -> web.Response:
+        entry = corpus.get(request.match_info["name"])
+        if entry is None:
+            raise web.HTTPNotFound()
+        body, content_type, etag = entry
+        if delay:
+            await asyncio.sleep(delay)
+        headers = {"Content-Type": content_type}
+        if etag:
+            headers["ETag"] = etag
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers=headers)
+        return web.Response(body=body, headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/corpus/{name}", page)
+    return app
+
+
+def fake_embedding_app(delay: float = 0.02, per_text_delay: float = 0.0002, dim: int = 1024,
+                       fail_every: int = 0) -> web.Application:
+    """兼容OpenAI embeddings接口的假向量服务
+
+    每个请求固定延迟delay秒，再加上每条文本per_text_delay秒；向量由文本内容确定。
+    fail_every>0时每隔fail_every个请求返回一次429，用于测试重试。
+    app[EMBEDDING_STATS]记录收到的请求数和文本数。
+    """
+    stats = {"requests": 0, "texts": 0}
+
+    async def embeddings(request: web.Request) -> web.Response:
+        body = await request.json()
+        stats["requests"] += 1
+        if fail_every and stats["requests"] % fail_every == 0:
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "0"})
+        texts = body["input"]
+        stats["texts"] += len(texts)
+        await asyncio.sleep(delay + per_text_delay * len(texts))
+        data = []
+        for i, text in enumerate(texts):
+            seed = zlib.crc32(text.encode("utf-8"))
+            data.append({"object": "embedding", "index": i,
+                         "embedding": [((seed >> (j % 24)) & 0xff) / 255.0 for j in range(dim)]})
+        return web.json_response({"object": "list", "data": data, "model": body.get("model", "fake")})
+
+    app = web.Application()
+    app[EMBEDDING_STATS] = stats
+    app.router.add_post("/v1/embeddings", embeddings)
+    return app
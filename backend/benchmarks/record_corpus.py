@@ -0,0 +1,63 @@
+"""把真实网页录制进基准测试语料库，之后由corpus_site_app离线回放
+
+用法: python benchmarks/record_corpus.py URL [URL ...] [--corpus benchmarks/corpus]
+
+保存原始响应体（不做解码）以及Content-Type、ETag，回放时原样返回，
+编码检测、解析等环节与线上抓取走相同的代码路径。
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+from urllib.parse import urlsplit
+
+import aiohttp
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def _file_name(url: str) -> str:
+    parts = urlsplit(url)
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{parts.netloc}{parts.path}").strip("_")
+    return (name or "page")[:80] + ".html"
+
+
+async def record(urls, corpus_dir: str) -> dict:
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+        for url in urls:
+            async with session.get(url) as response:
+                body = await response.read()
+                if response.status != 200:
+                    print(f"skip {url}: HTTP {response.status}")
+                    continue
+                name = _file_name(url)
+                with open(os.path.join(corpus_dir, name), "wb") as f:
+                    f.write(body)
+                manifest[name] = {
+                    "content_type": response.headers.get("Content-Type", "text/html"),
+                    "etag": response.headers.get("ETag"),
+                    "source": url,
+                }
+                print(f"recorded {url} -> {name} ({len(body)} bytes)")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    args = parser.parse_args()
+    os.makedirs(args.corpus, exist_ok=True)
+    asyncio.run(record(args.urls, args.corpus))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""离线基准测试套件：各HTTP接口的吞吐/延迟，以及DBManager检索在不同数据规模下的延迟
+
+用法: python benchmarks/run_benchmarks.py [--suite endpoints,db] [--quick] [--output results.json]
+
+所有上游都在本地：录制页面的回放网站（benchmarks/corpus）、按编号生成页面的假网站、
+兼容OpenAI接口的假LLM和假向量服务。endpoints套件用uvicorn在后台线程中启动真实的main.app，
+通过HTTP并发请求各接口；db套件直接调用DBManager。
+
+结果写成JSON（默认 benchmarks/results/<commit>.json），附带commit、机器和参数信息，
+用 compare_results.py 对比两次结果。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import aiohttp
+import numpy as np
+
+from common import BACKEND_DIR, ServerThread, free_port, sentence, summarize, vocabulary
+from fakes import corpus_site_app, fake_embedding_app, fake_llm_app, fake_site_app, load_corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _git_dirty() -> bool:
+    try:
+        return bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                   capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+class UvicornThread:
+    """在后台线程中运行uvicorn（含lifespan），退出时等待服务正常关闭"""
+
+    def __init__(self, app):
+        import uvicorn
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning",
+                                                    access_log=False, lifespan="on"))
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
+
+
+async def run_load(session: aiohttp.ClientSession, method: str, url: str, make_request, total: int,
+                   concurrency: int) -> dict:
+    """用concurrency个并发连接发送total个请求，make_request(i)返回 (url后缀, JSON请求体)"""
+    latencies, statuses, received = [], {}, 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal received
+        for i in counter:
+            suffix, body = make_request(i)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url + suffix, json=body) as response:
+                    received += len(await response.read())
+                    status = str(response.status)
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": total - statuses.get("200", 0),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "mb_received": round(received / 1e6, 3),
+        "latency": summarize(latencies),
+    }
+
+
+def _seed_knowledge(db, count: int, dim: int, rng: random.Random, words: list, batch: int = 1000) -> float:
+    """写入count条带向量的知识项，返回耗时（秒）"""
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    start = time.perf_counter()
+    with db.transaction():
+        page_id = db.store_page("https://bench.invalid/seed", "基准数据", "基准测试预置的知识项")
+        for offset in range(0, count, batch):
+            size = min(batch, count - offset)
+            category = f"类别{offset // batch % 8}"
+            vectors = np_rng.standard_normal((size, dim), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            db.store_knowledge(page_id, {category: [sentence(rng, words) for _ in range(size)]},
+                               {category: vectors.tolist()})
+    return time.perf_counter() - start
+
+
+def _timed(func, args_list: list) -> dict:
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return {"latency": summarize(latencies)}
+
+
+def bench_db(sizes: list, dim: int, queries: int) -> list:
+    """DBManager各检索方法在不同数据规模下的延迟"""
+    from db_manager import DBManager
+
+    results = []
+    for size in sizes:
+        rng = random.Random(size)
+        words = vocabulary(rng, 20000)
+        long_words = [word for word in words if len(word) >= 3]
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBManager(os.path.join(tmp, "bench.db"))
+            seed_s = _seed_knowledge(db, size, dim, rng, words)
+            params = {"items": size, "dim": dim}
+            results.append({"suite": "db", "name": "insert", "params": params,
+                            "elapsed_s": round(seed_s, 3), "rows_per_s": round(size / seed_s, 1)})
+
+            start = time.perf_counter()
+            db.vector_index
+            results.append({"suite": "db", "name": "vector_index_load", "params": params,
+                            "elapsed_s": round(time.perf_counter() - start, 3)})
+
+            np_rng = np.random.default_rng(size)
+            vectors = np_rng.standard_normal((queries, dim), dtype=np.float32).tolist()
+            texts = [rng.choice(long_words) + " " + rng.choice(words) for _ in range(queries)]
+            cases = {
+                "vector_search": (db.search_similar_knowledge, [(vector, 10) for vector in vectors]),
+                "vector_search_batch32": (db.search_similar_knowledge_batch,
+                                          [(vectors[i:i + 32], 10) for i in range(0, queries, 32)]),
+                "text_search": (db.search_knowledge_text, [(text, 10) for text in texts]),
+                "hybrid_search": (db.search_hybrid, [(text, vector, 10) for text, vector in zip(texts, vectors)]),
+                "page_search": (db.search_pages_text, [(text, 10) for text in texts[:20]]),
+                "knowledge_page": (db.get_knowledge_page, [(100,)] * 20),
+            }
+            for name, (func, args_list) in cases.items():
+                results.append({"suite": "db", "name": name, "params": params, **_timed(func, args_list)})
+
+            # 翻到中间位置的页面：keyset分页的延迟与翻页深度无关
+            cursor, pages = None, 0
+            start = time.perf_counter()
+            while pages < min(50, size // 100):
+                _, cursor = db.get_knowledge_page(100, cursor)
+                pages += 1
+            results.append({"suite": "db", "name": "knowledge_page_walk", "params": {**params, "pages": pages},
+                            "elapsed_s": round(time.perf_counter() - start, 4)})
+            db.close()
+        print(f"db: {size} items done", file=sys.stderr)
+    return results
+
+
+async def _wait_ingest(session, base_url: str, job_id: int, timeout: float = 600.0) -> dict:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        async with session.get(f"{base_url}/ingest/{job_id}") as response:
+            job = await response.json()
+        if job["status"] == "finished":
+            return job
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Ingest job {job_id} did not finish in {timeout}s")
+
+
+async def _endpoint_scenarios(base_url: str, corpus_url: str, site_url: str, args) -> list:
+    scale = 0.25 if args.quick else 1.0
+    n = lambda count: max(4, int(count * scale))  # noqa: E731
+    c = args.concurrency
+    corpus = sorted(load_corpus())
+    rng = random.Random(0)
+    words = vocabulary(rng, 5000)
+    contents = [sentence(rng, words) * 40 for _ in range(32)]
+    run_id = int(time.time())
+    results = []
+
+    timeout = aiohttp.ClientTimeout(total=600)
+    connector = aiohttp.TCPConnector(limit=c * 2)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def scenario(name, method, path, make_request, total, concurrency=c, **params):
+            result = await run_load(session, method, base_url + path, make_request, total, concurrency)
+            results.append({"suite": "endpoints", "name": name, "params": params, **result})
+            print(f"endpoints: {name} {result['throughput_rps']} rps, p99 {result['latency']['p99_ms']}ms",
+                  file=sys.stderr)
+
+        await scenario("health", "GET", "/health", lambda i: ("", None), n(2000))
+        # 查询串让每个URL都是缓存未命中，回放网站忽略查询串
+        await scenario("crawl_cold", "POST", "/crawl",
+                       lambda i: ("", {"url": f"{corpus_url}/corpus/{corpus[i % len(corpus)]}?run={run_id}&i={i}"}),
+                       n(400))
+        await scenario("crawl_cached", "POST", "/crawl",
+                       lambda i: ("", {"url": f"{corpus_url}/corpus/{corpus[i % len(corpus)]}"}), n(400))
+        await scenario("crawl_batch", "POST", "/crawl/batch",
+                       lambda i: ("", {"urls": [f"{corpus_url}/corpus/{name}?run={run_id}&b={i}"
+                                                for name in corpus]}),
+                       n(80), concurrency=max(1, c // 4), urls_per_request=len(corpus))
+        await scenario("extract", "POST", "/extract",
+                       lambda i: ("", {"content": f"{run_id}-{i} " + contents[i % len(contents)]}), n(200),
+                       llm_delay=args.llm_delay)
+        await scenario("extract_cached", "POST", "/extract",
+                       lambda i: ("", {"content": contents[0]}), n(400), llm_delay=args.llm_delay)
+        await scenario("merge", "POST", "/merge",
+                       lambda i: ("", {"contents": [{"类别": [rng.choice(words) for _ in range(20)]}
+                                                    for _ in range(8)]}), n(400))
+        await scenario("embed", "POST", "/embed",
+                       lambda i: ("", {"texts": [f"{run_id}-{i}-{j} {contents[j]}" for j in range(8)]}), n(400),
+                       texts_per_request=8)
+        for mode in ("text", "hybrid"):
+            await scenario(f"search_{mode}", "POST", "/search",
+                           lambda i: ("", {"query": f"{rng.choice(words)} {rng.choice(words)}", "mode": mode,
+                                           "limit": 10}), n(600), items=args.seed_items)
+        await scenario("knowledge_page", "GET", "/knowledge", lambda i: ("?limit=100", None), n(400),
+                       items=args.seed_items)
+        await scenario("knowledge_export", "GET", "/knowledge/export", lambda i: ("?format=ndjson", None), n(8),
+                       concurrency=2, items=args.seed_items)
+        await scenario("metrics", "GET", "/metrics", lambda i: ("", None), n(400))
+
+        # 入库流水线端到端：提交一批互不相似的页面，等全部完成
+        pages = n(400)
+        urls = [f"{site_url}/page/{run_id % 100000 * 10000 + i}" for i in range(pages)]
+        start = time.perf_counter()
+        async with session.post(f"{base_url}/ingest", json={"urls": urls}) as response:
+            job_id = (await response.json())["job_id"]
+        job = await _wait_ingest(session, base_url, job_id)
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "endpoints", "name": "ingest", "params": {"pages": pages,
+                                                                        "llm_delay": args.llm_delay},
+                        "elapsed_s": round(elapsed, 3), "pages_per_s": round(pages / elapsed, 2),
+                        "stages": job["stages"]})
+        print(f"endpoints: ingest {pages / elapsed:.1f} pages/s", file=sys.stderr)
+    return results
+
+
+@contextmanager
+def offline_upstreams(args):
+    """启动所有假上游，并把backend的配置指向它们和一个临时数据库
+
+    config在第一次导入时读取环境变量，所以必须在导入任何backend模块之前进入，
+    否则DB_PATH会落到仓库里的knowledge_base.db上。
+    """
+    with tempfile.TemporaryDirectory() as tmp, \
+            ServerThread(corpus_site_app()) as corpus_site, \
+            ServerThread(fake_site_app(vary=True)) as site, \
+            ServerThread(fake_llm_app(args.llm_delay)) as llm, \
+            ServerThread(fake_embedding_app(args.embed_delay, dim=args.dim)) as embed:
+        os.environ.update({
+            "DB_PATH": os.path.join(tmp, "app.db"),
+            "MOONSHOT_API_KEY": "fake-key",
+            "MOONSHOT_BASE_URL": f"{llm.url}/v1",
+            "MOONSHOT_RPM": "0",
+            "BGE_API_KEY": "fake-key",
+            "BGE_BASE_URL": f"{embed.url}/v1",
+            "LOG_LEVEL": "WARNING",
+            "INGEST_RETRY_DELAY": "0.1",
+        })
+        yield {"corpus": corpus_site.url, "site": site.url}
+
+
+def bench_endpoints(args, upstreams: dict) -> list:
+    """在本地假上游之上启动真实的FastAPI应用，逐个接口压测"""
+    import config
+    from db_manager import DBManager
+    if config.DB_PATH != os.environ["DB_PATH"]:
+        raise RuntimeError("backend config was imported before the benchmark environment was set")
+
+    rng = random.Random(1)
+    seed_db = DBManager(config.DB_PATH)
+    _seed_knowledge(seed_db, args.seed_items, args.dim, rng, vocabulary(rng, 5000))
+    seed_db.close()
+
+    import main
+    with UvicornThread(main.app) as server:
+        return asyncio.run(_endpoint_scenarios(server.url, upstreams["corpus"], upstreams["site"], args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", default="endpoints,db", help="逗号分隔：endpoints, db")
+    parser.add_argument("--quick", action="store_true", help="减少请求数和数据规模，用于快速冒烟")
+    parser.add_argument("--sizes", default=None, help="db套件的知识项数量，默认 1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed-items", type=int, default=None, help="endpoints套件预置的知识项数量")
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    parser.add_argument("--embed-delay", type=float, default=0.02)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in (args.sizes or ("1000,5000" if args.quick else "1000,10000,100000")).split(",")]
+    if args.seed_items is None:
+        args.seed_items = 2000 if args.quick else 20000
+    suites = [suite.strip() for suite in args.suite.split(",") if suite.strip()]
+
+    results = []
+    started = time.time()
+    with offline_upstreams(args) as upstreams:
+        if "db" in suites:
+            results.extend(bench_db(sizes, args.dim, args.queries))
+        if "endpoints" in suites:
+            results.extend(bench_endpoints(args, upstreams))
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": _git_dirty(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {**vars(args), "sizes": sizes},
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"wrote {len(results)} results to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,44 @@
+import asyncio
+import json
+import logging
+import random
 import requests
 import numpy as np
-from typing import List, Union
-import os
-from dotenv import load_dotenv
+from typing import Dict, List, Optional, Union
 
-load_dotenv()
+import aiohttp
+
+import config
+from chunking import estimate_tokens
+from metrics import UPSTREAM_ERRORS, track
+
+logger = logging.getLogger(__name__)
 
 class BGEM3API:
     def __init__(self):
-        self.api_key = os.getenv("sk-ddnhvdrcuwfhdrdddpdlibogvqsrrgmsbebabyrgcdfemffr")
-        self.api_base = "https://api.bgem3.com/v1"
-        
+        self.api_key = config.BGE_API_KEY
+        self.api_base = config.BGE_BASE_URL
+
     def _get_headers(self):
         return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-    
+
     def get_embeddings(self, texts: Union[str, List[str]]) -> List[List[float]]:
         """获取文本的向量表示"""
         if isinstance(texts, str):
             texts = [texts]
-            
+
         try:
             response = requests.post(
                 f"{self.api_base}/embeddings",
                 headers=self._get_headers(),
                 json={
                     "input": texts,
-                    "model": "bge-m3"
-                }
+                    "model": config.BGE_MODEL
+                },
+                timeout=config.EMBED_TIMEOUT
             )
             response.raise_for_status()
             return [data["embedding"] for data in response.json()["data"]]
@@ -42,3 +51,202 @@ class BGEM3API:
         v1 = np.array(vector1)
         v2 = np.array(vector2)
         return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+
+
+class EmbeddingError(Exception):
+    """向量接口调用失败（重试耗尽或不可重试的错误）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AsyncBGEM3API:
+    """BGEM3API的异步版本
+
+    - 所有请求共享一个aiohttp会话（连接池）；
+    - 并发调用方的文本先进入队列，凑够EMBED_BATCH_SIZE条/EMBED_BATCH_TOKENS个token，
+      或等待EMBED_MAX_WAIT_MS毫秒后合并成一个请求发出（微批处理）；
+    - 同时进行的请求数受EMBED_MAX_CONCURRENCY限制；
+    - 429、5xx和网络错误按指数退避重试，失败时抛出EmbeddingError而不是返回空列表。
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = None,
+                 batch_size: int = None, batch_tokens: int = None, max_wait_ms: float = None,
+                 max_concurrency: int = None, timeout: float = None, max_retries: int = None,
+                 session: aiohttp.ClientSession = None):
+        self.api_key = api_key if api_key is not None else config.BGE_API_KEY
+        self.api_base = (base_url or config.BGE_BASE_URL).rstrip('/')
+        self.model = model or config.BGE_MODEL
+        self.batch_size = batch_size or config.EMBED_BATCH_SIZE
+        self.batch_tokens = batch_tokens or config.EMBED_BATCH_TOKENS
+        self.max_wait = (config.EMBED_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.max_concurrency = max_concurrency or config.EMBED_MAX_CONCURRENCY
+        self.timeout = timeout or config.EMBED_TIMEOUT
+        self.max_retries = config.EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pending = []
+        self._pending_tokens = 0
+        self._flush_handle = None
+        self._batches = set()
+        self.stats = {"texts": 0, "requests": 0, "retries": 0, "failures": 0}
+        logger.info(f"AsyncBGEM3API initialized (batch_size={self.batch_size}, "
+                    f"max_concurrency={self.max_concurrency})")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency * 2,
+                    keepalive_timeout=config.CRAWL_KEEPALIVE_TIMEOUT,
+                ),
+            )
+        return self._session
+
+    async def get_embeddings(self, texts: Union[str, List[str]]) -> List[List[float]]:
+        """获取文本的向量表示，结果与输入一一对应"""
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._enqueue(text, future)
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    def _enqueue(self, text: str, future: asyncio.Future):
+        tokens = estimate_tokens(text)
+        if self._pending and self._pending_tokens + tokens > self.batch_tokens:
+            self._flush()
+        self._pending.append((text, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    def _flush(self):
+        """把当前队列中的文本作为一批发出"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list):
+        try:
+            vectors = await self._request([text for text, _ in batch])
+        except Exception as e:
+            self.stats["failures"] += 1
+            if isinstance(e, EmbeddingError) and e.status_code is not None:
+                UPSTREAM_ERRORS.inc(upstream="embed", kind=f"http_{e.status_code}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        """发送一个批量请求，可重试的错误按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    with track("embed"):
+                        vectors = await self._post(texts)
+                self.stats["texts"] += len(texts)
+                return vectors
+            except _RetryableError as e:
+                UPSTREAM_ERRORS.inc(upstream="embed", kind="retryable")
+                if attempt == self.max_retries:
+                    raise EmbeddingError(f"Embedding request failed after {attempt + 1} attempts: {str(e)}")
+                backoff = min(0.5 * 2 ** attempt, 8.0)
+                if e.retry_after is not None:
+                    # Retry-After是服务端要求的最短等待时间，抖动只能加在它之上
+                    delay = e.retry_after + random.random() * backoff / 2
+                else:
+                    delay = backoff * (0.5 + random.random() / 2)
+                self.stats["retries"] += 1
+                logger.warning(f"Embedding request failed ({str(e)}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _post(self, texts: List[str]) -> List[List[float]]:
+        try:
+            async with self._get_session().post(
+                f"{self.api_base}/embeddings",
+                json={"input": texts, "model": self.model},
+            ) as response:
+                if response.status == 429 or response.status >= 500:
+                    retry_after = response.headers.get("Retry-After")
+                    raise _RetryableError(
+                        f"HTTP {response.status}",
+                        float(retry_after) if retry_after and retry_after.isdigit() else None
+                    )
+                if response.status >= 400:
+                    detail = await response.text()
+                    raise EmbeddingError(f"HTTP {response.status}: {detail[:200]}", response.status)
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    raise EmbeddingError("Embedding response is not valid JSON", response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _RetryableError(f"{type(e).__name__}: {str(e)}")
+
+        # 200但内容不对（没有data、条目缺少embedding）按接口错误处理，不能抛出KeyError等让调用方误判
+        try:
+            data = sorted(body["data"], key=lambda item: item.get("index", 0))
+            vectors = [item["embedding"] for item in data]
+        except (KeyError, TypeError, AttributeError) as e:
+            raise EmbeddingError(f"Malformed embedding response: {type(e).__name__}: {str(e)}")
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+    async def close(self):
+        """发出队列中剩余的文本，等待进行中的请求结束后关闭连接池"""
+        self._flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def _item_text(value) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+async def embed_knowledge(api, knowledge: Dict[str, list]) -> Dict[str, List[List[float]]]:
+    """为知识字典中的每个值计算向量，返回与knowledge结构对应的 {类别: [向量, ...]}
+
+    所有值在一次get_embeddings调用中提交，由api自行分批；配合CachedEmbeddingAPI时，
+    内容没有变化的知识项直接取缓存，不会重新计算。
+    """
+    texts = [_item_text(value) for values in knowledge.values() for value in values]
+    vectors = await api.get_embeddings(texts)
+    result, offset = {}, 0
+    for category, values in knowledge.items():
+        result[category] = vectors[offset:offset + len(values)]
+        offset += len(values)
+    return result
@@ -0,0 +1,128 @@
+"""长文本分块提取：按句子边界切分，并发提取后在本地归并"""
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+import config
+from merge_engine import merge_local
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符大致一个字一个token，其余文本大致四个字符一个token
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+# 在句末标点之后切分，标点保留在前一句。入库的正文经过normalize_text已经没有换行，
+# 不按段落切分，相邻的句子在split_text中重新拼成块
+_SENTENCE_RE = re.compile(r'(?<=[。！？；!?;])|(?<=\.)\s+|\n')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的token数（偏保守）"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _hard_split(text: str, max_tokens: int) -> List[str]:
+    """没有可用边界时按估计的token数硬切"""
+    pieces, start, used = [], 0, 0.0
+    for i, char in enumerate(text):
+        used += 1.0 if _CJK_RE.match(char) else 0.25
+        if used >= max_tokens:
+            pieces.append(text[start:i + 1])
+            start, used = i + 1, 0.0
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def _units(text: str, max_tokens: int) -> List[str]:
+    """把文本拆成不超过max_tokens的最小单元：按句子切分，过长的句子硬切"""
+    units = []
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+        else:
+            units.extend(_hard_split(sentence, max_tokens))
+    return units
+
+
+def split_text(text: str, max_tokens: int = None) -> List[str]:
+    """把长文本切成若干块，每块估计token数不超过max_tokens"""
+    max_tokens = max_tokens or config.EXTRACT_CHUNK_TOKENS
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks, current, current_tokens = [], [], 0
+    for unit in _units(text, max_tokens):
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(' '.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens + 1
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def reduce_knowledge(knowledge_list: List[dict]) -> dict:
+    """把各块提取出的知识在本地合并（不调用LLM）"""
+    return merge_local(knowledge_list).merged
+
+
+@dataclass
+class ChunkedExtraction:
+    knowledge: dict
+    total_chunks: int
+    # 超过EXTRACT_MAX_CHUNKS、没有提取的块数
+    skipped_chunks: int = 0
+    failed_chunks: int = 0
+
+    @property
+    def warning(self) -> Optional[str]:
+        """结果不完整时的说明，完整时为None"""
+        problems = []
+        if self.skipped_chunks:
+            problems.append(f"{self.skipped_chunks} of {self.total_chunks} chunks skipped "
+                            f"(EXTRACT_MAX_CHUNKS={self.total_chunks - self.skipped_chunks})")
+        if self.failed_chunks:
+            problems.append(f"{self.failed_chunks} of {self.total_chunks} chunk extractions failed")
+        return "; ".join(problems) or None
+
+
+async def extract_knowledge_chunked(api, content: str, max_tokens: int = None,
+                                    max_chunks: int = None, concurrency: int = None) -> ChunkedExtraction:
+    """分块并发调用api.extract_knowledge并在本地归并结果
+
+    短文本只有一块，等同于直接调用一次。超过max_chunks的块不提取，部分块失败时返回其余块的结果，
+    两种情况都记在返回值的skipped_chunks/failed_chunks中；全部失败才抛出异常。
+    """
+    chunks = split_text(content, max_tokens)
+    total = len(chunks)
+    max_chunks = max_chunks or config.EXTRACT_MAX_CHUNKS
+    if total > max_chunks:
+        logger.warning(f"Content split into {total} chunks, only the first {max_chunks} are extracted")
+        chunks = chunks[:max_chunks]
+    skipped = total - len(chunks)
+    if len(chunks) == 1:
+        return ChunkedExtraction(await api.extract_knowledge(chunks[0]), total, skipped)
+
+    logger.info(f"Extracting knowledge from {len(chunks)} chunks")
+    semaphore = asyncio.Semaphore(concurrency or config.EXTRACT_CHUNK_CONCURRENCY)
+
+    async def extract_one(chunk: str) -> dict:
+        async with semaphore:
+            return await api.extract_knowledge(chunk)
+
+    results = await asyncio.gather(*(extract_one(chunk) for chunk in chunks), return_exceptions=True)
+    succeeded = [r for r in results if not isinstance(r, BaseException)]
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if not succeeded:
+        raise failures[0]
+    if failures:
+        logger.warning(f"{len(failures)} of {len(chunks)} chunk extractions failed: {failures[0]}")
+    return ChunkedExtraction(reduce_knowledge(succeeded), total, skipped, len(failures))
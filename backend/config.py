@@ -0,0 +1,180 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# 日志
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# DEBUG级别下记录请求/响应完整内容的比例（0~1），大请求体全部格式化进日志开销很大
+LOG_PAYLOAD_SAMPLE_RATE = _env_float("LOG_PAYLOAD_SAMPLE_RATE", 0.01)
+# 是否提供 /metrics 指标接口
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# 部署（serve.py）：监听地址、worker进程数
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = _env_int("PORT", 8001)
+WORKERS = _env_int("WORKERS", 1)
+# 关闭时等待进行中的请求和入库任务完成的最长秒数，超时后取消
+SHUTDOWN_GRACE_SECONDS = _env_int("SHUTDOWN_GRACE_SECONDS", 30)
+
+# Moonshot API
+MOONSHOT_API_KEY = os.getenv("MOONSHOT_API_KEY")
+MOONSHOT_BASE_URL = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.cn/v1")
+MOONSHOT_MODEL = os.getenv("MOONSHOT_MODEL", "moonshot-v1-8k")
+# 单个worker同时进行的LLM请求数上限
+MOONSHOT_MAX_CONCURRENCY = _env_int("MOONSHOT_MAX_CONCURRENCY", 32)
+# 单次LLM请求超时（秒）
+MOONSHOT_TIMEOUT = _env_float("MOONSHOT_TIMEOUT", 60.0)
+MOONSHOT_MAX_RETRIES = _env_int("MOONSHOT_MAX_RETRIES", 2)
+# 每分钟请求数上限，0表示不限速
+MOONSHOT_RPM = _env_int("MOONSHOT_RPM", 0)
+
+# BGE-M3向量接口
+BGE_API_KEY = os.getenv("BGE_API_KEY")
+BGE_BASE_URL = os.getenv("BGE_BASE_URL", "https://api.bgem3.com/v1")
+BGE_MODEL = os.getenv("BGE_MODEL", "bge-m3")
+# 每个请求最多包含的文本条数和估计token数
+EMBED_BATCH_SIZE = _env_int("EMBED_BATCH_SIZE", 64)
+EMBED_BATCH_TOKENS = _env_int("EMBED_BATCH_TOKENS", 8192)
+# 凑批时最多等待的时间（毫秒），期间到达的请求合并为一批
+EMBED_MAX_WAIT_MS = _env_float("EMBED_MAX_WAIT_MS", 5.0)
+# 同时进行的向量请求数
+EMBED_MAX_CONCURRENCY = _env_int("EMBED_MAX_CONCURRENCY", 4)
+EMBED_TIMEOUT = _env_float("EMBED_TIMEOUT", 30.0)
+# 429/5xx/网络错误的重试次数（指数退避）
+EMBED_MAX_RETRIES = _env_int("EMBED_MAX_RETRIES", 3)
+
+# 爬虫HTTP连接池
+CRAWL_MAX_CONNECTIONS = _env_int("CRAWL_MAX_CONNECTIONS", 100)
+CRAWL_MAX_CONNECTIONS_PER_HOST = _env_int("CRAWL_MAX_CONNECTIONS_PER_HOST", 8)
+CRAWL_DNS_CACHE_TTL = _env_int("CRAWL_DNS_CACHE_TTL", 300)
+CRAWL_KEEPALIVE_TIMEOUT = _env_float("CRAWL_KEEPALIVE_TIMEOUT", 30.0)
+CRAWL_TIMEOUT = _env_float("CRAWL_TIMEOUT", 30.0)
+CRAWL_CONNECT_TIMEOUT = _env_float("CRAWL_CONNECT_TIMEOUT", 10.0)
+
+# 批量爬取
+CRAWL_BATCH_MAX_URLS = _env_int("CRAWL_BATCH_MAX_URLS", 1000)
+CRAWL_BATCH_CONCURRENCY = _env_int("CRAWL_BATCH_CONCURRENCY", 32)
+CRAWL_BATCH_PER_DOMAIN = _env_int("CRAWL_BATCH_PER_DOMAIN", 4)
+# 单个页面响应体的大小上限（字节）
+CRAWL_MAX_BYTES = _env_int("CRAWL_MAX_BYTES", 10 * 1024 * 1024)
+# 无法从HTTP头或<meta>确定编码时，chardet检测的前缀长度（字节）
+CRAWL_CHARDET_SAMPLE_BYTES = _env_int("CRAWL_CHARDET_SAMPLE_BYTES", 64 * 1024)
+
+# 服务端入库流水线
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "1") != "0"
+# 单个入库任务最多包含的URL数
+INGEST_MAX_URLS = _env_int("INGEST_MAX_URLS", 10000)
+# 各阶段的worker数：抓取、解析（实际解析在进程池中进行）、LLM提取、计算向量并入库
+INGEST_FETCH_WORKERS = _env_int("INGEST_FETCH_WORKERS", 16)
+INGEST_PARSE_WORKERS = _env_int("INGEST_PARSE_WORKERS", 4)
+INGEST_EXTRACT_WORKERS = _env_int("INGEST_EXTRACT_WORKERS", 8)
+INGEST_STORE_WORKERS = _env_int("INGEST_STORE_WORKERS", 4)
+# 阶段之间队列的容量，下游跟不上时上游在此阻塞
+INGEST_QUEUE_SIZE = _env_int("INGEST_QUEUE_SIZE", 64)
+# 每个任务最多尝试的次数，重试间隔从INGEST_RETRY_DELAY秒开始指数增长
+INGEST_MAX_ATTEMPTS = _env_int("INGEST_MAX_ATTEMPTS", 3)
+INGEST_RETRY_DELAY = _env_float("INGEST_RETRY_DELAY", 2.0)
+# 多worker时只有持有入库锁的worker运行流水线，其他worker接收的任务最多这么多秒后被取走
+INGEST_POLL_SECONDS = _env_float("INGEST_POLL_SECONDS", 2.0)
+
+# 入库时的近似重复检测：正文SimHash指纹汉明距离不超过此值的页面视为重复，跳过提取
+# 并关联到原始页面；超过3时不再保证找全（指纹分4段索引）
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") != "0"
+DEDUP_MAX_DISTANCE = _env_int("DEDUP_MAX_DISTANCE", 3)
+
+# HTML解析
+# 解析后端：auto / selectolax / lxml / html.parser
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+# 解析进程池大小，0表示在事件循环线程内直接解析
+PARSE_WORKERS = _env_int("PARSE_WORKERS", min(4, os.cpu_count() or 1))
+
+# 数据库
+DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.db"))
+# WAL模式下NORMAL已足够安全；需要每个事务都落盘时设为FULL
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+# 每个连接内存映射读取的字节数和页缓存大小（KB）
+DB_MMAP_SIZE = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+DB_CACHE_SIZE_KB = _env_int("DB_CACHE_SIZE_KB", 64 * 1024)
+# 数据库被其他连接锁住时的等待时间（秒）
+DB_BUSY_TIMEOUT = _env_float("DB_BUSY_TIMEOUT", 5.0)
+# async处理函数使用的数据库线程池大小
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 4)
+
+# 爬取缓存
+CRAWL_CACHE_ENABLED = os.getenv("CRAWL_CACHE_ENABLED", "1") != "0"
+# 缓存条目在这段时间内直接使用，不发请求（秒）
+CRAWL_CACHE_TTL = _env_int("CRAWL_CACHE_TTL", 3600)
+# 超过这个时间没有重新验证过的条目会被删除（秒）
+CRAWL_CACHE_MAX_AGE = _env_int("CRAWL_CACHE_MAX_AGE", 7 * 24 * 3600)
+# 缓存正文总大小上限，超过时按最近最少使用淘汰（字节）
+CRAWL_CACHE_MAX_BYTES = _env_int("CRAWL_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+
+# LLM结果缓存
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+# 进程内LRU缓存的条目数
+LLM_CACHE_MEMORY_ENTRIES = _env_int("LLM_CACHE_MEMORY_ENTRIES", 1024)
+# SQLite持久缓存的条目数上限，超过时按最近最少使用淘汰
+LLM_CACHE_MAX_ENTRIES = _env_int("LLM_CACHE_MAX_ENTRIES", 100000)
+# 持久缓存条目的有效期（秒）
+LLM_CACHE_TTL = _env_int("LLM_CACHE_TTL", 30 * 24 * 3600)
+
+# 向量缓存（按模型和文本哈希，文本不变就不再重新计算向量）
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") != "0"
+EMBED_CACHE_MEMORY_ENTRIES = _env_int("EMBED_CACHE_MEMORY_ENTRIES", 10000)
+EMBED_CACHE_MAX_ENTRIES = _env_int("EMBED_CACHE_MAX_ENTRIES", 1000000)
+
+# 长文本分块提取
+# 每块正文的token预算，需为提示词和输出（moonshot-v1-8k共8192 token）留出余量
+EXTRACT_CHUNK_TOKENS = _env_int("EXTRACT_CHUNK_TOKENS", 3000)
+# 单个文档最多切分的块数，超出部分不提取，并在/extract响应和入库任务的warnings中注明
+EXTRACT_MAX_CHUNKS = _env_int("EXTRACT_MAX_CHUNKS", 32)
+# 单个文档同时进行的分块提取数
+EXTRACT_CHUNK_CONCURRENCY = _env_int("EXTRACT_CHUNK_CONCURRENCY", 8)
+
+# 本地知识合并
+# 规范化后n-gram的Jaccard相似度不低于此值的两个值视为重复
+MERGE_NEAR_DUP_THRESHOLD = _env_float("MERGE_NEAR_DUP_THRESHOLD", 0.8)
+# 相似度介于此值和上面阈值之间的值交给LLM复核
+MERGE_AMBIGUOUS_THRESHOLD = _env_float("MERGE_AMBIGUOUS_THRESHOLD", 0.5)
+MERGE_LLM_FALLBACK = os.getenv("MERGE_LLM_FALLBACK", "1") != "0"
+# 待复核的值超过这个数量时不再调用LLM，直接使用本地结果
+MERGE_LLM_MAX_VALUES = _env_int("MERGE_LLM_MAX_VALUES", 200)
+# 额外的类别别名表（JSON文件，格式为 {"规范名": ["别名", ...]}）
+MERGE_CATEGORY_ALIASES_FILE = os.getenv("MERGE_CATEGORY_ALIASES_FILE")
+# 合并视图在内存中保留去重状态的类别数，命中时新增的值只需与已有的值比对一次
+MERGE_VIEW_CACHE_CATEGORIES = _env_int("MERGE_VIEW_CACHE_CATEGORIES", 256)
+
+# 向量存储格式：float32 / float16 / int8（int8为带每向量缩放系数的标量量化）
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+# 存在 <db>.vectors.npy 时以内存映射方式加载精确索引，多个worker共享同一份向量
+VECTOR_SIDECAR = os.getenv("VECTOR_SIDECAR", "1") != "0"
+# 多worker时其他进程写入的向量最多这么多秒后出现在本进程的索引中
+VECTOR_INDEX_REFRESH_SECONDS = _env_float("VECTOR_INDEX_REFRESH_SECONDS", 5.0)
+
+# 知识项分页：单页最多条数、流式导出每批读取的条数
+KNOWLEDGE_PAGE_MAX = _env_int("KNOWLEDGE_PAGE_MAX", 1000)
+KNOWLEDGE_EXPORT_BATCH = _env_int("KNOWLEDGE_EXPORT_BATCH", 1000)
+
+# 混合检索：倒数排名融合的平滑常数k，越大各路排名靠后的结果权重越接近
+SEARCH_RRF_K = _env_int("SEARCH_RRF_K", 60)
+
+# 向量检索
+# flat：精确检索；ivf：IVF-flat近似检索（向量数不足IVF_MIN_VECTORS时仍用flat）
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")
+IVF_MIN_VECTORS = _env_int("IVF_MIN_VECTORS", 50000)
+# 倒排列表数，0表示按 4*sqrt(N) 自动选择
+IVF_NLIST = _env_int("IVF_NLIST", 0)
+# 每次查询扫描的列表数：越大召回越高、延迟越大
+IVF_NPROBE = _env_int("IVF_NPROBE", 16)
@@ -0,0 +1,97 @@
+import logging
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import config
+from db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """把URL规范化为缓存键：小写scheme/host、去掉默认端口和fragment、查询参数排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class CrawlCache:
+    """基于SQLite crawl_cache表的持久化爬取缓存
+
+    - TTL内的条目直接返回，不发请求；
+    - 过期条目带 If-None-Match / If-Modified-Since 重新验证，304时沿用缓存；
+    - 200但内容哈希不变时同样沿用缓存，跳过解析；
+    - 每写入evict_every次，清理超过max_age的条目并按LRU把总大小压到max_bytes以内。
+
+    读写数据库的方法都是协程，通过db.run在数据库线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, db: DBManager, ttl: int = None, max_age: int = None,
+                 max_bytes: int = None, evict_every: int = 100):
+        self.db = db
+        self.ttl = config.CRAWL_CACHE_TTL if ttl is None else ttl
+        self.max_age = config.CRAWL_CACHE_MAX_AGE if max_age is None else max_age
+        self.max_bytes = config.CRAWL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        self.stats = {"fresh_hits": 0, "not_modified": 0, "unchanged": 0, "misses": 0, "evicted": 0}
+
+    async def lookup(self, url: str) -> tuple:
+        """返回 (缓存键, 缓存条目或None)"""
+        key = normalize_url(url)
+        return key, await self.db.run(self.db.get_crawl_cache, key)
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """根据缓存的验证器构造条件请求头"""
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def record_fresh_hit(self, key: str):
+        self.stats["fresh_hits"] += 1
+        await self.db.run(self.db.touch_crawl_cache, key, time.time())
+
+    async def record_revalidated(self, key: str, etag: str = None, last_modified: str = None,
+                                 not_modified: bool = True):
+        """条件请求返回304（not_modified），或返回200但内容哈希与缓存一致"""
+        self.stats["not_modified" if not_modified else "unchanged"] += 1
+        await self.db.run(self.db.touch_crawl_cache, key, time.time(), revalidated=True,
+                          etag=etag, last_modified=last_modified)
+
+    async def store(self, key: str, url: str, etag: str, last_modified: str,
+                    content_hash: str, title: str, content: str):
+        self.stats["misses"] += 1
+        now = time.time()
+        await self.db.run(self.db.put_crawl_cache, key, url, etag, last_modified, content_hash, title, content, now)
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            await self.evict(now)
+
+    async def evict(self, now: float = None) -> int:
+        now = now or time.time()
+        deleted = await self.db.run(self.db.evict_crawl_cache, self.max_bytes, now - self.max_age)
+        self.stats["evicted"] += deleted
+        if deleted:
+            logger.info(f"Evicted {deleted} crawl cache entries")
+        return deleted
+
+    def get_stats(self) -> dict:
+        hits = self.stats["fresh_hits"] + self.stats["not_modified"] + self.stats["unchanged"]
+        total = hits + self.stats["misses"]
+        return {**self.stats, "hits": hits, "hit_ratio": round(hits / total, 4) if total else 0.0}
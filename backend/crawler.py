@@ -0,0 +1,251 @@
+import asyncio
+import codecs
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+import chardet
+import config
+from crawl_cache import CrawlCache
+from extractor import extract_content_async
+from metrics import UPSTREAM_ERRORS, track
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 流式读取响应体时每次读取的块大小
+READ_CHUNK_SIZE = 64 * 1024
+# 在文档开头多少字节内查找 <meta charset>
+META_SNIFF_BYTES = 16 * 1024
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:\-]+)', re.IGNORECASE)
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# GB2312/GBK页面中经常混有超出其字符集的字符，统一按超集GB18030解码
+_SUPERSET_ENCODINGS = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'ascii': 'utf-8'}
+
+
+class CrawlError(Exception):
+    """抓取失败，携带应返回给客户端的HTTP状态码"""
+
+    def __init__(self, status_code: int, detail: str, upstream_status: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        # 目标站点返回的错误状态码，用于判断是否值得重试
+        self.upstream_status = upstream_status
+
+
+def create_session() -> aiohttp.ClientSession:
+    """创建应用生命周期内共享的HTTP会话
+
+    连接池复用keep-alive连接并缓存DNS结果，limit_per_host限制对同一站点的并发连接数。
+    必须在事件循环内调用。
+    """
+    connector = aiohttp.TCPConnector(
+        limit=config.CRAWL_MAX_CONNECTIONS,
+        limit_per_host=config.CRAWL_MAX_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=config.CRAWL_DNS_CACHE_TTL,
+        keepalive_timeout=config.CRAWL_KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=config.CRAWL_TIMEOUT,
+        connect=config.CRAWL_CONNECT_TIMEOUT,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={'User-Agent': USER_AGENT},
+    )
+
+
+def _normalize_encoding(name: Optional[str]) -> Optional[str]:
+    """校验编码名称，无法识别时返回None"""
+    if not name:
+        return None
+    try:
+        canonical = codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+    return _SUPERSET_ENCODINGS.get(canonical, canonical)
+
+
+def detect_encoding(content: bytes, declared: Optional[str] = None) -> str:
+    """确定页面编码：BOM > HTTP头声明 > <meta charset> > chardet猜测
+
+    chardet只在前几种方式都失败时运行，且只检测前CRAWL_CHARDET_SAMPLE_BYTES字节。
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom):
+            return encoding
+
+    encoding = _normalize_encoding(declared)
+    if encoding:
+        return encoding
+
+    match = _META_CHARSET_RE.search(content[:META_SNIFF_BYTES])
+    if match:
+        encoding = _normalize_encoding(match.group(1).decode('ascii', 'ignore'))
+        if encoding:
+            return encoding
+
+    guessed = chardet.detect(content[:config.CRAWL_CHARDET_SAMPLE_BYTES])['encoding']
+    return _normalize_encoding(guessed) or 'utf-8'
+
+
+async def read_body(response: aiohttp.ClientResponse, max_size: int) -> bytes:
+    """分块读取响应体，超过max_size立即中止而不是先整体读入内存"""
+    if response.content_length is not None and response.content_length > max_size:
+        raise CrawlError(413, "Content too large")
+
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+        body += chunk
+        if len(body) > max_size:
+            raise CrawlError(413, "Content too large")
+    return bytes(body)
+
+
+@dataclass
+class CrawledPage:
+    title: str
+    content: str
+    content_hash: str
+    # 结果来自缓存（TTL内、304或内容哈希未变），下游可以跳过重新提取
+    cached: bool = False
+
+
+@dataclass
+class FetchedBody:
+    """已下载、尚未解析的响应体"""
+    url: str
+    cache_key: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    text: str
+
+
+async def fetch_body(session: aiohttp.ClientSession, url: str,
+                     cache: Optional[CrawlCache] = None) -> Union[CrawledPage, FetchedBody]:
+    """只下载不解析：缓存命中时直接返回CrawledPage，否则返回解码后的FetchedBody，失败时抛出CrawlError"""
+    key, entry = await cache.lookup(url) if cache else (None, None)
+    if entry and cache.is_fresh(entry):
+        await cache.record_fresh_hit(key)
+        return CrawledPage(entry["title"], entry["content"], entry["content_hash"], cached=True)
+
+    try:
+        with track("fetch"):
+            async with session.get(url, headers=CrawlCache.conditional_headers(entry)) as response:
+                logger.info(f"Got response with status code: {response.status}")
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+                if response.status == 304 and entry:
+                    await cache.record_revalidated(key, etag, last_modified)
+                    return CrawledPage(entry["title"], entry["content"], entry["content_hash"], cached=True)
+
+                # 错误页不解析也不写入缓存，否则会在整个TTL内被当作正常页面返回
+                if response.status >= 400:
+                    UPSTREAM_ERRORS.inc(upstream="crawl", kind=f"http_{response.status}")
+                    raise CrawlError(502, f"Upstream returned HTTP {response.status}", response.status)
+
+                content = await read_body(response, config.CRAWL_MAX_BYTES)
+                declared = response.charset
+    except asyncio.TimeoutError:
+        logger.error(f"Request timeout: {url}")
+        UPSTREAM_ERRORS.inc(upstream="crawl", kind="timeout")
+        raise CrawlError(504, "Request timeout")
+    except aiohttp.ClientError as e:
+        logger.error(f"Network error: {str(e)}")
+        UPSTREAM_ERRORS.inc(upstream="crawl", kind="network")
+        raise CrawlError(502, "Network error")
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    if entry and entry["content_hash"] == content_hash:
+        await cache.record_revalidated(key, etag, last_modified, not_modified=False)
+        return CrawledPage(entry["title"], entry["content"], content_hash, cached=True)
+
+    # 检测编码
+    with track("charset"):
+        encoding = detect_encoding(content, declared)
+        text = content.decode(encoding, errors='replace')
+    logger.debug(f"Using encoding: {encoding}")
+    return FetchedBody(url, key, etag, last_modified, content_hash, text)
+
+
+async def parse_body(body: FetchedBody, executor: Optional[Executor] = None,
+                     cache: Optional[CrawlCache] = None) -> CrawledPage:
+    """解析fetch_body下载的响应体并写入爬取缓存，正文过短时抛出CrawlError"""
+    with track("parse"):
+        title, content = await extract_content_async(body.text, executor)
+    if len(content) < 10:  # 内容太少，可能是无效页面
+        raise CrawlError(422, "Invalid page content")
+
+    logger.info(f"Extracted title: {title[:50]}...")
+    logger.debug(f"Content length: {len(content)} characters")
+    if cache:
+        await cache.store(body.cache_key, body.url, body.etag, body.last_modified, body.content_hash, title, content)
+    return CrawledPage(title, content, body.content_hash)
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str,
+                     executor: Optional[Executor] = None,
+                     cache: Optional[CrawlCache] = None) -> CrawledPage:
+    """抓取并解析单个页面，失败时抛出CrawlError
+
+    executor为解析进程池，为None时在当前线程解析。传入cache时先查爬取缓存，
+    并对过期条目发送条件请求。
+    """
+    body = await fetch_body(session, url, cache)
+    if isinstance(body, CrawledPage):
+        return body
+    return await parse_body(body, executor, cache)
+
+
+async def crawl_many(session: aiohttp.ClientSession, urls: List[str],
+                     max_concurrency: int = None, per_domain: int = None,
+                     executor: Optional[Executor] = None,
+                     cache: Optional[CrawlCache] = None) -> AsyncIterator[dict]:
+    """并发抓取多个URL，按完成顺序逐个产出结果
+
+    全局信号量限制同时进行的抓取数，按域名的信号量避免把同一站点压垮。
+    单个URL失败不会中断整批，错误以 {"ok": False, ...} 的形式内联返回。
+    若调用方提前停止迭代（如客户端断开），尚未完成的抓取会被取消。
+    """
+    global_limit = asyncio.Semaphore(max_concurrency or config.CRAWL_BATCH_CONCURRENCY)
+    per_domain = per_domain or config.CRAWL_BATCH_PER_DOMAIN
+    domain_limits = defaultdict(lambda: asyncio.Semaphore(per_domain))
+    results = asyncio.Queue()
+
+    async def crawl_one(index: int, url: str):
+        item = {"index": index, "url": url}
+        try:
+            async with domain_limits[urlsplit(url).netloc], global_limit:
+                page = await fetch_page(session, url, executor, cache)
+            item.update(ok=True, title=page.title, content=page.content, cached=page.cached)
+        except CrawlError as e:
+            item.update(ok=False, status_code=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.error(f"Error crawling URL {url}: {str(e)}", exc_info=True)
+            item.update(ok=False, status_code=500, error=str(e))
+        await results.put(item)
+
+    tasks = [asyncio.create_task(crawl_one(i, url)) for i, url in enumerate(urls)]
+    try:
+        for _ in range(len(tasks)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,16 +1,152 @@
 import sqlite3
 import json
-from typing import List, Dict, Any
+import base64
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
 import numpy as np
 import logging
+import os
+import config
+from vector_codec import (
+    DTYPE_CODES,
+    decode_vector,
+    decode_vector_dict,
+    encode_vector,
+    encode_vector_dict,
+    is_encoded,
+)
+from vector_index import IVFIndex, VectorIndex
+from merge_engine import group_values, new_value_set
+from metrics import track
+from simhash import band_values, hamming_distance
+from text_search import (build_match_query, escape_like, make_snippet, query_terms,
+                         reciprocal_rank_fusion, short_terms)
 
 logger = logging.getLogger(__name__)
 
 class DBManager:
-    def __init__(self, db_path: str = "knowledge_base.db"):
+    """SQLite数据访问层
+
+    每个线程使用自己的连接（WAL模式下读写互不阻塞），可以在线程池中并发调用；
+    async代码用 await db.run(db.method, ...) 把调用放到专用线程池执行，不阻塞事件循环。
+    写方法默认各自提交；在 with db.transaction(): 中调用时改为整体一次提交。
+    """
+
+    def __init__(self, db_path: str = "knowledge_base.db", persist_vector_index: bool = None):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        # 是否把IVF索引写回磁盘：多worker部署时只由启动前的父进程保存，worker只读加载
+        self.persist_vector_index = config.WORKERS <= 1 if persist_vector_index is None else persist_vector_index
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # 内存数据库每个连接都是独立的库，只能所有线程共用一个连接
+        self._shared_conn = self._connect() if db_path == ':memory:' else None
+        self._executor = None
+        self._vector_index = None
+        # 索引已包含的最大知识项id和上次对账时间，多worker时据此补上其他进程写入的向量
+        self._vector_index_max_id = 0
+        self._vector_index_checked = 0.0
+        self._vector_refresh_lock = threading.Lock()
+        # 首次加载索引可能耗时数秒，预热和第一个检索同时到达时只加载一次
+        self._vector_load_lock = threading.Lock()
+        # 合并视图各类别的去重状态 {(view_id, category_key): (类别version, 去重状态)}，LRU
+        self._merge_states = OrderedDict()
+        self._merge_states_lock = threading.Lock()
         self.init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=config.DB_BUSY_TIMEOUT, check_same_thread=False)
+        if self.db_path != ':memory:':
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={config.DB_MMAP_SIZE}")
+        # WAL模式下NORMAL只在检查点时fsync，断电最多丢失最近的事务，不会损坏数据库
+        conn.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的连接，首次使用时创建"""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """显式事务：块内的写操作一起提交，出错时整体回滚；可以嵌套，最外层负责提交
+
+        块内通过_after_commit登记的内存状态更新（如向量索引）在提交成功后才执行，回滚时丢弃。
+        """
+        depth = getattr(self._local, 'depth', 0)
+        conn = self.conn
+        if depth == 0:
+            self._local.after_commit = []
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                self._local.after_commit = []
+                conn.rollback()
+            raise
+        self._local.depth = depth
+        if depth == 0:
+            conn.commit()
+            callbacks, self._local.after_commit = self._local.after_commit, []
+            for callback in callbacks:
+                callback()
+    
+    def _commit(self):
+        """不在显式事务中时立即提交"""
+        if not getattr(self._local, 'depth', 0):
+            self.conn.commit()
+    
+    def _after_commit(self, callback):
+        """在当前显式事务提交后执行callback，不在显式事务中时（写操作已提交）立即执行"""
+        if getattr(self._local, 'depth', 0):
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+    
+    async def run(self, func, *args, **kwargs):
+        """在数据库线程池中执行func，供async处理函数调用"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix="db")
+        loop = asyncio.get_running_loop()
+        # 复制上下文，使数据库线程中的日志也带上当前请求的request_id
+        context = contextvars.copy_context()
+
+        def call():
+            with track("db"):
+                return func(*args, **kwargs)
+        return await loop.run_in_executor(self._executor, context.run, call)
+    
+    def close(self):
+        """关闭线程池和所有线程的连接"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._shared_conn = None
+        self._local = threading.local()
         
     def init_db(self):
         """初始化数据库表"""
@@ -40,6 +176,19 @@ class DBManager:
             )
         """)
         
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pages_url ON pages (url)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_items_page_id ON knowledge_items (page_id)")
+        # 加载向量索引时与数据库对账只需要有向量的id；不走这个索引时会把每一行的向量BLOB都读一遍
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_items_vector ON knowledge_items (id) WHERE vector IS NOT NULL"
+        )
+        # 按创建时间分页；带类别的复合索引同时用于按类别过滤
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_items_created ON knowledge_items (created_at, id)")
+        cursor.execute("DROP INDEX IF EXISTS idx_knowledge_items_category")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_items_category_created ON knowledge_items (category, created_at, id)"
+        )
+        
         # 创建知识表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS knowledge (
@@ -50,80 +199,812 @@ class DBManager:
             )
         """)
         
-        self.conn.commit()
+        # 旧库的knowledge表没有vectors_blob列，补上
+        cursor.execute("PRAGMA table_info(knowledge)")
+        if 'vectors_blob' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE knowledge ADD COLUMN vectors_blob BLOB")
+        
+        # 知识图谱：类别名和值各自去重存一份（整数id），kg_facts每行一条“页面-类别-值”事实。
+        # 三种访问路径各有一个覆盖索引：按页面（主键）、按类别取值、按值找页面和相邻的值
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS kg_categories (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS kg_entities (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS kg_facts (
+                page_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                entity_id INTEGER NOT NULL,
+                PRIMARY KEY (page_id, category_id, entity_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_facts_category ON kg_facts (category_id, entity_id, page_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_facts_entity ON kg_facts (entity_id, category_id, page_id)")
+        # knowledge.kg_indexed标记knowledge_json是否已写入图谱，旧数据由backfill_knowledge_graph补建
+        cursor.execute("PRAGMA table_info(knowledge)")
+        if 'kg_indexed' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE knowledge ADD COLUMN kg_indexed INTEGER NOT NULL DEFAULT 0")
+        
+        # 旧库的pages表没有指纹列，补上：simhash为正文指纹，canonical_id指向近似重复的原始页面
+        cursor.execute("PRAGMA table_info(pages)")
+        page_columns = {row[1] for row in cursor.fetchall()}
+        if 'simhash' not in page_columns:
+            cursor.execute("ALTER TABLE pages ADD COLUMN simhash INTEGER")
+        if 'canonical_id' not in page_columns:
+            cursor.execute("ALTER TABLE pages ADD COLUMN canonical_id INTEGER")
+        # 原始页面指纹的分段索引，近似重复查找按段精确匹配
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS page_simhash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                page_id INTEGER NOT NULL,
+                PRIMARY KEY (band, value, page_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # 增量合并视图：每个主题一个物化的合并结果，version在每次变化后加一。
+        # merge_view_values记录每个精确去重后的值被多少个来源提到（provenance），
+        # 计数降为0时该值被撤回；merge_view_categories保存每个类别近似去重后的结果
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS merge_views (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL UNIQUE,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS merge_view_sources (
+                view_id INTEGER NOT NULL,
+                source_id TEXT NOT NULL,
+                knowledge_json TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (view_id, source_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS merge_view_categories (
+                view_id INTEGER NOT NULL,
+                category_key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                values_json TEXT NOT NULL DEFAULT '[]',
+                ambiguous INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (view_id, category_key)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS merge_view_values (
+                view_id INTEGER NOT NULL,
+                category_key TEXT NOT NULL,
+                value_key TEXT NOT NULL,
+                value_json TEXT NOT NULL,
+                provenance INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (view_id, category_key, value_key)
+            ) WITHOUT ROWID
+        """)
+        
+        # 创建爬取缓存表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_cache (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                title TEXT,
+                content TEXT,
+                size INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_cache_last_access ON crawl_cache (last_access)")
+        
+        # 创建LLM结果缓存表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                result_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        
+        # 创建向量缓存表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                cache_key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_access ON embedding_cache (last_access)")
+        
+        # 创建入库任务队列表：每个URL一条任务，stage记录它走到了流水线的哪一步
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                stage TEXT NOT NULL DEFAULT 'fetch',
+                page_id INTEGER,
+                knowledge_json TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                FOREIGN KEY (job_id) REFERENCES ingest_jobs (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_tasks_job ON ingest_tasks (job_id, stage)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingest_tasks_pending ON ingest_tasks (id) WHERE stage NOT IN ('done', 'failed')"
+        )
+        
+        self.fts_enabled = self._init_fts(cursor)
+        self._commit()
+    
+    def _init_fts(self, cursor) -> bool:
+        """创建知识项和网页正文的FTS5全文索引（trigram分词），由触发器与原表保持同步
+
+        SQLite不支持FTS5或trigram分词器（3.34之前）时返回False，关键词检索退回LIKE扫描。
+        """
+        for table, columns, source in (
+            ("knowledge_items_fts", ("content",), "knowledge_items"),
+            ("pages_fts", ("title", "content"), "pages"),
+        ):
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,))
+            exists = cursor.fetchone() is not None
+            column_list = ', '.join(columns)
+            new_values = ', '.join(f"new.{column}" for column in columns)
+            old_values = ', '.join(f"old.{column}" for column in columns)
+            try:
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                        {column_list}, content='{source}', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"FTS5 trigram tokenizer unavailable, keyword search falls back to LIKE: {str(e)}")
+                return False
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN
+                    INSERT INTO {table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN
+                    INSERT INTO {table} ({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {column_list} ON {source} BEGIN
+                    INSERT INTO {table} ({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            """)
+            if not exists:
+                # 已有数据的旧库：一次性建立索引
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        return True
     
-    def store_page(self, url: str, title: str, content: str) -> int:
-        """存储网页信息"""
+    def store_page(self, url: str, title: str, content: str,
+                   fingerprint: int = None, canonical_id: int = None) -> int:
+        """存储网页信息；给出fingerprint时一并保存指纹，原始页面（canonical_id为空）的指纹加入分段索引"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO pages (url, title, content, simhash, canonical_id) VALUES (?, ?, ?, ?, ?)",
+                (url, title, content, fingerprint, canonical_id)
+            )
+            page_id = cursor.lastrowid
+            if fingerprint is not None and canonical_id is None:
+                self._index_fingerprint(page_id, fingerprint)
+        return page_id
+    
+    def _index_fingerprint(self, page_id: int, fingerprint: int):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO page_simhash_bands (band, value, page_id) VALUES (?, ?, ?)",
+            [(band, value, page_id) for band, value in band_values(fingerprint)]
+        )
+    
+    def find_near_duplicate(self, fingerprint: int, max_distance: int = None) -> tuple:
+        """查找指纹汉明距离不超过max_distance的原始页面，返回 (page_id, 距离)，没有时返回None
+
+        只比对至少一段指纹完全相同的候选，代价与页面总数无关。
+        max_distance超过 SIMHASH_BANDS-1 时仍能找到大部分近似页面，但不再保证不漏。
+        """
+        max_distance = config.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        bands = band_values(fingerprint)
+        conditions = ' OR '.join("(b.band = ? AND b.value = ?)" for _ in bands)
         cursor = self.conn.cursor()
         cursor.execute(
-            "INSERT INTO pages (url, title, content) VALUES (?, ?, ?)",
-            (url, title, content)
+            f"""
+            SELECT DISTINCT p.id, p.simhash
+            FROM page_simhash_bands b
+            JOIN pages p ON p.id = b.page_id
+            WHERE {conditions}
+            """,
+            [part for band in bands for part in band]
         )
-        self.conn.commit()
-        return cursor.lastrowid
+        best = None
+        for page_id, candidate in cursor.fetchall():
+            distance = hamming_distance(fingerprint, candidate)
+            if distance <= max_distance and (best is None or (distance, page_id) < (best[1], best[0])):
+                best = (page_id, distance)
+        return best
+    
+    def store_page_deduplicated(self, url: str, title: str, content: str, fingerprint: int,
+                                max_distance: int = None) -> tuple:
+        """查找近似重复并存储页面（同一事务，并发入库的相同页面也只会有一个原始页面）
+
+        返回 (page_id, canonical_id)，不是近似重复时canonical_id为None。
+        """
+        with self.transaction():
+            match = self.find_near_duplicate(fingerprint, max_distance)
+            canonical_id = match[0] if match else None
+            page_id = self.store_page(url, title, content, fingerprint, canonical_id)
+        return page_id, canonical_id
+    
+    def backfill_page_fingerprints(self, fingerprint_func, batch_size: int = 500) -> int:
+        """为还没有指纹的旧页面计算指纹并加入分段索引（旧页面都作为原始页面），返回处理的页面数"""
+        done = 0
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, content FROM pages WHERE simhash IS NULL ORDER BY id LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                return done
+            with self.transaction() as conn:
+                for page_id, content in rows:
+                    fingerprint = fingerprint_func(content or '')
+                    conn.execute("UPDATE pages SET simhash = ? WHERE id = ?", (fingerprint, page_id))
+                    self._index_fingerprint(page_id, fingerprint)
+            done += len(rows)
+    
+    def store_pages(self, pages: List[tuple]) -> List[int]:
+        """批量存储网页信息，pages为 (url, title, content) 列表，返回对应的id"""
+        if not pages:
+            return []
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("INSERT INTO pages (url, title, content) VALUES (?, ?, ?)", pages)
+            last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        # 事务持有写锁，自增id连续分配
+        return list(range(last_id - len(pages) + 1, last_id + 1))
     
     def store_knowledge(self, page_id: int, knowledge_dict: Dict[str, List[str]], vectors: Dict[str, List[List[float]]]):
-        """存储知识项及其向量"""
-        cursor = self.conn.cursor()
-        
+        """存储知识项及其向量（一次executemany写入）"""
+        rows, indexed = [], []
         for category, items in knowledge_dict.items():
+            category_vectors = vectors.get(category) or []
             for idx, content in enumerate(items):
-                vector = vectors.get(category, [])[idx] if vectors.get(category) else None
-                vector_blob = np.array(vector).tobytes() if vector else None
-                
-                cursor.execute(
-                    "INSERT INTO knowledge_items (page_id, category, content, vector) VALUES (?, ?, ?, ?)",
-                    (page_id, category, content, vector_blob)
-                )
+                vector = category_vectors[idx] if idx < len(category_vectors) else None
+                rows.append((page_id, category, content, encode_vector(vector) if vector else None))
+                if vector:
+                    indexed.append((len(rows) - 1, category, vector))
+        if not rows:
+            return
         
-        self.conn.commit()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO knowledge_items (page_id, category, content, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            first_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0] - len(rows) + 1
+        
+        # 已加载的向量索引增量更新，无需重新加载；外层事务回滚时不更新
+        if indexed:
+            ids = [first_id + offset for offset, _, _ in indexed]
+            categories = [category for _, category, _ in indexed]
+            vectors = np.array([vector for _, _, vector in indexed], dtype=np.float32)
+
+            def update_index():
+                # 索引正在加载时等它完成：加载可能在本次提交之前就读完了向量，之后直接加入才不会丢
+                with self._vector_load_lock:
+                    if self._vector_index is not None:
+                        self._vector_index.add(ids, categories, vectors)
+            self._after_commit(update_index)
     
-    def search_similar_knowledge(self, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
-        """搜索相似的知识项"""
-        query_vector_np = np.array(query_vector)
-        results = []
+    @property
+    def vector_index(self):
+        """首次使用时加载向量索引（VectorIndex或IVFIndex，见config.VECTOR_INDEX），之后由store_knowledge增量维护
+
+        多worker部署时其他进程写入的向量不经过本进程，每隔VECTOR_INDEX_REFRESH_SECONDS按id增量补上。
+        """
+        if self._vector_index is None:
+            with self._vector_load_lock:
+                if self._vector_index is None:
+                    max_id = self._max_knowledge_item_id()
+                    index = self._load_vector_index()
+                    self._vector_index_max_id = max_id
+                    self._vector_index_checked = time.monotonic()
+                    self._vector_index = index
+        elif config.WORKERS > 1:
+            self._refresh_vector_index()
+        return self._vector_index
+    
+    def _max_knowledge_item_id(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM knowledge_items").fetchone()[0]
+    
+    def _refresh_vector_index(self):
+        """补上其他进程新写入的向量；已在刷新时直接跳过，不阻塞检索
+
+        其他进程删除的知识项不会从索引中移除，检索结果回表时会被过滤掉。
+        """
+        if time.monotonic() - self._vector_index_checked < config.VECTOR_INDEX_REFRESH_SECONDS:
+            return
+        if not self._vector_refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._vector_index_checked = time.monotonic()
+            max_id = self._max_knowledge_item_id()
+            if max_id <= self._vector_index_max_id:
+                return
+            added = 0
+            for ids, categories, vectors in self._iter_vectors(after_id=self._vector_index_max_id):
+                added += self._vector_index.add(ids, categories, vectors)
+            self._vector_index_max_id = max_id
+            if added:
+                logger.info(f"Added {added} vectors written by other workers to the vector index")
+        finally:
+            self._vector_refresh_lock.release()
+    
+    def warm_vector_index(self) -> dict:
+        """加载向量索引并做一次检索，把内存映射的向量读入页缓存，避免第一个请求承担加载开销"""
+        index = self.vector_index
+        if len(index) and index.dim:
+            index.search(np.ones(index.dim, dtype=np.float32), 1)
+        return {
+            'vectors': len(index),
+            'memory_mapped': getattr(index, 'is_memory_mapped', False),
+        }
+    
+    def worker_lock_path(self, name: str) -> str:
+        """多worker之间协调用的锁文件：<db>.<name>.lock，内存数据库只在单进程内使用，不需要"""
+        if self.db_path == ':memory:':
+            return None
+        return f"{self.db_path}.{name}.lock"
+    
+    @property
+    def vector_index_path(self) -> str:
+        """IVF索引文件保存在数据库文件旁边，内存数据库不持久化"""
+        if self.db_path == ':memory:':
+            return None
+        return f"{self.db_path}.ivf.npz"
+    
+    def _iter_vectors(self, ids: List[int] = None, batch_size: int = 10000, after_id: int = 0):
+        """分批读取向量（指定ids时只读这些，否则读id大于after_id的全部），产出 (ids, categories, float32矩阵)"""
+        cursor = self.conn.cursor()
+        if ids is None:
+            cursor.execute("SELECT id, category, vector FROM knowledge_items WHERE vector IS NOT NULL AND id > ?",
+                           (after_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch_ids, categories, blobs = zip(*rows)
+                yield batch_ids, categories, np.stack([self._decode_vector(blob) for blob in blobs])
+            return
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT id, category, vector FROM knowledge_items WHERE id IN ({placeholders}) AND vector IS NOT NULL",
+                chunk
+            )
+            rows = cursor.fetchall()
+            if rows:
+                batch_ids, categories, blobs = zip(*rows)
+                yield batch_ids, categories, np.stack([self._decode_vector(blob) for blob in blobs])
+    
+    @staticmethod
+    def _decode_vector(blob: bytes) -> np.ndarray:
+        return decode_vector(blob)
+    
+    def _vector_ids(self) -> set:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM knowledge_items WHERE vector IS NOT NULL")
+        return {row[0] for row in cursor.fetchall()}
+    
+    def _reconcile_index(self, index, db_ids: set):
+        """与数据库对账：补上索引保存之后新增的向量，删掉已不存在的"""
+        index_ids = set(index.ids())
+        stale = index_ids - db_ids
+        if stale:
+            index.remove(stale)
+        for batch_ids, categories, vectors in self._iter_vectors(sorted(db_ids - index_ids)):
+            index.add(batch_ids, categories, vectors)
+    
+    def _load_vector_index(self):
+        if config.VECTOR_INDEX == 'ivf':
+            index = self._load_ivf_index()
+            if index is not None:
+                return index
+        
+        prefix = self.vector_sidecar_prefix
+        if config.VECTOR_SIDECAR and prefix and os.path.exists(f"{prefix}.npy"):
+            try:
+                index = VectorIndex.load_sidecar(prefix, mmap=True)
+                self._reconcile_index(index, self._vector_ids())
+                logger.info(f"Loaded vector index with {len(index)} vectors from {prefix}.npy "
+                            f"(memory-mapped: {index.is_memory_mapped})")
+                return index
+            except Exception as e:
+                logger.warning(f"Failed to load vector sidecar {prefix}.npy: {str(e)}")
+        
+        index = VectorIndex()
+        for ids, categories, vectors in self._iter_vectors():
+            index.add(ids, categories, vectors)
+        logger.info(f"Loaded vector index with {len(index)} vectors")
+        return index
+    
+    def _load_ivf_index(self) -> IVFIndex:
+        """加载或训练IVF索引；向量数不足IVF_MIN_VECTORS时返回None"""
+        db_ids = self._vector_ids()
+        if len(db_ids) < config.IVF_MIN_VECTORS:
+            return None
         
+        path = self.vector_index_path
+        index = None
+        if path and os.path.exists(path):
+            try:
+                index = IVFIndex.load(path)
+                index.nprobe = config.IVF_NPROBE
+            except Exception as e:
+                logger.warning(f"Failed to load IVF index from {path}, rebuilding: {str(e)}")
+        # 数据量比训练时增长了4倍以上，质心已不具代表性，重新训练
+        if index is not None and len(db_ids) > 4 * index.trained_size:
+            logger.info("Vector count grew past 4x the IVF training size, retraining")
+            index = None
+        
+        if index is None:
+            ids, categories, vectors = [], [], []
+            for batch_ids, batch_categories, batch_vectors in self._iter_vectors():
+                ids.extend(batch_ids)
+                categories.extend(batch_categories)
+                vectors.append(batch_vectors)
+            vectors = np.concatenate(vectors)
+            index = IVFIndex.train(vectors, config.IVF_NLIST, config.IVF_NPROBE)
+            index.add(ids, categories, vectors)
+            logger.info(f"Trained IVF index with {index.nlist} lists over {len(index)} vectors")
+        else:
+            self._reconcile_index(index, db_ids)
+            logger.info(f"Loaded IVF index with {len(index)} vectors from {path}")
+        
+        if path and self.persist_vector_index:
+            index.save(path)
+        return index
+    
+    @property
+    def vector_sidecar_prefix(self) -> str:
+        """内存映射向量文件的路径前缀：<db>.vectors.npy / <db>.vectors.meta.npz"""
+        if self.db_path == ':memory:':
+            return None
+        return f"{self.db_path}.vectors"
+    
+    def export_vector_sidecar(self) -> int:
+        """把全部向量导出为可内存映射的.npy文件，供多个检索进程零拷贝共享，返回导出的向量数"""
+        index = self._vector_index if isinstance(self._vector_index, VectorIndex) else None
+        if index is None:
+            index = VectorIndex()
+            for ids, categories, vectors in self._iter_vectors():
+                index.add(ids, categories, vectors)
+        index.save_sidecar(self.vector_sidecar_prefix)
+        logger.info(f"Exported {len(index)} vectors to {self.vector_sidecar_prefix}.npy")
+        return len(index)
+    
+    def migrate_vectors(self, dtype: str = None, batch_size: int = 1000) -> dict:
+        """把旧格式的向量改写为带头部的紧凑格式
+
+        - knowledge_items.vector：旧版float64 BLOB（或dtype与目标不同的BLOB）重新编码；
+        - knowledge.vectors_json：转成vectors_blob并清空JSON列。
+        返回各自改写的行数。
+        """
+        dtype = dtype or config.VECTOR_DTYPE
+        target_code = DTYPE_CODES[dtype]
         cursor = self.conn.cursor()
-        cursor.execute("SELECT id, category, content, vector FROM knowledge_items WHERE vector IS NOT NULL")
+        migrated = {"knowledge_items": 0, "knowledge": 0}
         
-        for row in cursor.fetchall():
-            id_, category, content, vector_blob = row
-            if vector_blob:
-                vector = np.frombuffer(vector_blob).reshape(-1)
-                similarity = np.dot(query_vector_np, vector) / (np.linalg.norm(query_vector_np) * np.linalg.norm(vector))
-                results.append({
-                    'id': id_,
-                    'category': category,
-                    'content': content,
-                    'similarity': float(similarity)
-                })
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT id, vector FROM knowledge_items WHERE vector IS NOT NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [
+                (encode_vector(decode_vector(blob), dtype), id_)
+                for id_, blob in rows
+                if not is_encoded(blob) or blob[3] != target_code
+            ]
+            cursor.executemany("UPDATE knowledge_items SET vector = ? WHERE id = ?", updates)
+            self._commit()
+            migrated["knowledge_items"] += len(updates)
+        
+        cursor.execute("SELECT page_id, vectors_json FROM knowledge WHERE vectors_json IS NOT NULL")
+        for page_id, vectors_json in cursor.fetchall():
+            self.conn.execute(
+                "UPDATE knowledge SET vectors_blob = ?, vectors_json = NULL WHERE page_id = ?",
+                (encode_vector_dict(json.loads(vectors_json), dtype), page_id)
+            )
+            migrated["knowledge"] += 1
+        self._commit()
         
-        # 按相似度降序排序并返回前N个结果
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        return results[:limit]
+        # 格式变了，已加载的索引需要重新加载
+        self._vector_index = None
+        logger.info(f"Migrated vectors to {dtype}: {migrated}")
+        return migrated
+    
+    def save_vector_index(self):
+        """把已加载的IVF索引保存到磁盘（精确索引不需要持久化）；persist_vector_index为False时不保存"""
+        if not self.persist_vector_index:
+            return
+        if isinstance(self._vector_index, IVFIndex) and self.vector_index_path:
+            self._vector_index.save(self.vector_index_path)
+    
+    def delete_knowledge_items(self, ids: List[int]) -> int:
+        """删除知识项，并同步从已加载的向量索引中移除"""
+        ids = list(ids)
+        cursor = self.conn.cursor()
+        deleted = 0
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"DELETE FROM knowledge_items WHERE id IN ({placeholders})", chunk)
+            deleted += cursor.rowcount
+        self._commit()
 
-    def get_all_knowledge(self) -> List[Dict[str, Any]]:
-        """获取所有知识项"""
+        def update_index():
+            with self._vector_load_lock:
+                if self._vector_index is not None:
+                    self._vector_index.remove(ids)
+        self._after_commit(update_index)
+        return deleted
+    
+    def _fetch_knowledge_items(self, ids: List[int]) -> Dict[int, tuple]:
+        """按id批量读取知识项的 (category, content)"""
         cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT k.id, k.category, k.content, p.url, p.title
-            FROM knowledge_items k
-            JOIN pages p ON k.page_id = p.id
-            ORDER BY k.created_at DESC
-        """)
+        items = {}
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT id, category, content FROM knowledge_items WHERE id IN ({placeholders})",
+                chunk
+            )
+            items.update((row[0], (row[1], row[2])) for row in cursor.fetchall())
+        return items
+    
+    def search_similar_knowledge(self, query_vector: List[float], limit: int = 5,
+                                 category: str = None) -> List[Dict[str, Any]]:
+        """搜索相似的知识项，可按类别过滤"""
+        return self.search_similar_knowledge_batch([query_vector], limit, category)[0]
+    
+    def search_similar_knowledge_batch(self, query_vectors: List[List[float]], limit: int = 5,
+                                       category: str = None) -> List[List[Dict[str, Any]]]:
+        """批量搜索相似的知识项，每个查询向量返回一个结果列表"""
+        with track("vector_search"):
+            hits = self.vector_index.search_batch(query_vectors, limit, category)
+        items = self._fetch_knowledge_items(sorted({id_ for result in hits for id_, _ in result}))
         
         results = []
-        for row in cursor.fetchall():
-            results.append({
-                'id': row[0],
-                'category': row[1],
-                'content': row[2],
-                'url': row[3],
-                'page_title': row[4]
-            })
-        
+        for result in hits:
+            results.append([
+                {
+                    'id': id_,
+                    'category': items[id_][0],
+                    'content': items[id_][1],
+                    'similarity': similarity
+                }
+                for id_, similarity in result if id_ in items
+            ])
         return results
 
+    def search_knowledge_text(self, query: str, limit: int = 5,
+                              category: str = None) -> List[Dict[str, Any]]:
+        """关键词检索知识项，按BM25得分（越大越相关）排序，不需要查询向量"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = build_match_query(terms) if self.fts_enabled else ''
+        category_filter = "AND k.category = ?" if category is not None else ""
+        params = [category] if category is not None else []
+        cursor = self.conn.cursor()
+        with track("text_search"):
+            if match:
+                # 不足三个字的词不在MATCH表达式中，用LIKE过滤FTS的结果，所有词都必须出现
+                short = short_terms(terms)
+                like_filter = ''.join(" AND k.content LIKE ? ESCAPE '\\'" for _ in short)
+                cursor.execute(
+                    f"""
+                    SELECT k.id, k.category, k.content, -bm25(knowledge_items_fts)
+                    FROM knowledge_items_fts
+                    JOIN knowledge_items k ON k.id = knowledge_items_fts.rowid
+                    WHERE knowledge_items_fts MATCH ?{like_filter} {category_filter}
+                    ORDER BY bm25(knowledge_items_fts)
+                    LIMIT ?
+                    """,
+                    [match, *(f"%{escape_like(term)}%" for term in short), *params, limit]
+                )
+            else:
+                # 只有不足三个字的词（或没有FTS5）：逐行LIKE匹配，较短的内容排在前面
+                conditions = ' AND '.join("k.content LIKE ? ESCAPE '\\'" for _ in terms)
+                cursor.execute(
+                    f"""
+                    SELECT k.id, k.category, k.content, 1.0 / length(k.content)
+                    FROM knowledge_items k
+                    WHERE {conditions} {category_filter}
+                    ORDER BY length(k.content), k.id
+                    LIMIT ?
+                    """,
+                    [*(f"%{escape_like(term)}%" for term in terms), *params, limit]
+                )
+            rows = cursor.fetchall()
+        return [
+            {'id': row[0], 'category': row[1], 'content': row[2], 'score': row[3]}
+            for row in rows
+        ]
+
+    def search_pages_text(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """关键词检索网页，返回标题、URL和命中片段"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = build_match_query(terms) if self.fts_enabled else ''
+        cursor = self.conn.cursor()
+        with track("text_search"):
+            if match:
+                short = short_terms(terms)
+                like_filter = ''.join(
+                    " AND (p.title LIKE ? ESCAPE '\\' OR p.content LIKE ? ESCAPE '\\')" for _ in short
+                )
+                cursor.execute(
+                    f"""
+                    SELECT p.id, p.url, p.title, p.content, -bm25(pages_fts)
+                    FROM pages_fts
+                    JOIN pages p ON p.id = pages_fts.rowid
+                    WHERE pages_fts MATCH ?{like_filter}
+                    ORDER BY bm25(pages_fts)
+                    LIMIT ?
+                    """,
+                    [match, *(f"%{escape_like(term)}%" for term in short for _ in range(2)), limit]
+                )
+            else:
+                conditions = ' AND '.join("(title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')" for _ in terms)
+                patterns = [pattern for term in terms for pattern in (f"%{escape_like(term)}%",) * 2]
+                cursor.execute(
+                    f"SELECT id, url, title, content, 0.0 FROM pages WHERE {conditions} ORDER BY id DESC LIMIT ?",
+                    [*patterns, limit]
+                )
+            rows = cursor.fetchall()
+        return [
+            {'id': row[0], 'url': row[1], 'title': row[2], 'snippet': make_snippet(row[3], terms), 'score': row[4]}
+            for row in rows
+        ]
+
+    def search_hybrid(self, query: str, query_vector: List[float] = None, limit: int = 5,
+                      category: str = None, candidates: int = None) -> List[Dict[str, Any]]:
+        """关键词与向量混合检索，用倒数排名融合（RRF）合并两路结果
+
+        没有提供query_vector时只用关键词检索，不需要请求向量接口。
+        每路各取candidates个候选（默认limit的4倍），结果按融合得分排序。
+        """
+        candidates = candidates or max(limit * 4, 20)
+        text_hits = self.search_knowledge_text(query, candidates, category)
+        vector_hits = []
+        if query_vector is not None:
+            with track("vector_search"):
+                vector_hits = self.vector_index.search(query_vector, candidates, category)
+        
+        text_ranks = {hit['id']: rank for rank, hit in enumerate(text_hits, start=1)}
+        vector_ranks = {id_: rank for rank, (id_, _) in enumerate(vector_hits, start=1)}
+        similarities = dict(vector_hits)
+        fused = reciprocal_rank_fusion([[hit['id'] for hit in text_hits], [id_ for id_, _ in vector_hits]],
+                                       k=config.SEARCH_RRF_K)
+        top = sorted(fused, key=lambda id_: (-fused[id_], id_))[:limit]
+        
+        known = {hit['id']: (hit['category'], hit['content']) for hit in text_hits}
+        items = {**self._fetch_knowledge_items([id_ for id_ in top if id_ not in known]), **known}
+        return [
+            {
+                'id': id_,
+                'category': items[id_][0],
+                'content': items[id_][1],
+                'score': fused[id_],
+                'text_rank': text_ranks.get(id_),
+                'vector_rank': vector_ranks.get(id_),
+                'similarity': similarities.get(id_),
+            }
+            for id_ in top if id_ in items
+        ]
+
+    _KNOWLEDGE_FIELDS = ('id', 'category', 'content', 'url', 'page_title', 'created_at')
+
+    @staticmethod
+    def encode_page_cursor(created_at: str, id_: int) -> str:
+        """把一页最后一行的 (created_at, id) 编码为不透明的游标字符串"""
+        raw = json.dumps([created_at, id_]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_page_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            created_at, id_ = json.loads(raw)
+            return created_at, int(id_)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid page cursor: {cursor}") from e
+
+    def get_knowledge_page(self, limit: int = 100, cursor: str = None,
+                           category: str = None) -> tuple:
+        """按创建时间倒序分页读取知识项（键集分页），返回 (本页结果, 下一页游标或None)
+
+        游标记录上一页最后一行的 (created_at, id)，每页都走索引定位，
+        翻到多深的位置耗时都一样，也不会因为中途插入新数据而重复或漏掉行。
+        """
+        conditions, params = [], []
+        if cursor:
+            conditions.append("(k.created_at, k.id) < (?, ?)")
+            params.extend(self.decode_page_cursor(cursor))
+        if category is not None:
+            conditions.append("k.category = ?")
+            params.append(category)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(
+            f"""
+            SELECT k.id, k.category, k.content, p.url, p.title, k.created_at
+            FROM knowledge_items k
+            JOIN pages p ON k.page_id = p.id
+            {where}
+            ORDER BY k.created_at DESC, k.id DESC
+            LIMIT ?
+            """,
+            [*params, limit]
+        ).fetchall()
+        items = [dict(zip(self._KNOWLEDGE_FIELDS, row)) for row in rows]
+        next_cursor = self.encode_page_cursor(rows[-1][5], rows[-1][0]) if len(rows) == limit else None
+        return items, next_cursor
+
+    def iter_knowledge(self, batch_size: int = 1000, category: str = None) -> Iterator[Dict[str, Any]]:
+        """逐批读取全部知识项，内存占用与表大小无关
+
+        每批是一次独立的查询，两批之间不持有游标或读事务，可以在不同线程中继续迭代。
+        """
+        cursor = None
+        while True:
+            items, cursor = self.get_knowledge_page(batch_size, cursor, category)
+            yield from items
+            if cursor is None:
+                break
+
+    def get_all_knowledge(self) -> List[Dict[str, Any]]:
+        """获取所有知识项（数据量大时请使用iter_knowledge或get_knowledge_page）"""
+        return list(self.iter_knowledge())
+
     def get_page(self, page_id: int) -> dict:
         """获取页面信息"""
         try:
@@ -145,23 +1026,219 @@ class DBManager:
             raise
 
     def store_knowledge_only(self, page_id: int, knowledge: dict):
-        """只存储知识，不包含向量"""
+        """只存储知识，不包含向量；同时增量更新该页面在知识图谱中的事实"""
         try:
-            cursor = self.conn.cursor()
-            # 存储知识
-            knowledge_json = json.dumps(knowledge)
-            cursor.execute(
-                """
-                INSERT OR REPLACE INTO knowledge (page_id, knowledge_json)
-                VALUES (?, ?)
-                """,
-                (page_id, knowledge_json)
-            )
-            self.conn.commit()
+            with self.transaction() as conn:
+                # 存储知识
+                knowledge_json = json.dumps(knowledge)
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO knowledge (page_id, knowledge_json, kg_indexed)
+                    VALUES (?, ?, 1)
+                    """,
+                    (page_id, knowledge_json)
+                )
+                self._update_graph_facts(page_id, knowledge)
         except Exception as e:
             logger.error(f"Error storing knowledge: {str(e)}")
             raise
 
+    @staticmethod
+    def _knowledge_facts(knowledge: dict) -> set:
+        """把 {类别: 值或值列表} 展开成 {(类别, 值)}，非字符串的值序列化为JSON"""
+        facts = set()
+        for category, values in (knowledge or {}).items():
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if value is None:
+                    continue
+                text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+                text = text.strip()
+                if text:
+                    facts.add((str(category).strip(), text))
+        return facts
+
+    def _intern(self, table: str, names: set) -> Dict[str, int]:
+        """返回名称到id的映射，不存在的名称先插入（table为kg_categories或kg_entities）"""
+        if not names:
+            return {}
+        conn = self.conn
+        conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(name,) for name in names])
+        ids = {}
+        names = list(names)
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = conn.execute(
+                f"SELECT name, id FROM {table} WHERE name IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            ids.update(rows)
+        return ids
+
+    def _update_graph_facts(self, page_id: int, knowledge: dict):
+        """对比页面已有的事实，只删除消失的、插入新增的（需在事务中调用）"""
+        facts = self._knowledge_facts(knowledge)
+        category_ids = self._intern('kg_categories', {category for category, _ in facts})
+        entity_ids = self._intern('kg_entities', {value for _, value in facts})
+        wanted = {(category_ids[category], entity_ids[value]) for category, value in facts}
+        conn = self.conn
+        existing = set(conn.execute(
+            "SELECT category_id, entity_id FROM kg_facts WHERE page_id = ?", (page_id,)
+        ).fetchall())
+        conn.executemany(
+            "DELETE FROM kg_facts WHERE page_id = ? AND category_id = ? AND entity_id = ?",
+            [(page_id, category_id, entity_id) for category_id, entity_id in existing - wanted]
+        )
+        conn.executemany(
+            "INSERT INTO kg_facts (page_id, category_id, entity_id) VALUES (?, ?, ?)",
+            [(page_id, category_id, entity_id) for category_id, entity_id in wanted - existing]
+        )
+
+    def backfill_knowledge_graph(self, batch_size: int = 500) -> int:
+        """把尚未写入图谱的旧knowledge_json补建为事实，返回处理的页面数；可重复调用"""
+        total, last_id = 0, -1
+        while True:
+            rows = self.conn.execute(
+                """
+                SELECT page_id, knowledge_json FROM knowledge
+                WHERE page_id > ? AND kg_indexed = 0
+                ORDER BY page_id
+                LIMIT ?
+                """,
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return total
+            last_id = rows[-1][0]
+            with self.transaction() as conn:
+                for page_id, knowledge_json in rows:
+                    try:
+                        knowledge = json.loads(knowledge_json) if knowledge_json else {}
+                    except json.JSONDecodeError:
+                        knowledge = {}
+                    self._update_graph_facts(page_id, knowledge if isinstance(knowledge, dict) else {})
+                conn.executemany("UPDATE knowledge SET kg_indexed = 1 WHERE page_id = ?",
+                                 [(page_id,) for page_id, _ in rows])
+            total += len(rows)
+
+    def _graph_id(self, table: str, name: str):
+        row = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def get_graph_categories(self) -> List[Dict[str, Any]]:
+        """所有类别及其事实数"""
+        cursor = self.conn.execute(
+            """
+            SELECT c.name, COUNT(*)
+            FROM kg_facts f JOIN kg_categories c ON c.id = f.category_id
+            GROUP BY f.category_id
+            ORDER BY COUNT(*) DESC, c.name
+            """
+        )
+        return [{'category': row[0], 'facts': row[1]} for row in cursor.fetchall()]
+
+    def get_category_values(self, category: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """某个类别下所有页面出现过的值，按出现的页面数倒序（走idx_kg_facts_category，不解析JSON）"""
+        category_id = self._graph_id('kg_categories', category)
+        if category_id is None:
+            return []
+        cursor = self.conn.execute(
+            """
+            SELECT e.name, v.pages
+            FROM (
+                SELECT entity_id, COUNT(*) AS pages FROM kg_facts
+                WHERE category_id = ?
+                GROUP BY entity_id
+                ORDER BY pages DESC, entity_id
+                LIMIT ?
+            ) v JOIN kg_entities e ON e.id = v.entity_id
+            ORDER BY v.pages DESC, v.entity_id
+            """,
+            (category_id, limit)
+        )
+        return [{'value': row[0], 'pages': row[1]} for row in cursor.fetchall()]
+
+    def find_pages_by_value(self, value: str, category: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """包含某个值的页面，可限定类别（走idx_kg_facts_entity）"""
+        entity_id = self._graph_id('kg_entities', value)
+        if entity_id is None:
+            return []
+        category_filter, params = "", [entity_id]
+        if category is not None:
+            category_id = self._graph_id('kg_categories', category)
+            if category_id is None:
+                return []
+            category_filter, params = "AND f.category_id = ?", [entity_id, category_id]
+        cursor = self.conn.execute(
+            f"""
+            SELECT p.id, p.url, p.title, c.name
+            FROM kg_facts f
+            JOIN pages p ON p.id = f.page_id
+            JOIN kg_categories c ON c.id = f.category_id
+            WHERE f.entity_id = ? {category_filter}
+            ORDER BY f.page_id DESC
+            LIMIT ?
+            """,
+            [*params, limit]
+        )
+        return [{'page_id': row[0], 'url': row[1], 'title': row[2], 'category': row[3]} for row in cursor.fetchall()]
+
+    def get_page_facts(self, page_id: int) -> Dict[str, List[str]]:
+        """页面的全部事实，按类别分组"""
+        cursor = self.conn.execute(
+            """
+            SELECT c.name, e.name
+            FROM kg_facts f
+            JOIN kg_categories c ON c.id = f.category_id
+            JOIN kg_entities e ON e.id = f.entity_id
+            WHERE f.page_id = ?
+            ORDER BY c.name, e.name
+            """,
+            (page_id,)
+        )
+        facts = {}
+        for category, value in cursor.fetchall():
+            facts.setdefault(category, []).append(value)
+        return facts
+
+    def get_value_neighbors(self, value: str, category: str = None, limit: int = 20,
+                            max_pages: int = 1000) -> List[Dict[str, Any]]:
+        """与某个值出现在同一页面的其他值（图上的一跳邻居），按共同出现的页面数倒序
+
+        只统计包含该值的最近max_pages个页面，出现在大部分页面中的常见值查询代价也有上限。
+        """
+        entity_id = self._graph_id('kg_entities', value)
+        if entity_id is None:
+            return []
+        category_filter, params = "", [entity_id]
+        if category is not None:
+            category_id = self._graph_id('kg_categories', category)
+            if category_id is None:
+                return []
+            category_filter, params = "AND category_id = ?", [entity_id, category_id]
+        cursor = self.conn.execute(
+            f"""
+            SELECT e.name, c.name, n.shared
+            FROM (
+                SELECT f.entity_id, f.category_id, COUNT(DISTINCT f.page_id) AS shared
+                FROM (
+                    SELECT DISTINCT page_id FROM kg_facts WHERE entity_id = ? {category_filter}
+                    ORDER BY page_id DESC LIMIT ?
+                ) src
+                JOIN kg_facts f ON f.page_id = src.page_id
+                WHERE f.entity_id != ?
+                GROUP BY f.entity_id, f.category_id
+                ORDER BY shared DESC, f.entity_id
+                LIMIT ?
+            ) n
+            JOIN kg_entities e ON e.id = n.entity_id
+            JOIN kg_categories c ON c.id = n.category_id
+            ORDER BY n.shared DESC, n.entity_id
+            """,
+            [*params, max_pages, entity_id, limit]
+        )
+        return [{'value': row[0], 'category': row[1], 'shared_pages': row[2]} for row in cursor.fetchall()]
+
     def get_knowledge(self, page_id: int) -> dict:
         """获取页面的知识"""
         try:
@@ -179,19 +1256,524 @@ class DBManager:
             raise
 
     def store_vectors(self, page_id: int, vectors: dict):
-        """存储知识向量"""
+        """存储知识向量（紧凑二进制格式，见vector_codec）"""
         try:
             cursor = self.conn.cursor()
-            vectors_json = json.dumps(vectors)
             cursor.execute(
                 """
                 UPDATE knowledge
-                SET vectors_json = ?
+                SET vectors_blob = ?, vectors_json = NULL
                 WHERE page_id = ?
                 """,
-                (vectors_json, page_id)
+                (encode_vector_dict(vectors), page_id)
             )
-            self.conn.commit()
+            self._commit()
         except Exception as e:
             logger.error(f"Error storing vectors: {str(e)}")
             raise
+
+    def get_vectors(self, page_id: int) -> dict:
+        """获取页面的知识向量，兼容旧版vectors_json"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT vectors_blob, vectors_json FROM knowledge WHERE page_id = ?",
+            (page_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if row[0] is not None:
+            return decode_vector_dict(row[0])
+        return json.loads(row[1]) if row[1] else None
+
+    def _get_or_create_merge_view(self, topic: str) -> tuple:
+        conn = self.conn
+        conn.execute("INSERT OR IGNORE INTO merge_views (topic) VALUES (?)", (topic,))
+        return conn.execute("SELECT id, version FROM merge_views WHERE topic = ?", (topic,)).fetchone()
+
+    def put_merge_source(self, topic: str, source_id: str, knowledge: dict) -> dict:
+        """把一个来源的知识并入主题的合并视图（新增或替换），只重新去重受影响的类别
+
+        返回 {'topic', 'version', 'changed': [变化的类别名]}；内容与上次相同时version不变。
+        """
+        states = {}
+        with self.transaction() as conn:
+            view_id, version = self._get_or_create_merge_view(topic)
+            row = conn.execute(
+                "SELECT knowledge_json FROM merge_view_sources WHERE view_id = ? AND source_id = ?",
+                (view_id, source_id)
+            ).fetchone()
+            old = json.loads(row[0]) if row else {}
+            knowledge_json = json.dumps(knowledge, ensure_ascii=False, sort_keys=True)
+            if row and row[0] == knowledge_json:
+                return {'topic': topic, 'version': version, 'changed': []}
+            version += 1
+            changed = self._fold_merge_delta(view_id, version, group_values(old), group_values(knowledge), states)
+            conn.execute(
+                "INSERT OR REPLACE INTO merge_view_sources (view_id, source_id, knowledge_json, version) "
+                "VALUES (?, ?, ?, ?)",
+                (view_id, source_id, knowledge_json, version)
+            )
+            conn.execute("UPDATE merge_views SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (version, view_id))
+        self._keep_merge_states(states)
+        return {'topic': topic, 'version': version, 'changed': changed}
+
+    def delete_merge_source(self, topic: str, source_id: str) -> dict:
+        """从合并视图中撤回一个来源：只由它提供的值被删除，受影响的类别重新去重；来源不存在时返回None"""
+        states = {}
+        with self.transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT v.id, v.version, s.knowledge_json
+                FROM merge_views v JOIN merge_view_sources s ON s.view_id = v.id
+                WHERE v.topic = ? AND s.source_id = ?
+                """,
+                (topic, source_id)
+            ).fetchone()
+            if row is None:
+                return None
+            view_id, version, knowledge_json = row
+            version += 1
+            changed = self._fold_merge_delta(view_id, version, group_values(json.loads(knowledge_json)), {}, states)
+            conn.execute("DELETE FROM merge_view_sources WHERE view_id = ? AND source_id = ?", (view_id, source_id))
+            conn.execute("UPDATE merge_views SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (version, view_id))
+        self._keep_merge_states(states)
+        return {'topic': topic, 'version': version, 'changed': changed}
+
+    def _keep_merge_states(self, states: dict):
+        """事务提交后缓存各类别新的去重状态；外层还有事务时可能回滚，不缓存"""
+        if getattr(self._local, 'depth', 0) or not config.MERGE_VIEW_CACHE_CATEGORIES:
+            return
+        with self._merge_states_lock:
+            for key, state in states.items():
+                self._merge_states[key] = state
+                self._merge_states.move_to_end(key)
+            while len(self._merge_states) > config.MERGE_VIEW_CACHE_CATEGORIES:
+                self._merge_states.popitem(last=False)
+
+    def _fold_merge_delta(self, view_id: int, version: int, old: dict, new: dict, states: dict) -> List[str]:
+        """按一个来源新旧两份知识的差异更新provenance计数，并更新受影响类别的去重结果（需在事务中调用）
+
+        old/new为merge_engine.group_values的结果。某个类别只有在出现了新的值、或有值的计数降为0时才需要更新；
+        已有的值再被一个来源提到只是计数加一。只新增了值且缓存了该类别上一版本的去重状态时，
+        新值接着add即可；有值被撤回时按剩余的值重新去重。更新后的状态放入states，由调用方在提交后缓存。
+        """
+        conn = self.conn
+        affected = {}
+        for category_key in dict.fromkeys([*old, *new]):
+            old_values = old.get(category_key, (None, {}))[1]
+            name, new_values = new.get(category_key, (None, {}))
+            removed = [key for key in old_values if key not in new_values]
+            added = [(key, value) for key, value in new_values.items() if key not in old_values]
+            dirty, retracted, fresh = False, False, []
+            if removed:
+                conn.executemany(
+                    "UPDATE merge_view_values SET provenance = provenance - 1 "
+                    "WHERE view_id = ? AND category_key = ? AND value_key = ?",
+                    [(view_id, category_key, key) for key in removed]
+                )
+                deleted = conn.execute(
+                    "DELETE FROM merge_view_values WHERE view_id = ? AND category_key = ? AND provenance <= 0",
+                    (view_id, category_key)
+                ).rowcount
+                dirty = retracted = deleted > 0
+            if added:
+                existing = set()
+                for start in range(0, len(added), 500):
+                    chunk = [key for key, _ in added[start:start + 500]]
+                    existing.update(key for (key,) in conn.execute(
+                        f"""
+                        SELECT value_key FROM merge_view_values
+                        WHERE view_id = ? AND category_key = ? AND value_key IN ({','.join('?' * len(chunk))})
+                        """,
+                        [view_id, category_key, *chunk]
+                    ))
+                conn.executemany(
+                    "UPDATE merge_view_values SET provenance = provenance + 1 "
+                    "WHERE view_id = ? AND category_key = ? AND value_key = ?",
+                    [(view_id, category_key, key) for key, _ in added if key in existing]
+                )
+                fresh = [(key, value) for key, value in added if key not in existing]
+                if fresh:
+                    next_seq = conn.execute(
+                        "SELECT COALESCE(MAX(seq), 0) + 1 FROM merge_view_values WHERE view_id = ? AND category_key = ?",
+                        (view_id, category_key)
+                    ).fetchone()[0]
+                    conn.executemany(
+                        "INSERT INTO merge_view_values (view_id, category_key, value_key, value_json, provenance, seq) "
+                        "VALUES (?, ?, ?, ?, 1, ?)",
+                        [(view_id, category_key, key, json.dumps(value, ensure_ascii=False), next_seq + i)
+                         for i, (key, value) in enumerate(fresh)]
+                    )
+                    dirty = True
+                    # 类别第一次出现时记录名称（第一个来源的写法或别名表中的规范名）
+                    conn.execute(
+                        """
+                        INSERT OR IGNORE INTO merge_view_categories (view_id, category_key, name, seq, version)
+                        VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM merge_view_categories
+                                          WHERE view_id = ?), ?)
+                        """,
+                        (view_id, category_key, name, view_id, version)
+                    )
+            if dirty:
+                affected[category_key] = (retracted, [value for _, value in fresh])
+
+        changed = []
+        for category_key, (retracted, fresh_values) in affected.items():
+            name, previous_version = conn.execute(
+                "SELECT name, version FROM merge_view_categories WHERE view_id = ? AND category_key = ?",
+                (view_id, category_key)
+            ).fetchone()
+            with self._merge_states_lock:
+                # 取出而不是读取：本事务失败时缓存中不会留下被修改过的状态
+                cached = self._merge_states.pop((view_id, category_key), None)
+            if not retracted and cached is not None and cached[0] == previous_version:
+                value_set = cached[1]
+                for value in fresh_values:
+                    value_set.add(value)
+            else:
+                value_set = new_value_set()
+                for (value_json,) in conn.execute(
+                    "SELECT value_json FROM merge_view_values WHERE view_id = ? AND category_key = ? ORDER BY seq",
+                    (view_id, category_key)
+                ):
+                    value_set.add(json.loads(value_json))
+            conn.execute(
+                """
+                UPDATE merge_view_categories SET values_json = ?, ambiguous = ?, version = ?
+                WHERE view_id = ? AND category_key = ?
+                """,
+                (json.dumps(value_set.values, ensure_ascii=False), int(value_set.ambiguous), version,
+                 view_id, category_key)
+            )
+            states[(view_id, category_key)] = (version, value_set)
+            changed.append(name)
+        return changed
+
+    def get_merge_view(self, topic: str, since_version: int = None) -> dict:
+        """直接读取物化的合并结果；给出since_version时只返回之后变化过的类别（清空的类别值为空列表）"""
+        row = self.conn.execute("SELECT id, version, updated_at FROM merge_views WHERE topic = ?",
+                                (topic,)).fetchone()
+        if row is None:
+            return None
+        view_id, version, updated_at = row
+        if since_version is None:
+            rows = self.conn.execute(
+                """
+                SELECT name, values_json, ambiguous FROM merge_view_categories
+                WHERE view_id = ? AND values_json != '[]'
+                ORDER BY seq
+                """,
+                (view_id,)
+            ).fetchall()
+        else:
+            rows = self.conn.execute(
+                """
+                SELECT name, values_json, ambiguous FROM merge_view_categories
+                WHERE view_id = ? AND version > ?
+                ORDER BY seq
+                """,
+                (view_id, since_version)
+            ).fetchall()
+        sources = self.conn.execute("SELECT COUNT(*) FROM merge_view_sources WHERE view_id = ?",
+                                    (view_id,)).fetchone()[0]
+        return {
+            'topic': topic,
+            'version': version,
+            'updated_at': updated_at,
+            'sources': sources,
+            'result': {name: json.loads(values_json) for name, values_json, _ in rows},
+            'ambiguous': [name for name, _, ambiguous in rows if ambiguous],
+        }
+
+    def get_crawl_cache(self, url_key: str) -> dict:
+        """获取URL的爬取缓存"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            SELECT url, etag, last_modified, content_hash, title, content, fetched_at
+            FROM crawl_cache WHERE url_key = ?
+            """,
+            (url_key,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return {
+                "url": row[0],
+                "etag": row[1],
+                "last_modified": row[2],
+                "content_hash": row[3],
+                "title": row[4],
+                "content": row[5],
+                "fetched_at": row[6]
+            }
+        return None
+
+    def put_crawl_cache(self, url_key: str, url: str, etag: str, last_modified: str,
+                        content_hash: str, title: str, content: str, now: float):
+        """写入或覆盖URL的爬取缓存"""
+        size = len(title.encode('utf-8')) + len(content.encode('utf-8'))
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO crawl_cache
+                (url_key, url, etag, last_modified, content_hash, title, content, size, fetched_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (url_key, url, etag, last_modified, content_hash, title, content, size, now, now)
+        )
+        self._commit()
+
+    def touch_crawl_cache(self, url_key: str, now: float, revalidated: bool = False,
+                          etag: str = None, last_modified: str = None):
+        """记录一次缓存命中；revalidated为True时同时刷新验证时间和验证器"""
+        if revalidated:
+            self.conn.execute(
+                """
+                UPDATE crawl_cache
+                SET fetched_at = ?, last_access = ?,
+                    etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                WHERE url_key = ?
+                """,
+                (now, now, etag, last_modified, url_key)
+            )
+        else:
+            self.conn.execute(
+                "UPDATE crawl_cache SET last_access = ? WHERE url_key = ?",
+                (now, url_key)
+            )
+        self._commit()
+
+    def evict_crawl_cache(self, max_bytes: int, expire_before: float) -> int:
+        """删除过期的缓存条目，再按最近最少使用淘汰到总大小不超过max_bytes，返回删除的条数"""
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM crawl_cache WHERE fetched_at < ?", (expire_before,))
+        deleted = cursor.rowcount
+        cursor.execute(
+            """
+            DELETE FROM crawl_cache WHERE url_key IN (
+                SELECT url_key FROM (
+                    SELECT url_key, SUM(size) OVER (ORDER BY last_access DESC, url_key) AS running
+                    FROM crawl_cache
+                ) WHERE running > ?
+            )
+            """,
+            (max_bytes,)
+        )
+        deleted += cursor.rowcount
+        self._commit()
+        return deleted
+
+    def get_llm_cache(self, cache_key: str, now: float, ttl: float) -> str:
+        """获取未过期的LLM缓存结果（JSON文本），命中时刷新访问时间"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT result_json FROM llm_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, now - ttl)
+        )
+        row = cursor.fetchone()
+        if row:
+            cursor.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+            self._commit()
+            return row[0]
+        return None
+
+    def put_llm_cache(self, cache_key: str, result_json: str, now: float):
+        """写入LLM缓存结果"""
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO llm_cache (cache_key, result_json, created_at, last_access)
+            VALUES (?, ?, ?, ?)
+            """,
+            (cache_key, result_json, now, now)
+        )
+        self._commit()
+
+    def evict_llm_cache(self, max_entries: int, expire_before: float) -> int:
+        """删除过期的LLM缓存，再按最近最少使用淘汰到不超过max_entries条，返回删除的条数"""
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM llm_cache WHERE created_at < ?", (expire_before,))
+        deleted = cursor.rowcount
+        cursor.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,)
+        )
+        deleted += cursor.rowcount
+        self._commit()
+        return deleted
+
+    def get_embedding_cache(self, cache_keys: List[str], now: float) -> Dict[str, bytes]:
+        """批量获取缓存的向量BLOB，命中的条目刷新访问时间"""
+        cursor = self.conn.cursor()
+        found = {}
+        for start in range(0, len(cache_keys), 900):
+            chunk = cache_keys[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT cache_key, vector FROM embedding_cache WHERE cache_key IN ({placeholders})",
+                chunk
+            )
+            found.update(cursor.fetchall())
+        if found:
+            cursor.executemany(
+                "UPDATE embedding_cache SET last_access = ? WHERE cache_key = ?",
+                [(now, key) for key in found]
+            )
+            self._commit()
+        return found
+
+    def put_embedding_cache(self, entries: Dict[str, bytes], now: float):
+        """批量写入向量缓存"""
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO embedding_cache (cache_key, vector, created_at, last_access)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(key, blob, now, now) for key, blob in entries.items()]
+        )
+        self._commit()
+
+    def evict_embedding_cache(self, max_entries: int) -> int:
+        """按最近最少使用淘汰到不超过max_entries条，返回删除的条数"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            DELETE FROM embedding_cache WHERE cache_key IN (
+                SELECT cache_key FROM embedding_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,)
+        )
+        self._commit()
+        return cursor.rowcount
+
+    def create_ingest_job(self, urls: List[str]) -> int:
+        """创建入库任务，每个URL一条待抓取的任务，返回job id"""
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO ingest_jobs (total, created_at) VALUES (?, ?)", (len(urls), now))
+            job_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO ingest_tasks (job_id, url, updated_at) VALUES (?, ?, ?)",
+                [(job_id, url, now) for url in urls]
+            )
+        return job_id
+
+    def get_ingest_job(self, job_id: int, max_errors: int = 20) -> dict:
+        """任务进度：各阶段的任务数、部分失败原因和只提取了部分内容的页面，job不存在时返回None"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT total, created_at FROM ingest_jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute("SELECT stage, COUNT(*) FROM ingest_tasks WHERE job_id = ? GROUP BY stage", (job_id,))
+        stages = dict(cursor.fetchall())
+        cursor.execute(
+            "SELECT url, error FROM ingest_tasks WHERE job_id = ? AND stage = 'failed' ORDER BY id LIMIT ?",
+            (job_id, max_errors)
+        )
+        errors = [{"url": url, "error": error} for url, error in cursor.fetchall()]
+        cursor.execute(
+            "SELECT url, error FROM ingest_tasks WHERE job_id = ? AND stage = 'done' AND error IS NOT NULL "
+            "ORDER BY id LIMIT ?",
+            (job_id, max_errors)
+        )
+        warnings = [{"url": url, "warning": error} for url, error in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM ingest_tasks t JOIN pages p ON p.id = t.page_id
+            WHERE t.job_id = ? AND p.canonical_id IS NOT NULL
+            """,
+            (job_id,)
+        )
+        duplicates = cursor.fetchone()[0]
+        finished = stages.get('done', 0) + stages.get('failed', 0)
+        return {
+            "job_id": job_id,
+            "total": row[0],
+            "created_at": row[1],
+            "status": "finished" if finished == row[0] else "running",
+            "stages": stages,
+            "duplicates": duplicates,
+            "errors": errors,
+            "warnings": warnings,
+        }
+
+    def get_pending_ingest_tasks(self, after_id: int, limit: int) -> List[dict]:
+        """按id顺序读取未完成的任务（id大于after_id）"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, job_id, url, stage, page_id, knowledge_json, attempts
+            FROM ingest_tasks
+            WHERE stage NOT IN ('done', 'failed') AND id > ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (after_id, limit)
+        )
+        fields = ('id', 'job_id', 'url', 'stage', 'page_id', 'knowledge_json', 'attempts')
+        return [dict(zip(fields, row)) for row in cursor.fetchall()]
+
+    def update_ingest_task(self, task_id: int, **fields):
+        """更新任务的stage/attempts/error/knowledge_json等字段"""
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self.conn.execute(
+            f"UPDATE ingest_tasks SET {assignments}, updated_at = ? WHERE id = ?",
+            [*fields.values(), time.time(), task_id]
+        )
+        self._commit()
+
+    def finish_ingest_fetch(self, task_id: int, url: str, title: str, content: str,
+                            fingerprint: int = None) -> tuple:
+        """保存抓取到的页面并推进任务（同一事务），返回 (page_id, canonical_id)
+
+        给出fingerprint时先查近似重复：是重复页面则只记录与原始页面的关联，任务直接完成，
+        不再做LLM提取和向量计算；否则任务进入extract阶段。
+        """
+        with self.transaction():
+            if fingerprint is None:
+                page_id, canonical_id = self.store_page(url, title, content), None
+            else:
+                page_id, canonical_id = self.store_page_deduplicated(url, title, content, fingerprint)
+            stage = 'done' if canonical_id is not None else 'extract'
+            self.update_ingest_task(task_id, stage=stage, page_id=page_id, error=None)
+        return page_id, canonical_id
+
+    def finish_ingest_cached(self, task_id: int, url: str) -> Optional[int]:
+        """页面与上次抓取时相同（爬取缓存命中）时沿用已入库的页面并完成任务，返回其page_id
+
+        只沿用已经提取过知识或被判定为近似重复的页面；没有这样的页面时返回None，任务照常入库。
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT p.id FROM pages p
+                WHERE p.url = ?
+                  AND (p.canonical_id IS NOT NULL OR EXISTS (SELECT 1 FROM knowledge k WHERE k.page_id = p.id))
+                ORDER BY p.id DESC
+                LIMIT 1
+                """,
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.update_ingest_task(task_id, stage='done', page_id=row[0], error=None)
+        return row[0]
+
+    def finish_ingest_store(self, task_id: int, page_id: int, knowledge: dict, vectors: dict,
+                            warning: str = None):
+        """保存知识及向量并把任务标记为完成（同一事务，重启后不会重复写入）
+
+        warning是只提取了部分内容时的说明，写入已完成任务的error字段。
+        """
+        with self.transaction():
+            self.store_knowledge_only(page_id, knowledge)
+            self.store_knowledge(page_id, knowledge, vectors)
+            self.update_ingest_task(task_id, stage='done', knowledge_json=None, error=warning)
@@ -0,0 +1,118 @@
+"""文本向量缓存：文本没有变化的知识项不再重新计算向量"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, Union
+
+import numpy as np
+
+import config
+from cache_utils import LRUCache, SingleFlight
+from db_manager import DBManager
+from vector_codec import decode_vector, encode_vector
+
+logger = logging.getLogger(__name__)
+
+
+def make_embedding_key(model: str, text: str) -> str:
+    """由模型名和文本内容计算缓存键"""
+    digest = hashlib.sha256()
+    digest.update(model.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CachedEmbeddingAPI:
+    """在AsyncBGEM3API前面加两级向量缓存
+
+    - 第一级：进程内LRU，保存float32数组；
+    - 第二级：SQLite embedding_cache表（float32编码，不做量化），按条目数LRU淘汰；
+    - 同一时刻相同文本只计算一次；未命中的文本逐条提交给api，由它的微批处理合并成批量请求。
+    每个请求最多一次查询、一次写入SQLite，都通过db.run在数据库线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, api, db: DBManager = None, memory_entries: int = None,
+                 max_entries: int = None, evict_every: int = 1000):
+        self.api = api
+        self.db = db
+        self.model = getattr(api, 'model', config.BGE_MODEL)
+        self.memory = LRUCache(config.EMBED_CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries)
+        self.max_entries = config.EMBED_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.evict_every = evict_every
+        self._inflight = SingleFlight()
+        self._unsaved = {}
+        self._writes = 0
+        self.stats = {"memory_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0}
+
+    async def get_embeddings(self, texts: Union[str, List[str]]) -> List[List[float]]:
+        """获取文本的向量表示（带缓存），结果与输入一一对应"""
+        if isinstance(texts, str):
+            texts = [texts]
+        keys = [make_embedding_key(self.model, text) for text in texts]
+        vectors = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.stats["memory_hits"] += 1
+                vectors[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and self.db is not None:
+            for key, vector in (await self.db.run(self._load, missing)).items():
+                self.stats["db_hits"] += 1
+                self.memory.put(key, vector)
+                vectors[key] = vector
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in pending:
+                continue
+            if self._inflight.is_inflight(key):
+                self.stats["coalesced"] += 1
+            pending[key] = self._inflight.do(key, lambda key=key, text=text: self._embed(key, text))
+        if pending:
+            results = await asyncio.gather(*pending.values())
+            vectors.update(zip(pending, results))
+            await self._save()
+
+        return [vectors[key].tolist() for key in keys]
+
+    async def _embed(self, key: str, text: str):
+        self.stats["misses"] += 1
+        vector = np.asarray((await self.api.get_embeddings([text]))[0], dtype=np.float32)
+        self.memory.put(key, vector)
+        self._unsaved[key] = vector
+        return vector
+
+    def _load(self, keys: List[str]) -> dict:
+        """在数据库线程中批量读取并解码缓存的向量"""
+        return {key: decode_vector(blob) for key, blob in self.db.get_embedding_cache(keys, time.time()).items()}
+
+    async def _save(self):
+        """把新计算的向量批量写入SQLite，需要时顺带淘汰，整体一次db.run"""
+        if self.db is None or not self._unsaved:
+            self._unsaved.clear()
+            return
+        unsaved, self._unsaved = self._unsaved, {}
+        previous, self._writes = self._writes, self._writes + len(unsaved)
+        evict = self._writes // self.evict_every != previous // self.evict_every
+
+        def save() -> int:
+            entries = {key: encode_vector(vector, 'float32') for key, vector in unsaved.items()}
+            self.db.put_embedding_cache(entries, time.time())
+            return self.db.evict_embedding_cache(self.max_entries) if evict else 0
+
+        deleted = await self.db.run(save)
+        if deleted:
+            logger.info(f"Evicted {deleted} embedding cache entries")
+
+    def get_stats(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["db_hits"] + self.stats["coalesced"]
+        total = hits + self.stats["misses"]
+        return {**self.stats, "hits": hits, "hit_ratio": round(hits / total, 4) if total else 0.0,
+                **{f"api_{name}": value for name, value in getattr(self.api, 'stats', {}).items()}}
+
+    async def close(self):
+        await self.api.close()
@@ -0,0 +1,127 @@
+"""HTML正文提取
+
+提供可插拔的解析后端（selectolax / lxml / html.parser），安装了哪个快的库就用哪个，
+都没有时退回BeautifulSoup自带的html.parser。本模块只包含纯函数，可以在
+ProcessPoolExecutor的子进程中运行。
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from bs4 import BeautifulSoup
+
+import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as _SelectolaxParser
+    except ImportError:
+        _SelectolaxParser = None
+
+try:
+    import lxml.html as _lxml_html
+    from lxml.etree import ParserError as _LxmlParserError
+except ImportError:
+    _lxml_html = None
+
+def normalize_text(text: str) -> str:
+    """单次扫描完成断行、去空行和多余空格
+
+    替代原先"按行strip -> 按双空格切分 -> 过滤空串 -> 用空格拼接"的三层生成器：
+    str.split() 在C层一次切开所有空白，再用单个空格拼接。与旧实现的唯一差别是
+    词内的单个制表符、不间断空格等也会被替换为普通空格。
+    """
+    return ' '.join(text.split())
+
+
+def _extract_html_parser(html_content: str) -> tuple:
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # 提取标题
+    title = ""
+    title_tag = soup.find('title')
+    if title_tag:
+        title = title_tag.text.strip()
+
+    # 移除script和style元素
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    return title, soup.get_text()
+
+
+def _extract_lxml(html_content: str) -> tuple:
+    try:
+        doc = _lxml_html.document_fromstring(html_content)
+    except (_LxmlParserError, ValueError):
+        # 空文档或带编码声明的XML，交给html.parser处理
+        return _extract_html_parser(html_content)
+
+    title = (doc.findtext('.//title') or "").strip()
+    for element in list(doc.iter('script', 'style')):
+        element.drop_tree()
+    return title, doc.text_content()
+
+
+def _extract_selectolax(html_content: str) -> tuple:
+    tree = _SelectolaxParser(html_content)
+
+    title_node = tree.css_first('title')
+    title = title_node.text(strip=True) if title_node else ""
+
+    tree.strip_tags(['script', 'style'])
+    root = tree.root
+    return title, root.text(separator='') if root else ""
+
+
+_BACKENDS: Dict[str, Callable[[str], tuple]] = {'html.parser': _extract_html_parser}
+if _lxml_html is not None:
+    _BACKENDS['lxml'] = _extract_lxml
+if _SelectolaxParser is not None:
+    _BACKENDS['selectolax'] = _extract_selectolax
+
+# auto模式下的优先顺序
+_PREFERRED_BACKENDS = ('selectolax', 'lxml', 'html.parser')
+
+
+def available_backends() -> list:
+    """当前环境中可用的解析后端，按优先级排序"""
+    return [name for name in _PREFERRED_BACKENDS if name in _BACKENDS]
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """把配置的后端名解析为实际可用的后端，auto或未安装时按优先级回退"""
+    name = name or config.HTML_PARSER
+    if name in _BACKENDS:
+        return name
+    if name != 'auto':
+        logger.warning(f"HTML parser backend '{name}' is not available, falling back")
+    return available_backends()[0]
+
+
+def extract_content(html_content: str, backend: Optional[str] = None) -> tuple:
+    """从HTML中提取标题和正文内容"""
+    title, text = _BACKENDS[resolve_backend(backend)](html_content)
+    return title, normalize_text(text)
+
+
+def create_parse_executor() -> Optional[Executor]:
+    """按配置创建HTML解析进程池，PARSE_WORKERS为0时返回None（在事件循环线程内解析）"""
+    if config.PARSE_WORKERS <= 0:
+        return None
+    logger.info(f"Starting HTML parse pool with {config.PARSE_WORKERS} workers "
+                f"(backend={resolve_backend()})")
+    return ProcessPoolExecutor(max_workers=config.PARSE_WORKERS)
+
+
+async def extract_content_async(html_content: str, executor: Optional[Executor] = None) -> tuple:
+    """在进程池中提取内容，避免CPU密集的解析阻塞事件循环"""
+    if executor is None:
+        return extract_content(html_content)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, extract_content, html_content)
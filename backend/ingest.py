@@ -0,0 +1,252 @@
+"""服务端入库流水线：抓取 → 解析 → LLM提取 → 计算向量并入库
+
+各阶段之间用有界的asyncio.Queue连接，每个阶段有独立的worker数：
+下游处理不过来时队列写满，上游worker阻塞在put上，形成背压，内存中的任务数有上限。
+
+任务队列持久化在SQLite的ingest_tasks表中，每完成一个阶段就把结果（page_id、提取出的知识）
+和新的stage写回数据库。进程重启后从数据库读取未完成的任务，从各自所处的阶段继续。
+多worker部署时只有一个worker运行流水线（见main.py中的入库锁），其他worker提交的任务靠定时轮询取走。
+"""
+import asyncio
+import contextlib
+import json
+import logging
+from collections import defaultdict
+from typing import List
+from urllib.parse import urlsplit
+
+import config
+from bge_api import embed_knowledge
+from chunking import extract_knowledge_chunked
+from crawler import CrawledPage, CrawlError, fetch_body, parse_body
+from db_manager import DBManager
+from simhash import simhash
+
+logger = logging.getLogger(__name__)
+
+# 抓取失败时这些状态码可能是临时的，值得重试
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _normalize_knowledge(knowledge: dict) -> dict:
+    """把提取结果整理成 {类别: [字符串, ...]}，便于入库和计算向量"""
+    result = {}
+    for category, values in knowledge.items():
+        if not isinstance(values, list):
+            values = [values] if values else []
+        values = [value if isinstance(value, str) else json.dumps(value, ensure_ascii=False) for value in values]
+        if values:
+            result[str(category)] = values
+    return result
+
+
+class IngestPipeline:
+    """把URL列表入库的异步流水线，在应用的lifespan中start()/stop()"""
+
+    def __init__(self, db: DBManager, session, moonshot, embedder,
+                 executor=None, cache=None,
+                 fetch_workers: int = None, parse_workers: int = None,
+                 extract_workers: int = None, store_workers: int = None,
+                 queue_size: int = None, max_attempts: int = None):
+        self.db = db
+        self.session = session
+        self.moonshot = moonshot
+        self.embedder = embedder
+        self.executor = executor
+        self.cache = cache
+        self.workers = {
+            "fetch": fetch_workers or config.INGEST_FETCH_WORKERS,
+            "parse": parse_workers or config.INGEST_PARSE_WORKERS,
+            "extract": extract_workers or config.INGEST_EXTRACT_WORKERS,
+            "embed": store_workers or config.INGEST_STORE_WORKERS,
+        }
+        self.queue_size = queue_size or config.INGEST_QUEUE_SIZE
+        self.queues = {stage: asyncio.Queue(self.queue_size) for stage in self.workers}
+        self.max_attempts = max_attempts or config.INGEST_MAX_ATTEMPTS
+        self._handlers = {
+            "fetch": self._fetch,
+            "parse": self._parse,
+            "extract": self._extract,
+            "embed": self._embed,
+        }
+        # 同一站点同时进行的抓取数
+        self._domain_limits = defaultdict(lambda: asyncio.Semaphore(config.CRAWL_BATCH_PER_DOMAIN))
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._retries = set()
+        # 正在处理的任务数，关闭时等它降到0；closing之后worker不再开始新任务
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+        self.stats = {"done": 0, "failed": 0, "retried": 0, "duplicates": 0, "unchanged": 0}
+
+    async def start(self):
+        """启动各阶段的worker和从数据库读取任务的feeder，未完成的旧任务会被恢复"""
+        self._closing = False
+        for stage, count in self.workers.items():
+            self._tasks.extend(asyncio.create_task(self._worker(stage)) for _ in range(count))
+        self._tasks.append(asyncio.create_task(self._feeder()))
+        logger.info(f"Ingest pipeline started with workers {self.workers}")
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def stop(self, grace: float = 0):
+        """停止流水线：不再开始新任务，最多等grace秒让正在处理的任务完成当前阶段，然后取消所有worker
+
+        队列中尚未开始、以及被取消的任务在数据库中仍保持原阶段，下次启动时继续。
+        """
+        self._closing = True
+        if grace > 0 and self._busy:
+            logger.info(f"Waiting up to {grace:.0f}s for {self._busy} in-flight ingest tasks")
+            try:
+                await asyncio.wait_for(self._idle.wait(), grace)
+            except asyncio.TimeoutError:
+                logger.warning(f"Cancelling {self._busy} ingest tasks still running after {grace:.0f}s")
+        for task in [*self._tasks, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks.clear()
+        self._retries.clear()
+
+    async def submit(self, urls: List[str]) -> int:
+        """提交一批URL，返回job id"""
+        job_id = await self.db.run(self.db.create_ingest_job, urls)
+        self._wakeup.set()
+        return job_id
+
+    def queue_sizes(self) -> dict:
+        return {stage: queue.qsize() for stage, queue in self.queues.items()}
+
+    async def _feeder(self):
+        """按id顺序把数据库中未完成的任务放进对应阶段的队列，队列满时等待（背压）"""
+        if config.DEDUP_ENABLED:
+            backfilled = await self.db.run(self.db.backfill_page_fingerprints, simhash)
+            if backfilled:
+                logger.info(f"Computed fingerprints for {backfilled} existing pages")
+        last_id = 0
+        while True:
+            self._wakeup.clear()
+            tasks = await self.db.run(self.db.get_pending_ingest_tasks, last_id, self.queue_size)
+            for task in tasks:
+                last_id = task["id"]
+                # 解析阶段的输入（响应体）不落盘，解析完成前任务在数据库中一直是fetch
+                if task["stage"] == "extract":
+                    page = await self.db.run(self.db.get_page, task["page_id"])
+                    task["content"] = page["content"] if page else ""
+                elif task["stage"] == "embed":
+                    task["knowledge"] = json.loads(task.pop("knowledge_json"))
+                await self.queues[task["stage"]].put(task)
+            if len(tasks) < self.queue_size:
+                # 其他worker提交的任务不会触发本进程的_wakeup，定时轮询数据库
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), config.INGEST_POLL_SECONDS)
+
+    async def _worker(self, stage: str):
+        queue, handler = self.queues[stage], self._handlers[stage]
+        while True:
+            task = await queue.get()
+            if self._closing:
+                queue.task_done()
+                continue
+            self._busy += 1
+            self._idle.clear()
+            try:
+                await handler(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 记录失败本身出错（如数据库锁超时）时不能让worker退出，否则这一阶段的worker会悄悄变少
+                try:
+                    await self._fail(task, stage, e)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception(f"Failed to record failure of ingest task {task.get('id')} at {stage}")
+            finally:
+                queue.task_done()
+                self._busy -= 1
+                if not self._busy:
+                    self._idle.set()
+
+    async def _fail(self, task: dict, stage: str, error: Exception):
+        """可重试的错误延迟后放回原阶段的队列，重试次数用完或不可重试时标记为失败"""
+        retryable = (not isinstance(error, CrawlError)
+                     or (error.upstream_status or error.status_code) in _RETRYABLE_STATUS)
+        attempts = task["attempts"] + 1
+        message = error.detail if isinstance(error, CrawlError) else str(error)
+        if retryable and attempts < self.max_attempts:
+            task["attempts"] = attempts
+            await self.db.run(self.db.update_ingest_task, task["id"], attempts=attempts, error=message)
+            retry_stage = "fetch" if stage == "parse" else stage
+            delay = config.INGEST_RETRY_DELAY * 2 ** (attempts - 1)
+            logger.warning(f"Ingest task {task['id']} failed at {stage} ({message}), retrying in {delay:.1f}s")
+            retry = asyncio.create_task(self._requeue(task, retry_stage, delay))
+            self._retries.add(retry)
+            retry.add_done_callback(self._retries.discard)
+            self.stats["retried"] += 1
+            return
+        logger.error(f"Ingest task {task['id']} ({task['url']}) failed at {stage}: {message}")
+        await self.db.run(self.db.update_ingest_task, task["id"], stage="failed", attempts=attempts, error=message)
+        self.stats["failed"] += 1
+
+    async def _requeue(self, task: dict, stage: str, delay: float):
+        await asyncio.sleep(delay)
+        task["stage"] = stage
+        await self.queues[stage].put(task)
+
+    async def _fetch(self, task: dict):
+        async with self._domain_limits[urlsplit(task["url"]).netloc]:
+            body = await fetch_body(self.session, task["url"], self.cache)
+        if isinstance(body, CrawledPage):
+            await self._store_page(task, body)
+            return
+        task["body"] = body
+        task["stage"] = "parse"
+        await self.queues["parse"].put(task)
+
+    async def _parse(self, task: dict):
+        page = await parse_body(task.pop("body"), self.executor, self.cache)
+        await self._store_page(task, page)
+
+    async def _store_page(self, task: dict, page: CrawledPage):
+        if page.cached:
+            # 304或内容哈希未变：之前入库的页面和知识仍然有效，不再重复存储、提取和计算向量
+            page_id = await self.db.run(self.db.finish_ingest_cached, task["id"], task["url"])
+            if page_id is not None:
+                logger.info(f"Ingest task {task['id']}: {task['url']} is unchanged since page {page_id}")
+                self.stats["unchanged"] += 1
+                return
+        fingerprint = None
+        if config.DEDUP_ENABLED:
+            loop = asyncio.get_running_loop()
+            fingerprint = await loop.run_in_executor(self.executor, simhash, page.content)
+        task["page_id"], canonical_id = await self.db.run(self.db.finish_ingest_fetch, task["id"], task["url"],
+                                                          page.title, page.content, fingerprint)
+        if canonical_id is not None:
+            logger.info(f"Ingest task {task['id']}: {task['url']} is a near-duplicate of page {canonical_id}")
+            self.stats["duplicates"] += 1
+            return
+        task["content"] = page.content
+        task["stage"] = "extract"
+        await self.queues["extract"].put(task)
+
+    async def _extract(self, task: dict):
+        extraction = await extract_knowledge_chunked(self.moonshot, task["content"])
+        knowledge = _normalize_knowledge(extraction.knowledge)
+        await self.db.run(self.db.update_ingest_task, task["id"], stage="embed",
+                          knowledge_json=json.dumps(knowledge, ensure_ascii=False), error=None)
+        task.pop("content", None)
+        task["knowledge"] = knowledge
+        # 只提取了部分块时，任务完成后把说明留在error字段中
+        task["warning"] = extraction.warning
+        task["stage"] = "embed"
+        await self.queues["embed"].put(task)
+
+    async def _embed(self, task: dict):
+        vectors = await embed_knowledge(self.embedder, task["knowledge"])
+        await self.db.run(self.db.finish_ingest_store, task["id"], task["page_id"], task["knowledge"], vectors,
+                          task.get("warning"))
+        self.stats["done"] += 1
@@ -0,0 +1,43 @@
+"""把知识项流式序列化为NDJSON或CSV，逐批产出字节块，内存占用与数据量无关"""
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator
+
+EXPORT_FIELDS = ('id', 'category', 'content', 'url', 'page_title', 'created_at')
+
+
+def iter_ndjson(rows: Iterable[dict], batch_size: int = 500) -> Iterator[bytes]:
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, ensure_ascii=False))
+        if len(buffer) >= batch_size:
+            yield ('\n'.join(buffer) + '\n').encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode('utf-8')
+
+
+def iter_csv(rows: Iterable[dict], batch_size: int = 500) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    # 带BOM，方便Excel正确识别UTF-8中文
+    yield ('\ufeff' + output.getvalue()).encode('utf-8')
+    output.seek(0)
+    output.truncate()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue().encode('utf-8')
+
+
+# 格式 -> (序列化函数, Content-Type, 文件扩展名)
+EXPORT_FORMATS: Dict[str, tuple] = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv'),
+}
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import time
+
+import config
+from cache_utils import LRUCache, SingleFlight
+from db_manager import DBManager
+from moonshot_api import (
+    EXTRACT_TEMPERATURE,
+    MERGE_PROMPT,
+    MERGE_TEMPERATURE,
+    SYSTEM_PROMPT,
+    AsyncMoonshotAPI,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(operation: str, prompt: str, temperature: float, payload: str) -> str:
+    """由模型、提示词、温度和输入内容计算缓存键"""
+    digest = hashlib.sha256()
+    for part in (operation, config.MOONSHOT_MODEL, prompt, repr(temperature), payload):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def canonical_json(value) -> str:
+    """与键顺序和空白无关的JSON序列化，使内容相同的合并请求得到相同的键"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+class CachedMoonshotAPI:
+    """在AsyncMoonshotAPI前面加两级结果缓存
+
+    - 第一级：进程内LRU；
+    - 第二级：SQLite llm_cache表，带TTL和按条目数的LRU淘汰；
+    - 同一时刻键相同的请求只会向模型发送一次，其余请求等待同一个结果。
+    读写SQLite都通过db.run在数据库线程池中执行，不阻塞事件循环。
+    缓存中保存的是JSON文本，每次命中都会解析出新的dict，调用方可以放心修改。
+    """
+
+    def __init__(self, api: AsyncMoonshotAPI, db: DBManager = None,
+                 memory_entries: int = None, max_entries: int = None,
+                 ttl: int = None, evict_every: int = 100):
+        self.api = api
+        self.db = db
+        self.memory = LRUCache(config.LLM_CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries)
+        self.max_entries = config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.LLM_CACHE_TTL if ttl is None else ttl
+        self.evict_every = evict_every
+        self._inflight = SingleFlight()
+        self._writes = 0
+        self.stats = {"memory_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0}
+
+    async def extract_knowledge(self, content: str) -> dict:
+        """从文本中提取结构化知识（带缓存）"""
+        key = make_cache_key('extract', SYSTEM_PROMPT, EXTRACT_TEMPERATURE, content)
+        return await self._cached(key, lambda: self.api.extract_knowledge(content))
+
+    async def merge_knowledge(self, json_contents: list) -> dict:
+        """合并多个JSON格式的知识内容（带缓存）"""
+        key = make_cache_key('merge', MERGE_PROMPT, MERGE_TEMPERATURE, canonical_json(json_contents))
+        return await self._cached(key, lambda: self.api.merge_knowledge(json_contents))
+
+    async def _cached(self, key: str, call) -> dict:
+        cached = await self._lookup(key)
+        if cached is not None:
+            return json.loads(cached)
+
+        if self._inflight.is_inflight(key):
+            self.stats["coalesced"] += 1
+        result_json = await self._inflight.do(key, lambda: self._call_and_store(key, call))
+        return json.loads(result_json)
+
+    async def _lookup(self, key: str):
+        cached = self.memory.get(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached
+        if self.db is not None:
+            cached = await self.db.run(self.db.get_llm_cache, key, time.time(), self.ttl)
+            if cached is not None:
+                self.stats["db_hits"] += 1
+                self.memory.put(key, cached)
+                return cached
+        return None
+
+    async def _call_and_store(self, key: str, call) -> str:
+        self.stats["misses"] += 1
+        result_json = json.dumps(await call(), ensure_ascii=False)
+        self.memory.put(key, result_json)
+        if self.db is not None:
+            now = time.time()
+            await self.db.run(self.db.put_llm_cache, key, result_json, now)
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                deleted = await self.db.run(self.db.evict_llm_cache, self.max_entries, now - self.ttl)
+                if deleted:
+                    logger.info(f"Evicted {deleted} LLM cache entries")
+        return result_json
+
+    def get_stats(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["db_hits"] + self.stats["coalesced"]
+        total = hits + self.stats["misses"]
+        return {**self.stats, "hits": hits, "hit_ratio": round(hits / total, 4) if total else 0.0}
+
+    async def close(self):
+        await self.api.close()
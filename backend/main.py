@@ -1,33 +1,159 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import uvicorn
-import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
-import chardet
 import logging
 import os
-from dotenv import load_dotenv
-from moonshot_api import MoonshotAPI
+import random
+import signal
+import threading
+from contextlib import asynccontextmanager
+import config
+from moonshot_api import AsyncMoonshotAPI
+from crawler import CrawlError, crawl_many, create_session, fetch_page
+from extractor import create_parse_executor
+from crawl_cache import CrawlCache
+from db_manager import DBManager
+from llm_cache import CachedMoonshotAPI
+from chunking import extract_knowledge_chunked
+from merge_engine import merge_knowledge
+from bge_api import AsyncBGEM3API, EmbeddingError
+from embedding_cache import CachedEmbeddingAPI
+from knowledge_export import EXPORT_FORMATS
+from ingest import IngestPipeline
+from metrics import RequestContextMiddleware, RequestIdFilter, register_collector, render_metrics
+from workers import WorkerLock
 
 # 配置日志
 logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    level=config.LOG_LEVEL,
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
 
+
+def _log_payload(message: str, payload):
+    """按LOG_PAYLOAD_SAMPLE_RATE抽样记录请求/响应内容，未开启DEBUG时不做任何格式化"""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < config.LOG_PAYLOAD_SAMPLE_RATE:
+        logger.debug("%s: %s", message, payload)
+
 # 从环境变量获取API密钥
-load_dotenv()
-MOONSHOT_API_KEY = os.getenv("MOONSHOT_API_KEY")
+MOONSHOT_API_KEY = config.MOONSHOT_API_KEY
 if not MOONSHOT_API_KEY:
     logger.error("MOONSHOT_API_KEY not found in environment variables!")
 else:
     logger.info("MOONSHOT_API_KEY loaded successfully")
 
-app = FastAPI()
-moonshot = MoonshotAPI(MOONSHOT_API_KEY)
+# 应用生命周期内共享的HTTP会话、HTML解析进程池、数据库、缓存、LLM和向量客户端，在lifespan中创建
+http_session = None
+parse_executor = None
+db = None
+crawl_cache = None
+moonshot = None
+embedder = None
+ingest_pipeline = None
+ingest_lock = None
+# /ready报告的各项启动状态；draining在收到退出信号时置为True
+readiness = {"vector_index": "pending", "knowledge_graph": "pending", "ingest": "disabled", "draining": False}
+
+def _is_ready() -> bool:
+    return (readiness["vector_index"] == "ready" and readiness["knowledge_graph"] != "pending"
+            and not readiness["draining"])
+
+async def _warm_up_vector_index():
+    """在后台加载并预热向量索引，完成前/ready返回503，避免第一个检索请求承担加载开销"""
+    try:
+        info = await db.run(db.warm_vector_index)
+        readiness["vector_index"] = "ready"
+        logger.info(f"Vector index ready: {info}")
+    except Exception as e:
+        readiness["vector_index"] = "failed"
+        logger.error(f"Vector index warm-up failed: {str(e)}")
+
+async def _backfill_knowledge_graph():
+    """把旧版只存了knowledge_json的页面补建进知识图谱，在后台执行不阻塞启动"""
+    try:
+        count = await db.run(db.backfill_knowledge_graph)
+        if count:
+            logger.info(f"Indexed knowledge graph facts for {count} existing pages")
+        readiness["knowledge_graph"] = "ready"
+    except Exception as e:
+        readiness["knowledge_graph"] = "failed"
+        logger.error(f"Knowledge graph backfill failed: {str(e)}")
+
+async def _run_ingest_pipeline():
+    """只有拿到入库锁的worker运行入库流水线，其他worker待命；持有者退出后由待命的worker接手"""
+    while not ingest_lock.acquire():
+        readiness["ingest"] = "standby"
+        await asyncio.sleep(config.INGEST_POLL_SECONDS)
+    readiness["ingest"] = "running"
+    await ingest_pipeline.start()
+
+def _drain_on_exit_signal():
+    """包装uvicorn已安装的SIGTERM/SIGINT处理函数：收到信号时立即让/ready返回503，再交给uvicorn停止服务
+
+    uvicorn先停止接受连接、等待进行中的请求，最后才执行lifespan的关闭部分，在那里才置位就太晚了。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+        def handle_exit(signum, frame, previous=previous):
+            readiness["draining"] = True
+            previous(signum, frame)
+        signal.signal(sig, handle_exit)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_session, parse_executor, db, crawl_cache, moonshot, embedder, ingest_pipeline, ingest_lock
+    _drain_on_exit_signal()
+    http_session = create_session()
+    parse_executor = create_parse_executor()
+    db = DBManager(config.DB_PATH)
+    if config.CRAWL_CACHE_ENABLED:
+        crawl_cache = CrawlCache(db)
+    moonshot = AsyncMoonshotAPI(MOONSHOT_API_KEY)
+    if config.LLM_CACHE_ENABLED:
+        moonshot = CachedMoonshotAPI(moonshot, db)
+    embedder = AsyncBGEM3API()
+    if config.EMBED_CACHE_ENABLED:
+        embedder = CachedEmbeddingAPI(embedder, db)
+    warm_up = asyncio.create_task(_warm_up_vector_index())
+    graph_backfill = asyncio.create_task(_backfill_knowledge_graph())
+    ingest_runner = None
+    if config.INGEST_ENABLED:
+        ingest_pipeline = IngestPipeline(db, http_session, moonshot, embedder, parse_executor, crawl_cache)
+        ingest_lock = WorkerLock(db.worker_lock_path("ingest"))
+        ingest_runner = asyncio.create_task(_run_ingest_pipeline())
+    yield
+    # uvicorn已停止接受新连接并等待进行中的请求结束，这里排空后台任务；
+    # 收到退出信号时draining已经置位，这里兜底其他方式触发的关闭
+    readiness["draining"] = True
+    await warm_up
+    await graph_backfill
+    if ingest_runner is not None:
+        ingest_runner.cancel()
+        await asyncio.gather(ingest_runner, return_exceptions=True)
+    if ingest_pipeline is not None and ingest_pipeline.running:
+        await ingest_pipeline.stop(config.SHUTDOWN_GRACE_SECONDS)
+    if ingest_lock is not None:
+        ingest_lock.release()
+    await http_session.close()
+    if parse_executor is not None:
+        parse_executor.shutdown(wait=False, cancel_futures=True)
+    db.save_vector_index()
+    db.close()
+    await moonshot.close()
+    await embedder.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # 配置CORS
 app.add_middleware(
@@ -37,6 +163,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 最后添加的中间件在最外层，请求ID和请求耗时覆盖CORS在内的整个处理过程
+app.add_middleware(RequestContextMiddleware)
+
+
+def _collect_metrics():
+    """/metrics输出时读取各缓存的命中率、上游调用计数和入库队列长度"""
+    caches = [("crawl", crawl_cache)]
+    if isinstance(moonshot, CachedMoonshotAPI):
+        caches.append(("llm", moonshot))
+    if isinstance(embedder, CachedEmbeddingAPI):
+        caches.append(("embedding", embedder))
+    for name, cache in caches:
+        if cache is None:
+            continue
+        stats = cache.get_stats()
+        yield "kb_cache_hit_ratio", "Cache hit ratio since startup", "gauge", {"cache": name}, stats["hit_ratio"]
+        yield "kb_cache_hits_total", "Cache hits since startup", "counter", {"cache": name}, stats["hits"]
+        yield "kb_cache_misses_total", "Cache misses since startup", "counter", {"cache": name}, stats["misses"]
+    api = embedder.api if isinstance(embedder, CachedEmbeddingAPI) else embedder
+    for name, value in getattr(api, "stats", {}).items():
+        yield "kb_embedding_api_total", "Embedding API request counters", "counter", {"counter": name}, value
+    yield "kb_ready", "Whether this worker reports ready on /ready", "gauge", {}, int(_is_ready())
+    if ingest_pipeline is not None:
+        for stage, size in ingest_pipeline.queue_sizes().items():
+            yield "kb_ingest_queue_size", "Tasks waiting in each ingest stage", "gauge", {"stage": stage}, size
+        for name, value in ingest_pipeline.stats.items():
+            yield "kb_ingest_tasks_total", "Ingest task outcomes since startup", "counter", {"outcome": name}, value
+
+
+register_collector(_collect_metrics)
 
 class CrawlRequest(BaseModel):
     url: str
@@ -44,12 +200,31 @@ class CrawlRequest(BaseModel):
 class CrawlResponse(BaseModel):
     title: str
     content: str
+    cached: bool = False
+
+class CrawlBatchRequest(BaseModel):
+    urls: list[str]
+
+class CrawlBatchItem(BaseModel):
+    index: int
+    url: str
+    ok: bool
+    title: Optional[str] = None
+    content: Optional[str] = None
+    cached: Optional[bool] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
 
 class ExtractRequest(BaseModel):
     content: str
 
 class ExtractResponse(BaseModel):
     keywords: dict
+    # 文本切成的块数；超过EXTRACT_MAX_CHUNKS没有提取的块和提取失败的块不计入keywords
+    total_chunks: int = 1
+    skipped_chunks: int = 0
+    failed_chunks: int = 0
+    warning: Optional[str] = None
 
 class MergeRequest(BaseModel):
     contents: list[dict]
@@ -57,97 +232,222 @@ class MergeRequest(BaseModel):
 class MergeResponse(BaseModel):
     result: dict
 
-def extract_content(html_content: str) -> tuple:
-    """从HTML中提取标题和正文内容"""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # 提取标题
-    title = ""
-    title_tag = soup.find('title')
-    if title_tag:
-        title = title_tag.text.strip()
-    
-    # 提取正文内容
-    # 移除script和style元素
-    for script in soup(["script", "style"]):
-        script.decompose()
-    
-    # 获取文本
-    text = soup.get_text()
-    
-    # 断行
-    lines = (line.strip() for line in text.splitlines())
-    
-    # 去除空行和多余空格
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    content = ' '.join(chunk for chunk in chunks if chunk)
-    
-    return title, content
+class MergeSourceRequest(BaseModel):
+    knowledge: dict
+
+class IngestRequest(BaseModel):
+    urls: list[str]
+
+class SearchRequest(BaseModel):
+    query: str
+    limit: int = 5
+    category: Optional[str] = None
+    # text：只用关键词；hybrid：关键词+向量融合；auto：关键词结果不足limit条时才计算查询向量做混合检索
+    mode: str = "auto"
+
+class EmbedRequest(BaseModel):
+    texts: list[str]
+
+class EmbedResponse(BaseModel):
+    embeddings: list[list[float]]
 
 @app.get("/health")
 async def health_check():
     return {"status": "Backend is healthy!"}
 
+@app.get("/ready")
+async def ready():
+    """就绪检查：向量索引已预热、图谱补建完成且不在关闭过程中时返回200，否则503
+
+    /health只表示进程存活；负载均衡应以/ready决定是否把请求转发到这个worker。
+    """
+    body = {"ready": _is_ready(), "pid": os.getpid(), **readiness}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
 @app.post("/crawl")
 async def crawl(request: CrawlRequest):
     try:
         logger.info(f"Received crawl request for URL: {request.url}")
-        
-        # 发送HTTP请求
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
         logger.debug("Sending HTTP request...")
         
-        # 使用aiohttp进行异步请求
-        async with aiohttp.ClientSession() as session:
-            async with session.get(request.url, headers=headers, timeout=30) as response:
-                logger.info(f"Got response with status code: {response.status}")
-                
-                # 限制内容大小为10MB
-                MAX_SIZE = 10 * 1024 * 1024  # 10MB
-                content = await response.read()
-                if len(content) > MAX_SIZE:
-                    raise HTTPException(status_code=413, detail="Content too large")
-                
-                # 检测编码
-                encodings = chardet.detect(content)
-                encoding = encodings['encoding'] if encodings['encoding'] else 'utf-8'
-                text = content.decode(encoding)
-                logger.debug(f"Using encoding: {encoding}")
-                
-                # 提取内容
-                title, content = extract_content(text)
-                if len(content) < 10:  # 内容太少，可能是无效页面
-                    raise HTTPException(status_code=422, detail="Invalid page content")
-                    
-                logger.info(f"Extracted title: {title[:50]}...")
-                logger.debug(f"Content length: {len(content)} characters")
-                
-                return CrawlResponse(
-                    title=title,
-                    content=content
-                )
+        # 使用共享的aiohttp会话进行异步请求
+        page = await fetch_page(http_session, request.url, parse_executor, crawl_cache)
+        return CrawlResponse(
+            title=page.title,
+            content=page.content,
+            cached=page.cached
+        )
         
-    except asyncio.TimeoutError:
-        logger.error("Request timeout")
-        raise HTTPException(status_code=504, detail="Request timeout")
-    except aiohttp.ClientError as e:
-        logger.error(f"Network error: {str(e)}")
-        raise HTTPException(status_code=502, detail="Network error")
+    except CrawlError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Error crawling URL: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/crawl/batch")
+async def crawl_batch(request: CrawlBatchRequest):
+    """并发抓取多个URL，以NDJSON流的形式按完成顺序返回每个结果"""
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No urls provided")
+    if len(request.urls) > config.CRAWL_BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {config.CRAWL_BATCH_MAX_URLS} urls per batch")
+    logger.info(f"Received batch crawl request with {len(request.urls)} URLs")
+
+    async def stream():
+        async for item in crawl_many(http_session, request.urls, executor=parse_executor, cache=crawl_cache):
+            yield CrawlBatchItem(**item).model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus文本格式的指标：各阶段耗时直方图、进行中的操作数、缓存命中率、上游错误数"""
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/crawl/cache/stats")
+async def crawl_cache_stats():
+    """爬取缓存的命中/未命中计数"""
+    if crawl_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **crawl_cache.get_stats()}
+
+@app.get("/llm/cache/stats")
+async def llm_cache_stats():
+    """LLM结果缓存的命中/未命中计数"""
+    if not isinstance(moonshot, CachedMoonshotAPI):
+        return {"enabled": False}
+    return {"enabled": True, **moonshot.get_stats()}
+
+@app.get("/embed/cache/stats")
+async def embed_cache_stats():
+    """向量缓存的命中/未命中计数"""
+    if not isinstance(embedder, CachedEmbeddingAPI):
+        return {"enabled": False, **embedder.stats}
+    return {"enabled": True, **embedder.get_stats()}
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed(request: EmbedRequest):
+    """计算文本向量；并发请求会被合并成批量请求，已计算过的文本直接取缓存"""
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="No texts provided")
+    try:
+        return EmbedResponse(embeddings=await embedder.get_embeddings(request.texts))
+    except EmbeddingError as e:
+        logger.error(f"Error getting embeddings: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.post("/ingest")
+async def ingest(request: IngestRequest):
+    """提交入库任务：服务端依次完成抓取、解析、提取、计算向量和入库，立即返回job_id"""
+    if ingest_pipeline is None:
+        raise HTTPException(status_code=503, detail="Ingest pipeline is disabled")
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No urls provided")
+    if len(request.urls) > config.INGEST_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {config.INGEST_MAX_URLS} urls per job")
+    job_id = await ingest_pipeline.submit(request.urls)
+    logger.info(f"Created ingest job {job_id} with {len(request.urls)} URLs")
+    return {"job_id": job_id}
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(job_id: int):
+    """入库任务进度：各阶段的任务数、部分失败URL的原因，以及超过块数上限或部分块提取失败的页面（warnings）"""
+    job = await db.run(db.get_ingest_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if ingest_pipeline is not None:
+        job["queues"] = ingest_pipeline.queue_sizes()
+    return job
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """检索知识项：默认先在本地做BM25关键词检索，结果不足时再结合向量检索
+
+    查询按空白切成多个词，所有词都必须出现。三个字及以上的词走FTS5 trigram索引，
+    更短的词在索引结果上用LIKE过滤；查询只包含一两个字的词时（例如最常见的两字中文词"北京"）
+    无法使用索引，会退回对知识项全表的LIKE扫描，数据量大时明显变慢。
+    """
+    if request.mode not in ("text", "hybrid", "auto"):
+        raise HTTPException(status_code=400, detail="mode must be one of text, hybrid, auto")
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+
+    if request.mode != "hybrid":
+        results = await db.run(db.search_knowledge_text, request.query, request.limit, request.category)
+        if request.mode == "text" or len(results) >= request.limit:
+            return {"mode": "text", "results": results}
+
+    try:
+        query_vector = (await embedder.get_embeddings(request.query))[0]
+    except EmbeddingError as e:
+        if request.mode == "hybrid":
+            raise HTTPException(status_code=502, detail=str(e))
+        logger.warning(f"Embedding query failed, returning keyword results only: {str(e)}")
+        return {"mode": "text", "results": results}
+    results = await db.run(db.search_hybrid, request.query, query_vector, request.limit, request.category)
+    return {"mode": "hybrid", "results": results}
+
+@app.get("/graph/categories")
+async def graph_categories():
+    """知识图谱中的所有类别及事实数"""
+    return {"categories": await db.run(db.get_graph_categories)}
+
+@app.get("/graph/values")
+async def graph_values(category: str, limit: int = 100):
+    """某个类别在所有页面中出现过的值，按页面数倒序"""
+    if not 1 <= limit <= config.KNOWLEDGE_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.KNOWLEDGE_PAGE_MAX}")
+    return {"category": category, "values": await db.run(db.get_category_values, category, limit)}
+
+@app.get("/graph/pages")
+async def graph_pages(value: str, category: Optional[str] = None, limit: int = 100):
+    """包含某个值的页面"""
+    if not 1 <= limit <= config.KNOWLEDGE_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.KNOWLEDGE_PAGE_MAX}")
+    return {"value": value, "pages": await db.run(db.find_pages_by_value, value, category, limit)}
+
+@app.get("/graph/neighbors")
+async def graph_neighbors(value: str, category: Optional[str] = None, limit: int = 20):
+    """与某个值出现在同一页面的其他值，按共同出现的页面数倒序"""
+    if not 1 <= limit <= config.KNOWLEDGE_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.KNOWLEDGE_PAGE_MAX}")
+    return {"value": value, "neighbors": await db.run(db.get_value_neighbors, value, category, limit)}
+
+@app.get("/knowledge")
+async def list_knowledge(limit: int = 100, cursor: Optional[str] = None, category: Optional[str] = None):
+    """按创建时间倒序分页列出知识项，用返回的next_cursor请求下一页"""
+    if not 1 <= limit <= config.KNOWLEDGE_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.KNOWLEDGE_PAGE_MAX}")
+    try:
+        items, next_cursor = await db.run(db.get_knowledge_page, limit, cursor, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/knowledge/export")
+async def export_knowledge(format: str = "ndjson", category: Optional[str] = None):
+    """流式导出全部知识项（ndjson或csv），服务端内存占用不随数据量增长"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    serialize, media_type, extension = EXPORT_FORMATS[format]
+    # 同步生成器由StreamingResponse放到线程池中迭代，逐批查询不阻塞事件循环
+    body = serialize(db.iter_knowledge(config.KNOWLEDGE_EXPORT_BATCH, category))
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="knowledge.{extension}"'})
+
 @app.post("/extract")
 async def extract(request: ExtractRequest):
     try:
         logger.info("Starting content extraction...")
-        # 使用MoonshotAPI提取关键词
-        keywords = moonshot.extract_knowledge(request.content[:4000])  # 限制内容长度
+        # 长文本分块并发提取后在本地归并，不再截断到前4000字
+        extraction = await extract_knowledge_chunked(moonshot, request.content)
         logger.info("Keywords extraction completed")
         
-        return ExtractResponse(keywords=keywords)
+        return ExtractResponse(keywords=extraction.knowledge, total_chunks=extraction.total_chunks,
+                               skipped_chunks=extraction.skipped_chunks,
+                               failed_chunks=extraction.failed_chunks, warning=extraction.warning)
     except Exception as e:
         logger.error(f"Error extracting content: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -157,7 +457,7 @@ async def merge(request: MergeRequest):
     """合并多个JSON格式的知识内容"""
     try:
         logger.info(f"Received merge request with {len(request.contents)} items")
-        logger.debug(f"Request contents: {request.contents}")
+        _log_payload("Request contents", request.contents)
         
         # 验证输入数据
         if not request.contents:
@@ -171,10 +471,10 @@ async def merge(request: MergeRequest):
                 raise HTTPException(status_code=400, detail="All contents must be JSON objects")
             contents.append(item)
         
-        # 调用API进行合并
-        result = moonshot.merge_knowledge(contents)
+        # 本地合并，只有拿不准的近似值才交给LLM复核
+        result = await merge_knowledge(contents, moonshot)
         logger.info("Successfully merged contents")
-        logger.debug(f"Merge result: {result}")
+        _log_payload("Merge result", result)
         
         return MergeResponse(result=result)
     except Exception as e:
@@ -183,5 +483,27 @@ async def merge(request: MergeRequest):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/merge/views/{topic}/sources/{source_id}")
+async def put_merge_source(topic: str, source_id: str, request: MergeSourceRequest):
+    """把一个来源（如一个页面）的知识并入主题的合并视图，已存在的来源按新内容替换，只重新合并变化的类别"""
+    return await db.run(db.put_merge_source, topic, source_id, request.knowledge)
+
+@app.delete("/merge/views/{topic}/sources/{source_id}")
+async def delete_merge_source(topic: str, source_id: str):
+    """撤回一个来源：只有它提供的值会从合并结果中消失"""
+    result = await db.run(db.delete_merge_source, topic, source_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return result
+
+@app.get("/merge/views/{topic}")
+async def get_merge_view(topic: str, since: Optional[int] = None):
+    """读取物化的合并结果；传入since（版本号）时只返回之后变化过的类别"""
+    view = await db.run(db.get_merge_view, topic, since)
+    if view is None:
+        raise HTTPException(status_code=404, detail="View not found")
+    return view
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
+    # 开发用：单进程、代码改动后自动重载；生产环境使用 serve.py 启动多个worker
+    uvicorn.run("main:app", host=config.HOST, port=config.PORT, reload=True)
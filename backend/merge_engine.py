@@ -0,0 +1,289 @@
+"""本地知识合并引擎
+
+绝大多数合并只是"类别取并集 + 值去重"，不需要把整个列表发给LLM：
+
+1. 类别名规范化（全半角、大小写、空白和标点）并按别名表归一；
+2. 值先按规范化文本精确去重（保留 - . # + % 等影响含义的符号），再用字符n-gram的MinHash + LSH分桶找近似重复；
+3. 其中的数字（含正负号和小数点）不完全相同的两个值一定不是重复；
+   Jaccard相似度高于MERGE_NEAR_DUP_THRESHOLD且足够长的值直接合并（保留信息更多的那个），
+   短值达到这个相似度、以及相似度介于MERGE_AMBIGUOUS_THRESHOLD和它之间的值视为"拿不准"，
+   只把这些类别交给LLM处理。
+
+合并结果只取决于输入顺序，不依赖随机数或进程的hash种子。
+"""
+import json
+import logging
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 常见的同义类别，键为规范名称
+DEFAULT_CATEGORY_ALIASES = {
+    "学校名称": ["校名", "名称", "学校"],
+    "创建时间": ["创办时间", "成立时间", "建校时间", "创立时间", "始建时间"],
+    "校训": ["学校校训"],
+    "地址": ["地点", "所在地", "位置", "校址"],
+    "简介": ["概况", "简述", "介绍"],
+}
+
+_NUM_PERM = 32
+_LSH_BANDS = 8
+_LSH_ROWS = _NUM_PERM // _LSH_BANDS
+# 大于2^32的素数，保证 a*h+b 在uint64内不溢出
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240229)
+_PERM_A = _rng.randint(1, 2 ** 32 - 1, size=_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2 ** 32 - 1, size=_NUM_PERM, dtype=np.uint64)
+# 每个LSH桶最多记录的值数、每个新值最多精确比对的候选数，防止高度相似的输入退化成O(n^2)
+_MAX_BUCKET_SIZE = 64
+_MAX_CANDIDATES = 16
+# 值中这些标点会改变含义（负号、小数点、C#、C++、百分号），规范化时保留
+_MEANINGFUL_PUNCTUATION = frozenset('-.#+%')
+# 规范化后短于此长度的值（与改用2-gram的长度一致）即使高度相似也不自动合并，交给LLM判断
+_MIN_AUTO_MERGE_LEN = 12
+_NUMBER_RE = re.compile(r'[-+]?\d+(?:\.\d+)?')
+
+
+def _normalize(text: str, keep: frozenset = _MEANINGFUL_PUNCTUATION) -> str:
+    """NFKC + casefold，并去掉空白和标点（keep中的符号除外）"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ''.join(ch for ch in text
+                   if ch in keep or not (ch.isspace() or unicodedata.category(ch)[0] in 'PZ'))
+
+
+def normalize_category(name: str) -> str:
+    return _normalize(str(name), keep=frozenset())
+
+
+def _numbers(key: str) -> tuple:
+    return tuple(_NUMBER_RE.findall(key))
+
+
+def _value_text(value) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+def _shingles(key: str) -> frozenset:
+    """字符n-gram：中文一般两字成词用2-gram，短串整体作为一个shingle"""
+    n = 2 if len(key) < 12 else 3
+    if len(key) <= n:
+        return frozenset([key])
+    return frozenset(key[i:i + n] for i in range(len(key) - n + 1))
+
+
+def _minhash(shingles: frozenset) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return ((hashes[:, None] * _PERM_A + _PERM_B) % _PRIME).min(axis=0)
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class CategoryAliases:
+    """把规范化后的类别名映射到规范类别名"""
+
+    def __init__(self, aliases: Dict[str, List[str]] = None):
+        self._canonical = {}
+        for canonical, names in (aliases or {}).items():
+            self._canonical[normalize_category(canonical)] = canonical
+            for name in names:
+                self._canonical.setdefault(normalize_category(name), canonical)
+
+    def resolve(self, name: str) -> tuple:
+        """返回 (分组键, 规范名或None)"""
+        key = normalize_category(name)
+        canonical = self._canonical.get(key)
+        if canonical is not None:
+            return normalize_category(canonical), canonical
+        return key, None
+
+    @classmethod
+    def from_config(cls) -> "CategoryAliases":
+        aliases = dict(DEFAULT_CATEGORY_ALIASES)
+        if config.MERGE_CATEGORY_ALIASES_FILE:
+            with open(config.MERGE_CATEGORY_ALIASES_FILE, encoding='utf-8') as f:
+                aliases.update(json.load(f))
+        return cls(aliases)
+
+
+class _ValueSet:
+    """单个类别下去重后的值，带LSH索引"""
+
+    def __init__(self, near_dup: float, ambiguous: float):
+        self.near_dup = near_dup
+        self.ambiguous_threshold = ambiguous
+        self.values = []
+        self._texts = []
+        self._shingles = []
+        self._numbers = []
+        self._key_lengths = []
+        self._exact = {}
+        self._buckets = defaultdict(list)
+        self.ambiguous = False
+
+    def add(self, value):
+        text = _value_text(value)
+        key = _normalize(text)
+        if not key or key in self._exact:
+            return
+
+        shingles = _shingles(key)
+        numbers = _numbers(key)
+        signature = _minhash(shingles)
+        bands = [(band, signature[band * _LSH_ROWS:(band + 1) * _LSH_ROWS].tobytes())
+                 for band in range(_LSH_BANDS)]
+
+        # 按命中的band数排序候选，只精确比对最可能相似的几个
+        collisions = Counter(index for band in bands for index in self._buckets.get(band, ()))
+        best_index, best_score = -1, 0.0
+        for index, _ in collisions.most_common(_MAX_CANDIDATES):
+            # 数字不同（100人/1000人、3.5分/35分、-5°C/5°C）的值字面再像也是不同的事实
+            if self._numbers[index] != numbers:
+                continue
+            score = _jaccard(shingles, self._shingles[index])
+            if score > best_score:
+                best_index, best_score = index, score
+
+        if best_score >= self.near_dup and min(len(key), self._key_lengths[best_index]) >= _MIN_AUTO_MERGE_LEN:
+            # 近似重复：保留更长（信息更多）的写法
+            self._exact[key] = best_index
+            if len(text) > len(self._texts[best_index]):
+                self.values[best_index] = value
+                self._texts[best_index] = text
+            return
+        if best_score >= self.ambiguous_threshold:
+            self.ambiguous = True
+
+        index = len(self.values)
+        self.values.append(value)
+        self._texts.append(text)
+        self._shingles.append(shingles)
+        self._numbers.append(numbers)
+        self._key_lengths.append(len(key))
+        self._exact[key] = index
+        for band in bands:
+            bucket = self._buckets[band]
+            if len(bucket) < _MAX_BUCKET_SIZE:
+                bucket.append(index)
+
+
+@dataclass
+class LocalMergeResult:
+    merged: Dict[str, list]
+    # 含有"拿不准"的近似值、需要LLM进一步判断的类别
+    ambiguous: List[str] = field(default_factory=list)
+
+
+def merge_local(json_contents: List[dict], aliases: CategoryAliases = None,
+                near_dup: float = None, ambiguous: float = None) -> LocalMergeResult:
+    """在本地合并多个知识字典"""
+    aliases = aliases or _default_aliases()
+    near_dup = config.MERGE_NEAR_DUP_THRESHOLD if near_dup is None else near_dup
+    ambiguous = config.MERGE_AMBIGUOUS_THRESHOLD if ambiguous is None else ambiguous
+
+    names = {}
+    value_sets = {}
+    for knowledge in json_contents:
+        for category, values in knowledge.items():
+            key, canonical = aliases.resolve(category)
+            if not key:
+                continue
+            # 有别名表中的规范名时用规范名，否则用第一次出现的原始写法
+            names.setdefault(key, canonical or str(category).strip())
+            value_set = value_sets.get(key)
+            if value_set is None:
+                value_set = value_sets[key] = _ValueSet(near_dup, ambiguous)
+            if not isinstance(values, list):
+                values = [values] if values else []
+            for value in values:
+                value_set.add(value)
+
+    merged = {names[key]: value_set.values for key, value_set in value_sets.items()}
+    ambiguous_categories = [names[key] for key, value_set in value_sets.items() if value_set.ambiguous]
+    return LocalMergeResult(merged, ambiguous_categories)
+
+
+def value_key(value) -> str:
+    """值的精确去重键：规范化后的文本，为空表示应忽略的值"""
+    return _normalize(_value_text(value))
+
+
+def group_values(knowledge: dict, aliases: CategoryAliases = None) -> Dict[str, tuple]:
+    """把单个知识字典整理成 {类别分组键: (类别名, {值键: 值})}，同一来源内重复的值只保留第一个"""
+    aliases = aliases or _default_aliases()
+    groups = {}
+    for category, values in knowledge.items():
+        key, canonical = aliases.resolve(category)
+        if not key:
+            continue
+        name, keyed = groups.setdefault(key, (canonical or str(category).strip(), {}))
+        if not isinstance(values, list):
+            values = [values] if values else []
+        for value in values:
+            text_key = value_key(value)
+            if text_key:
+                keyed.setdefault(text_key, value)
+    return groups
+
+
+def new_value_set(near_dup: float = None, ambiguous: float = None) -> _ValueSet:
+    """单个类别的去重状态：依次add值，.values为去重结果，.ambiguous表示含有拿不准的近似值
+
+    与merge_local对同一类别的处理相同；保留这个对象，之后新增的值可以接着add，不必从头去重。
+    """
+    near_dup = config.MERGE_NEAR_DUP_THRESHOLD if near_dup is None else near_dup
+    ambiguous = config.MERGE_AMBIGUOUS_THRESHOLD if ambiguous is None else ambiguous
+    return _ValueSet(near_dup, ambiguous)
+
+
+_aliases_cache: Optional[CategoryAliases] = None
+
+
+def _default_aliases() -> CategoryAliases:
+    global _aliases_cache
+    if _aliases_cache is None:
+        _aliases_cache = CategoryAliases.from_config()
+    return _aliases_cache
+
+
+async def merge_knowledge(json_contents: List[dict], api=None) -> dict:
+    """先在本地合并，只把含近似值的类别交给api.merge_knowledge复核
+
+    未提供api、关闭了LLM复核、或待复核的值过多时，直接返回本地结果；
+    LLM调用失败时同样退回本地结果。
+    """
+    result = merge_local(json_contents)
+    if not result.ambiguous or api is None or not config.MERGE_LLM_FALLBACK:
+        return result.merged
+
+    residue = {category: result.merged[category] for category in result.ambiguous}
+    residue_size = sum(len(values) for values in residue.values())
+    if residue_size > config.MERGE_LLM_MAX_VALUES:
+        logger.info(f"Skipping LLM merge for {residue_size} ambiguous values (limit {config.MERGE_LLM_MAX_VALUES})")
+        return result.merged
+
+    logger.info(f"Sending {len(residue)} ambiguous categories ({residue_size} values) to LLM")
+    try:
+        reviewed = await api.merge_knowledge([residue])
+    except Exception as e:
+        logger.warning(f"LLM merge of ambiguous categories failed, using local result: {str(e)}")
+        return result.merged
+
+    merged = {category: values for category, values in result.merged.items() if category not in residue}
+    merged.update(reviewed)
+    return merged
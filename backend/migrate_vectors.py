@@ -0,0 +1,37 @@
+"""把旧格式的向量迁移为紧凑的带头部格式，并可导出内存映射用的.npy文件
+
+用法：
+    python migrate_vectors.py [--dtype float32|float16|int8] [--export-sidecar]
+"""
+import argparse
+import logging
+
+import config
+from db_manager import DBManager
+from vector_codec import DTYPE_CODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移知识库中的向量存储格式")
+    parser.add_argument("--db", default=config.DB_PATH, help="数据库路径")
+    parser.add_argument("--dtype", choices=sorted(DTYPE_CODES), default=config.VECTOR_DTYPE,
+                        help="目标存储类型")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批改写的行数")
+    parser.add_argument("--export-sidecar", action="store_true",
+                        help="迁移后导出 <db>.vectors.npy 供检索进程内存映射")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = DBManager(args.db)
+    try:
+        migrated = db.migrate_vectors(args.dtype, args.batch_size)
+        print(f"knowledge_items: {migrated['knowledge_items']} rows, knowledge: {migrated['knowledge']} rows")
+        if args.export_sidecar:
+            count = db.export_vector_sidecar()
+            print(f"Exported {count} vectors to {db.vector_sidecar_prefix}.npy")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import asyncio
 import logging
 import json
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI, OpenAI
+import config
+from metrics import UPSTREAM_ERRORS, track
 
 logger = logging.getLogger(__name__)
 
@@ -37,61 +41,77 @@ MERGE_PROMPT = """你是一个专业的知识融合助手。请合并给定的
    - 没有重复内容
 5. 确保返回的是合法的JSON格式，不要添加任何额外说明"""
 
+# 提取和合并使用的采样温度，也参与LLM结果缓存的键
+EXTRACT_TEMPERATURE = 0.2
+MERGE_TEMPERATURE = 0.1
+
+
+def _build_extract_messages(content: str) -> list:
+    """构建知识提取的提示词"""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"请分析以下文本并提取所有关键信息：\n\n{content}"
+        }
+    ]
+
+
+def _build_merge_messages(json_contents: list) -> list:
+    """构建知识合并的提示词"""
+    json_str = json.dumps(json_contents, ensure_ascii=False)
+    return [
+        {"role": "system", "content": MERGE_PROMPT},
+        {"role": "user", "content": f"请合并以下JSON内容：{json_str}"}
+    ]
+
+
+def _parse_knowledge(response_text: str) -> dict:
+    """解析模型返回的JSON，并确保所有值都是数组格式"""
+    try:
+        knowledge = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON: {str(e)}")
+        logger.error(f"Invalid JSON response: {response_text}")
+        raise ValueError(f"Invalid JSON response from API: {str(e)}")
+
+    for key in knowledge:
+        if not isinstance(knowledge[key], list):
+            knowledge[key] = [knowledge[key]] if knowledge[key] else []
+    return knowledge
+
+
 class MoonshotAPI:
     def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key, base_url="https://api.moonshot.cn/v1")
+        self.client = OpenAI(api_key=api_key, base_url=config.MOONSHOT_BASE_URL)
         logger.info("MoonshotAPI initialized")
 
     def extract_knowledge(self, content: str) -> dict:
         """从文本中提取结构化知识"""
         try:
-            # 构建提示词
-            messages = [
-                {
-                    "role": "system",
-                    "content": SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": f"请分析以下文本并提取所有关键信息：\n\n{content}"
-                }
-            ]
+            messages = _build_extract_messages(content)
 
             # 调用API
             logger.info("Making API call to Moonshot...")
             try:
                 response = self.client.chat.completions.create(
-                    model="moonshot-v1-8k",
+                    model=config.MOONSHOT_MODEL,
                     messages=messages,
-                    temperature=0.2,
+                    temperature=EXTRACT_TEMPERATURE,
                     response_format={"type": "json_object"}
                 )
                 logger.info("API call successful")
-                
-                # 获取响应文本
-                response_text = response.choices[0].message.content
-                logger.debug(f"Raw API Response: {response_text}")
-
-                # 尝试解析JSON
-                try:
-                    knowledge = json.loads(response_text)
-                    logger.info("Successfully parsed JSON response")
-                    
-                    # 确保所有值都是数组格式
-                    for key in knowledge:
-                        if not isinstance(knowledge[key], list):
-                            knowledge[key] = [knowledge[key]] if knowledge[key] else []
-                    
-                    return knowledge
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON: {str(e)}")
-                    logger.error(f"Invalid JSON response: {response_text}")
-                    raise ValueError(f"Invalid JSON response from API: {str(e)}")
-                    
             except Exception as e:
                 logger.error(f"API call failed: {str(e)}")
                 raise ValueError(f"API call failed: {str(e)}")
 
+            response_text = response.choices[0].message.content
+            logger.debug("Raw API Response: %s", response_text)
+            return _parse_knowledge(response_text)
+
         except Exception as e:
             logger.error(f"Error in extract_knowledge: {str(e)}")
             raise
@@ -99,57 +119,112 @@ class MoonshotAPI:
     def merge_knowledge(self, json_contents: list) -> dict:
         """合并多个JSON格式的知识内容"""
         try:
-            # 将JSON内容列表转换为字符串
-            json_str = json.dumps(json_contents, ensure_ascii=False)
             logger.info(f"Preparing to merge {len(json_contents)} JSON contents")
-            logger.debug(f"Input contents: {json_str}")
-            
-            # 构建提示词
-            messages = [
-                {"role": "system", "content": MERGE_PROMPT},
-                {"role": "user", "content": f"请合并以下JSON内容：{json_str}"}
-            ]
-            logger.debug(f"Prepared messages: {messages}")
-            
+            messages = _build_merge_messages(json_contents)
+
             # 调用API
             logger.info("Making API call to Moonshot for knowledge merge...")
             try:
                 response = self.client.chat.completions.create(
-                    model="moonshot-v1-8k",
+                    model=config.MOONSHOT_MODEL,
                     messages=messages,
-                    temperature=0.1,
+                    temperature=MERGE_TEMPERATURE,
                     response_format={"type": "json_object"},
                     max_tokens=4000
                 )
                 logger.info("API call successful")
-                
-                # 获取响应文本
-                response_text = response.choices[0].message.content
-                logger.debug(f"Raw API Response: {response_text}")
-                
-                # 解析JSON响应
-                try:
-                    merged_knowledge = json.loads(response_text)
-                    logger.info("Successfully parsed merged knowledge")
-                    logger.debug(f"Parsed result: {merged_knowledge}")
-                    
-                    # 确保所有值都是数组格式
-                    for key in merged_knowledge:
-                        if not isinstance(merged_knowledge[key], list):
-                            merged_knowledge[key] = [merged_knowledge[key]] if merged_knowledge[key] else []
-                    
-                    return merged_knowledge
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse merged JSON: {str(e)}")
-                    logger.error(f"Invalid JSON response: {response_text}")
-                    raise ValueError(f"Invalid JSON response from API: {str(e)}")
-                    
             except Exception as e:
                 logger.error(f"API call failed during merge: {str(e)}")
-                logger.error(f"Full error details: {e}", exc_info=True)
                 raise ValueError(f"API call failed: {str(e)}")
-                
+
+            response_text = response.choices[0].message.content
+            logger.debug("Raw API Response: %s", response_text)
+            return _parse_knowledge(response_text)
+
         except Exception as e:
             logger.error(f"Error in merge_knowledge: {str(e)}")
             logger.error("Full error traceback:", exc_info=True)
             raise
+
+
+class RateLimiter:
+    """把请求均匀地分布到时间轴上，每分钟最多rpm个；rpm<=0时不限速"""
+
+    def __init__(self, rpm: int):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncMoonshotAPI:
+    """MoonshotAPI的异步版本，供FastAPI的async处理函数使用
+
+    所有请求共享一个AsyncOpenAI客户端（连接池），并通过信号量限制
+    单个worker同时发往Moonshot的请求数，超出的请求在本地排队等待；
+    配置了rpm时还会按每分钟请求数限速。
+    """
+
+    def __init__(self, api_key, base_url: str = None, max_concurrency: int = None,
+                 timeout: float = None, max_retries: int = None, rpm: int = None):
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or config.MOONSHOT_BASE_URL,
+            timeout=timeout if timeout is not None else config.MOONSHOT_TIMEOUT,
+            max_retries=max_retries if max_retries is not None else config.MOONSHOT_MAX_RETRIES,
+        )
+        self.max_concurrency = max_concurrency or config.MOONSHOT_MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_limiter = RateLimiter(config.MOONSHOT_RPM if rpm is None else rpm)
+        logger.info(f"AsyncMoonshotAPI initialized (max_concurrency={self.max_concurrency})")
+
+    async def _complete(self, messages: list, **kwargs) -> str:
+        """在并发限制下调用模型，返回响应文本"""
+        async with self._semaphore:
+            await self._rate_limiter.acquire()
+            try:
+                with track("llm"):
+                    response = await self.client.chat.completions.create(
+                        model=config.MOONSHOT_MODEL,
+                        messages=messages,
+                        response_format={"type": "json_object"},
+                        **kwargs
+                    )
+            except Exception as e:
+                logger.error(f"API call failed: {str(e)}")
+                UPSTREAM_ERRORS.inc(upstream="llm", kind=type(e).__name__)
+                raise ValueError(f"API call failed: {str(e)}")
+        return response.choices[0].message.content
+
+    async def extract_knowledge(self, content: str) -> dict:
+        """从文本中提取结构化知识"""
+        response_text = await self._complete(
+            _build_extract_messages(content),
+            temperature=EXTRACT_TEMPERATURE
+        )
+        logger.debug("Raw API Response: %s", response_text)
+        return _parse_knowledge(response_text)
+
+    async def merge_knowledge(self, json_contents: list) -> dict:
+        """合并多个JSON格式的知识内容"""
+        logger.info(f"Preparing to merge {len(json_contents)} JSON contents")
+        response_text = await self._complete(
+            _build_merge_messages(json_contents),
+            temperature=MERGE_TEMPERATURE,
+            max_tokens=4000
+        )
+        logger.debug("Raw API Response: %s", response_text)
+        return _parse_knowledge(response_text)
+
+    async def close(self):
+        """关闭底层HTTP连接池"""
+        await self.client.close()
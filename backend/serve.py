@@ -0,0 +1,49 @@
+"""生产环境入口：先在父进程中准备共享数据，再启动多个uvicorn worker
+
+用法: python serve.py [--workers 4] [--host 0.0.0.0] [--port 8001] [--skip-prepare]
+
+每个worker是独立进程，在lifespan中各自创建数据库连接、HTTP会话和API客户端；
+向量索引以内存映射方式共享同一个文件。收到SIGTERM/SIGINT后停止接受新连接，
+等待进行中的请求和入库任务最多SHUTDOWN_GRACE_SECONDS秒。
+开发时仍可用 python main.py（单进程、自动重载）。
+"""
+import argparse
+import logging
+import os
+import time
+
+import uvicorn
+
+import config
+
+logger = logging.getLogger("serve")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--skip-prepare", action="store_true", help="跳过启动前的迁移和向量索引导出")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # worker进程重新导入config，通过环境变量得知自己处于多worker部署中
+    os.environ["WORKERS"] = str(args.workers)
+    if not args.skip_prepare:
+        from workers import prepare_shared_state
+        start = time.perf_counter()
+        prepare_shared_state(config.DB_PATH)
+        logger.info(f"Prepared shared state in {time.perf_counter() - start:.2f}s")
+    logger.info(f"Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=config.SHUTDOWN_GRACE_SECONDS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""网页正文的SimHash指纹，用于入库时识别镜像页、分页变体等近似重复
+
+指纹为64位：对规范化正文的字符三元组加权求和后取符号。两个页面指纹的汉明距离越小越相似，
+模板略有改动的副本一般在3位以内。
+
+查找时把指纹切成SIMHASH_BANDS段：汉明距离不超过 SIMHASH_BANDS-1 的两个指纹
+至少有一段完全相同（抽屉原理），所以只需按段精确匹配取候选，再计算真实距离，
+查找代价与库中页面数无关。
+"""
+import zlib
+
+import numpy as np
+
+from extractor import normalize_text
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+_SHINGLE = 3
+
+
+def _shingle_hashes(text: str) -> tuple:
+    """字符三元组的64位哈希（两个不同种子的crc32拼接）及其出现次数"""
+    shingles = {}
+    for i in range(max(1, len(text) - _SHINGLE + 1)):
+        shingle = text[i:i + _SHINGLE]
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    hashes = np.fromiter(
+        ((zlib.crc32(encoded) << 32) | zlib.crc32(encoded, 0x9E3779B9)
+         for encoded in (shingle.encode('utf-8') for shingle in shingles)),
+        dtype=np.uint64, count=len(shingles)
+    )
+    return hashes, np.fromiter(shingles.values(), dtype=np.float64, count=len(shingles))
+
+
+def simhash(text: str) -> int:
+    """计算正文的64位SimHash，返回适合存入SQLite INTEGER的有符号整数"""
+    text = normalize_text(text).casefold()
+    if not text:
+        return 0
+    hashes, weights = _shingle_hashes(text)
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(bool)
+    # 每一位：该位为1的特征权重之和减去为0的权重之和
+    totals = weights @ np.where(bits, 1.0, -1.0)
+    fingerprint = int(np.sum((totals > 0).astype(np.uint64) << _BIT_SHIFTS))
+    return to_signed(fingerprint)
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+
+def band_values(fingerprint: int) -> list:
+    """把指纹切成SIMHASH_BANDS段，返回 [(段号, 段值), ...]"""
+    unsigned = fingerprint & ((1 << SIMHASH_BITS) - 1)
+    mask = (1 << _BAND_BITS) - 1
+    return [(band, (unsigned >> (band * _BAND_BITS)) & mask) for band in range(SIMHASH_BANDS)]
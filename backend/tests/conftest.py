@@ -0,0 +1,21 @@
+"""测试公共设置：把backend加入导入路径，并让config指向临时数据库，避免碰到仓库中的knowledge_base.db"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="kb-tests-"), "knowledge_base.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest  # noqa: E402  config在导入时读取DB_PATH，必须先设置环境变量
+
+from db_manager import DBManager  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DBManager(str(tmp_path / "test.db"))
+    yield manager
+    manager.close()
@@ -0,0 +1,53 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import bge_api
+from bge_api import AsyncBGEM3API, EmbeddingError
+
+
+def test_retry_after_is_a_lower_bound(monkeypatch):
+    api = AsyncBGEM3API(api_key="test", base_url="http://embed.invalid", max_retries=2)
+    attempts, delays = [], []
+
+    async def post(texts):
+        attempts.append(texts)
+        if len(attempts) == 1:
+            raise bge_api._RetryableError("HTTP 429", retry_after=2.0)
+        return [[1.0, 0.0]]
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(api, "_post", post)
+    monkeypatch.setattr(bge_api.asyncio, "sleep", sleep)
+    for jitter in (0.0, 0.999):
+        attempts.clear()
+        monkeypatch.setattr(bge_api.random, "random", lambda: jitter)
+        assert asyncio.run(api._request(["文本"])) == [[1.0, 0.0]]
+    assert delays[0] == 2.0
+    assert 2.0 < delays[1] <= 2.5
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ('{"error": "quota exceeded"}', "application/json"),
+    ('{"data": [{"index": 0}]}', "application/json"),
+    ("<html>gateway</html>", "text/html"),
+])
+def test_malformed_success_response_raises_embedding_error(body, content_type):
+    async def handler(request):
+        return web.Response(text=body, content_type=content_type)
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/embeddings", handler)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            api = AsyncBGEM3API(api_key="test", base_url=str(server.make_url("")), max_wait_ms=0,
+                                max_retries=0, session=session)
+            with pytest.raises(EmbeddingError):
+                await api.get_embeddings(["文本"])
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from chunking import estimate_tokens, extract_knowledge_chunked, split_text
+
+SENTENCES = [f"第{i}句话讲的是北京大学的历史和现状。" for i in range(40)]
+TEXT = "".join(SENTENCES)
+
+
+class FakeModel:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.chunks = []
+
+    async def extract_knowledge(self, content: str) -> dict:
+        index = len(self.chunks)
+        self.chunks.append(content)
+        if index in self.failing:
+            raise RuntimeError("model unavailable")
+        return {"块": [f"块{index}"]}
+
+
+def test_short_text_is_a_single_chunk():
+    assert split_text("北京大学。", max_tokens=100) == ["北京大学。"]
+
+
+def test_chunks_respect_budget_and_sentence_boundaries():
+    chunks = split_text(TEXT, max_tokens=60)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+    assert all(chunk.endswith("。") for chunk in chunks)
+    assert "".join(chunk.replace(" ", "") for chunk in chunks) == TEXT
+
+
+def test_sentence_without_punctuation_is_hard_split():
+    chunks = split_text("北" * 250, max_tokens=100)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+def test_partial_failure_keeps_other_chunks():
+    model = FakeModel(failing={1})
+    result = asyncio.run(extract_knowledge_chunked(model, TEXT, max_tokens=60, concurrency=1))
+    assert result.failed_chunks == 1 and result.skipped_chunks == 0
+    assert "块1" not in result.knowledge["块"] and len(result.knowledge["块"]) == len(model.chunks) - 1
+    assert "1 of" in result.warning
+
+
+def test_all_chunks_failing_raises():
+    model = FakeModel(failing=range(100))
+    with pytest.raises(RuntimeError):
+        asyncio.run(extract_knowledge_chunked(model, TEXT, max_tokens=60))
+
+
+def test_chunks_over_the_limit_are_reported():
+    model = FakeModel()
+    result = asyncio.run(extract_knowledge_chunked(model, TEXT, max_tokens=60, max_chunks=2))
+    assert len(model.chunks) == 2
+    assert result.skipped_chunks == result.total_chunks - 2 > 0
+    assert "skipped" in result.warning
+
+
+def test_complete_extraction_has_no_warning():
+    result = asyncio.run(extract_knowledge_chunked(FakeModel(), "北京大学。", max_tokens=60))
+    assert result.total_chunks == 1 and result.warning is None
+    assert result.knowledge == {"块": ["块0"]}
@@ -0,0 +1,31 @@
+import asyncio
+
+from crawl_cache import CrawlCache, normalize_url
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&a=1#top") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_crawl_cache_evicts_expired_then_least_recently_used(db):
+    for i, now in enumerate([100.0, 200.0, 300.0, 400.0]):
+        db.put_crawl_cache(f"k{i}", f"https://example.com/{i}", None, None, "hash", "", "x" * 100, now)
+    db.touch_crawl_cache("k1", 500.0)
+    # k0过期；剩下的按最近访问保留到200字节以内：k1（刚访问）和k3
+    assert db.evict_crawl_cache(max_bytes=200, expire_before=150.0) == 2
+    assert [key for key in ("k0", "k1", "k2", "k3") if db.get_crawl_cache(key)] == ["k1", "k3"]
+
+
+def test_crawl_cache_store_and_lookup(db):
+    cache = CrawlCache(db, ttl=60, evict_every=1)
+
+    async def run():
+        await cache.store(normalize_url("https://example.com/a"), "https://example.com/a",
+                          '"v1"', None, "hash", "标题", "正文")
+        return await cache.lookup("https://EXAMPLE.com/a#section")
+
+    key, entry = asyncio.run(run())
+    assert key == "https://example.com/a"
+    assert entry["content"] == "正文" and cache.is_fresh(entry)
+    assert CrawlCache.conditional_headers(entry) == {"If-None-Match": '"v1"'}
@@ -0,0 +1,91 @@
+import asyncio
+import codecs
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from crawl_cache import CrawlCache
+from crawler import CrawlError, detect_encoding, fetch_page, read_body
+
+GBK_PAGE = "<html><body><p>北京大学创办于1898年，初名京师大学堂，是中国第一所国立综合性大学。</p></body></html>" * 20
+
+
+def test_bom_wins_over_declared_charset():
+    assert detect_encoding(codecs.BOM_UTF8 + "页面".encode("utf-8"), "gbk") == "utf-8-sig"
+
+
+def test_declared_charset_is_normalized_to_superset():
+    assert detect_encoding(b"<html></html>", "GB2312") == "gb18030"
+    assert detect_encoding(b"<html></html>", "us-ascii") == "utf-8"
+
+
+def test_meta_charset_is_used_when_header_is_missing_or_invalid():
+    content = b'<html><head><meta charset="gbk"></head>' + GBK_PAGE.encode("gbk")
+    assert detect_encoding(content) == "gb18030"
+    assert detect_encoding(content, "no-such-charset") == "gb18030"
+    assert detect_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">') == "shift_jis"
+
+
+def test_chardet_is_the_last_resort():
+    assert detect_encoding(GBK_PAGE.encode("gbk")) == "gb18030"
+    assert detect_encoding(b"") == "utf-8"
+
+
+def _read(handler, max_size: int) -> bytes:
+    async def run():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            async with session.get(server.make_url("/")) as response:
+                return await read_body(response, max_size)
+    return asyncio.run(run())
+
+
+async def _fixed(request):
+    return web.Response(body=b"x" * 1000)
+
+
+async def _streamed(request):
+    # 分块传输，没有Content-Length，只能边读边计数
+    response = web.StreamResponse()
+    await response.prepare(request)
+    for _ in range(10):
+        await response.write(b"x" * 1000)
+    await response.write_eof()
+    return response
+
+
+def test_read_body_within_limit():
+    assert _read(_fixed, 1000) == b"x" * 1000
+    assert _read(_streamed, 10000) == b"x" * 10000
+
+
+@pytest.mark.parametrize("handler", [_fixed, _streamed])
+def test_read_body_rejects_oversized_response(handler):
+    with pytest.raises(CrawlError) as error:
+        _read(handler, 999)
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize("status", [404, 500])
+def test_error_responses_are_not_parsed_or_cached(db, status):
+    cache = CrawlCache(db)
+
+    async def error_page(request):
+        return web.Response(status=status, text="<html><body>" + "出错了，请稍后再试。" * 10 + "</body></html>",
+                            content_type="text/html", headers={"ETag": '"error"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/", error_page)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            url = str(server.make_url("/"))
+            with pytest.raises(CrawlError) as error:
+                await fetch_page(session, url, cache=cache)
+            return error.value, await cache.lookup(url)
+
+    error, (_, entry) = asyncio.run(run())
+    assert (error.status_code, error.upstream_status) == (502, status)
+    assert entry is None
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from merge_engine import merge_local
+
+
+def _store_items(db, count, category="人物"):
+    page_id = db.store_page("https://example.invalid/page", "页面", "")
+    db.store_knowledge(page_id, {category: [f"知识项{i}" for i in range(count)]}, {})
+    return page_id
+
+
+def test_keyset_pagination_returns_every_item_once(db):
+    # 同一秒内写入的行created_at相同，靠id区分先后
+    _store_items(db, 25)
+    seen, cursor = [], None
+    while True:
+        items, cursor = db.get_knowledge_page(limit=10, cursor=cursor)
+        seen.extend(item["id"] for item in items)
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 25
+    assert seen == sorted(seen, reverse=True)
+    assert [item["id"] for item in db.iter_knowledge(batch_size=7)] == seen
+
+
+def test_keyset_pagination_is_stable_under_inserts(db):
+    _store_items(db, 20)
+    first, cursor = db.get_knowledge_page(limit=10)
+    _store_items(db, 5)
+    rest, _ = db.get_knowledge_page(limit=100, cursor=cursor)
+    assert {item["id"] for item in first}.isdisjoint(item["id"] for item in rest)
+    assert len(first) + len(rest) == 20
+
+
+def test_keyset_pagination_filters_by_category(db):
+    _store_items(db, 3, "人物")
+    _store_items(db, 4, "地点")
+    items, cursor = db.get_knowledge_page(limit=10, category="地点")
+    assert cursor is None
+    assert [item["category"] for item in items] == ["地点"] * 4
+
+
+def test_invalid_page_cursor(db):
+    with pytest.raises(ValueError):
+        db.get_knowledge_page(cursor="not-a-cursor")
+
+
+def test_vector_index_updates_only_after_commit(db):
+    page_id = db.store_page("https://example.invalid/page", "页面", "")
+    index = db.vector_index
+    vector = np.ones(8, dtype=np.float32).tolist()
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.store_knowledge(page_id, {"人物": ["张三"]}, {"人物": [vector]})
+            assert len(index) == 0
+            raise RuntimeError("rollback")
+    assert len(index) == 0
+    assert db.get_knowledge_page()[0] == []
+
+    with db.transaction():
+        db.store_knowledge(page_id, {"人物": ["张三"]}, {"人物": [vector]})
+        with db.transaction():
+            db.store_knowledge(page_id, {"人物": ["李四"]}, {"人物": [vector]})
+        assert len(index) == 0
+    assert len(index) == 2
+
+
+def test_merge_view_matches_merge_local(db):
+    sources = {
+        "a": {"学校名称": ["北京大学"], "人数": ["100人"]},
+        "b": {"校名": ["北京大学 "], "人数": ["1000人"], "地址": ["北京市海淀区颐和园路5号"]},
+        "c": {"地点": ["北京市海淀区颐和园路5号"], "校训": ["爱国 进步 民主 科学"]},
+    }
+    for source_id, knowledge in sources.items():
+        db.put_merge_source("北大", source_id, knowledge)
+    view = db.get_merge_view("北大")
+    assert view["sources"] == 3
+    assert view["result"] == merge_local(list(sources.values())).merged
+
+    # 替换来源b：只有失去唯一来源的值所在类别发生变化
+    sources["b"] = {"人数": ["100人"]}
+    update = db.put_merge_source("北大", "b", sources["b"])
+    assert update["changed"] == ["人数"]
+    assert db.get_merge_view("北大", since_version=view["version"])["result"] == {"人数": ["100人"]}
+    assert db.get_merge_view("北大")["result"] == merge_local(list(sources.values())).merged
+
+    db.delete_merge_source("北大", "c")
+    assert db.get_merge_view("北大")["result"] == {"学校名称": ["北京大学"], "人数": ["100人"]}
+
+
+def test_unchanged_merge_source_keeps_version(db):
+    first = db.put_merge_source("主题", "a", {"人物": ["张三"]})
+    again = db.put_merge_source("主题", "a", {"人物": ["张三"]})
+    assert again == {"topic": "主题", "version": first["version"], "changed": []}
+
+
+def test_vectors_committed_while_index_loads_are_not_lost(db, monkeypatch):
+    page_id = db.store_page("https://example.invalid/page", "页面", "")
+    db.store_knowledge(page_id, {"人物": ["张三"]}, {"人物": [np.ones(8).tolist()]})
+    load = db._load_vector_index
+    writers = []
+
+    def slow_load():
+        # 加载读完向量之后、索引发布之前，另一个线程提交了新的向量
+        index = load()
+        writer = threading.Thread(target=db.store_knowledge,
+                                  args=(page_id, {"人物": ["李四"]}, {"人物": [np.ones(8).tolist()]}))
+        writer.start()
+        writers.append(writer)
+        while db.conn.execute("SELECT COUNT(*) FROM knowledge_items").fetchone()[0] < 2:
+            time.sleep(0.01)
+        return index
+
+    monkeypatch.setattr(db, "_load_vector_index", slow_load)
+    index = db.vector_index
+    writers[0].join(5)
+    assert len(index) == 2
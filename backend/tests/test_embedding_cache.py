@@ -0,0 +1,32 @@
+import asyncio
+
+from embedding_cache import CachedEmbeddingAPI
+
+
+class FakeEmbedder:
+    model = "fake"
+
+    def __init__(self):
+        self.texts = []
+
+    async def get_embeddings(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    async def close(self):
+        pass
+
+
+def test_embedding_cache_reuses_stored_vectors_and_evicts(db):
+    api = FakeEmbedder()
+    cache = CachedEmbeddingAPI(api, db, memory_entries=0, max_entries=3, evict_every=1)
+
+    vectors = asyncio.run(cache.get_embeddings(["a", "bb", "a"]))
+    assert vectors == [[1.0, 1.0, 0.0], [2.0, 1.0, 0.0], [1.0, 1.0, 0.0]]
+    assert api.texts == ["a", "bb"]
+
+    assert asyncio.run(cache.get_embeddings("bb")) == [[2.0, 1.0, 0.0]]
+    assert api.texts == ["a", "bb"] and cache.stats["db_hits"] == 1
+
+    asyncio.run(cache.get_embeddings(["ccc", "dddd"]))
+    assert db.conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0] == 3
@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from extractor import available_backends, extract_content, extract_content_async, normalize_text, resolve_backend
+
+HTML = """<html><head><title> 北京大学 </title><style>p { color: red; }</style></head>
+<body><script>var tracking = 1;</script>
+<p>北京大学创办于1898年，
+   初名京师大学堂。</p><div>校训：爱国　进步 民主 科学</div></body></html>"""
+
+
+def test_normalize_text_collapses_whitespace():
+    assert normalize_text("  第一行\n\n  第二行\t 结尾 ") == "第一行 第二行 结尾"
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_extract_title_and_text(backend):
+    title, content = extract_content(HTML, backend)
+    assert title == "北京大学"
+    assert "北京大学创办于1898年， 初名京师大学堂。" in content
+    assert "tracking" not in content and "color" not in content
+
+
+def test_unknown_backend_falls_back():
+    assert resolve_backend("no-such-parser") == available_backends()[0]
+    assert resolve_backend("auto") == available_backends()[0]
+
+
+def test_extract_in_process_pool():
+    async def run():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return await extract_content_async(HTML, executor)
+    assert asyncio.run(run()) == extract_content(HTML)
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import config
+from crawl_cache import CrawlCache
+from crawler import create_session
+from ingest import IngestPipeline
+
+PAGES = {
+    "/a": "<html><head><title>甲</title></head><body><p>北京大学创办于1898年，初名京师大学堂。</p></body></html>",
+    "/b": "<html><head><title>乙</title></head><body><p>清华大学始建于1911年，位于北京西北郊。</p></body></html>",
+}
+
+
+class FakeMoonshot:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    async def extract_knowledge(self, content: str) -> dict:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return {"摘要": [content[:10]]}
+
+
+class FakeEmbedder:
+    async def get_embeddings(self, texts):
+        return [[1.0, float(len(text)), 0.0] for text in texts]
+
+
+async def _page(request):
+    return web.Response(text=PAGES[request.path], content_type="text/html")
+
+
+async def _wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def _wait_finished(db, job_id: int) -> dict:
+    async def finished():
+        return (await db.run(db.get_ingest_job, job_id))["status"] == "finished"
+    await _wait_until(finished)
+    return await db.run(db.get_ingest_job, job_id)
+
+
+def _pipeline(db, session=None, moonshot=None, **kwargs) -> IngestPipeline:
+    return IngestPipeline(db, session, moonshot or FakeMoonshot(), FakeEmbedder(),
+                          fetch_workers=2, parse_workers=1, extract_workers=1, store_workers=1, **kwargs)
+
+
+def test_pipeline_ingests_submitted_urls(db):
+    async def run():
+        app = web.Application()
+        for path in PAGES:
+            app.router.add_get(path, _page)
+        async with TestServer(app) as server:
+            session = create_session()
+            pipeline = _pipeline(db, session)
+            await pipeline.start()
+            try:
+                job_id = await pipeline.submit([str(server.make_url(path)) for path in PAGES])
+                return await _wait_finished(db, job_id)
+            finally:
+                await pipeline.stop()
+                await session.close()
+
+    job = asyncio.run(run())
+    assert job["status"] == "finished"
+    assert job["stages"] == {"done": 2} and job["errors"] == []
+    items, _ = db.get_knowledge_page()
+    assert sorted(item["page_title"] for item in items) == ["乙", "甲"]
+    assert len(db.vector_index) == 2
+
+
+
+def test_truncated_extraction_is_reported_on_the_task(db, monkeypatch):
+    monkeypatch.setattr(config, "EXTRACT_CHUNK_TOKENS", 10)
+    monkeypatch.setattr(config, "EXTRACT_MAX_CHUNKS", 1)
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/a", _page)
+        async with TestServer(app) as server:
+            session = create_session()
+            pipeline = _pipeline(db, session)
+            await pipeline.start()
+            try:
+                job_id = await pipeline.submit([str(server.make_url("/a"))])
+                return await _wait_finished(db, job_id)
+            finally:
+                await pipeline.stop()
+                await session.close()
+
+    job = asyncio.run(run())
+    assert job["stages"] == {"done": 1} and job["errors"] == []
+    assert len(job["warnings"]) == 1 and "chunks skipped" in job["warnings"][0]["warning"]
+
+@pytest.mark.parametrize("ttl", [3600, 0])
+def test_reingesting_unchanged_url_skips_extraction(db, ttl):
+    requests = []
+
+    async def page(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text=PAGES["/a"], content_type="text/html", headers={"ETag": '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/a", page)
+        async with TestServer(app) as server:
+            session = create_session()
+            moonshot = FakeMoonshot()
+            # ttl为0时每次都带If-None-Match重新验证，服务器返回304
+            pipeline = _pipeline(db, session, moonshot, cache=CrawlCache(db, ttl=ttl))
+            await pipeline.start()
+            try:
+                jobs = []
+                for _ in range(2):
+                    job_id = await pipeline.submit([str(server.make_url("/a"))])
+                    jobs.append(await _wait_finished(db, job_id))
+                return jobs, moonshot.calls, pipeline.stats
+            finally:
+                await pipeline.stop()
+                await session.close()
+
+    jobs, calls, stats = asyncio.run(run())
+    assert [job["stages"] for job in jobs] == [{"done": 1}, {"done": 1}]
+    assert calls == 1 and stats["unchanged"] == 1
+    assert requests == ([None] if ttl else [None, '"v1"'])
+    assert db.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] == 1
+    assert len(db.get_knowledge_page()[0]) == 1
+
+
+def test_missing_page_fails_without_retry(db):
+    async def run():
+        async with TestServer(web.Application()) as server:
+            session = create_session()
+            pipeline = _pipeline(db, session, cache=CrawlCache(db))
+            await pipeline.start()
+            try:
+                job_id = await pipeline.submit([str(server.make_url("/missing"))])
+                return await _wait_finished(db, job_id), pipeline.stats
+            finally:
+                await pipeline.stop()
+                await session.close()
+
+    job, stats = asyncio.run(run())
+    assert job["stages"] == {"failed": 1} and stats["retried"] == 0
+    assert job["errors"][0]["error"] == "Upstream returned HTTP 404"
+    assert db.conn.execute("SELECT COUNT(*) FROM crawl_cache").fetchone()[0] == 0
+
+
+def test_pending_tasks_resume_from_their_stage(db):
+    job_id = db.create_ingest_job(["https://example.invalid/a"])
+    task = db.get_pending_ingest_tasks(0, 10)[0]
+    page_id = db.store_page(task["url"], "甲", "北京大学创办于1898年。")
+    db.update_ingest_task(task["id"], stage="embed", page_id=page_id,
+                          knowledge_json=json.dumps({"年份": ["1898年"]}, ensure_ascii=False))
+    assert db.get_ingest_job(job_id)["status"] == "running"
+
+    async def run():
+        pipeline = _pipeline(db)
+        await pipeline.start()
+        try:
+            return await _wait_finished(db, job_id)
+        finally:
+            await pipeline.stop()
+
+    assert asyncio.run(run())["stages"] == {"done": 1}
+    assert db.get_knowledge(page_id) == {"年份": ["1898年"]}
+    assert db.get_pending_ingest_tasks(0, 10) == []
+
+
+def test_worker_survives_failure_while_recording_failure(db, monkeypatch):
+    job_id = db.create_ingest_job(["https://example.invalid/a", "https://example.invalid/b"])
+    for task in db.get_pending_ingest_tasks(0, 10):
+        page_id = db.store_page(task["url"], "页面", "正文内容足够长的页面")
+        db.update_ingest_task(task["id"], stage="extract", page_id=page_id)
+
+    update = db.update_ingest_task
+    calls = []
+
+    def flaky_update(task_id, **fields):
+        calls.append(task_id)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return update(task_id, **fields)
+
+    monkeypatch.setattr(db, "update_ingest_task", flaky_update)
+
+    async def run():
+        pipeline = _pipeline(db, moonshot=FakeMoonshot(fail=True), max_attempts=1)
+        await pipeline.start()
+        try:
+            async def both_handled():
+                return len(calls) == 2 and not pipeline._busy
+            await _wait_until(both_handled)
+            return pipeline.stats
+        finally:
+            await pipeline.stop()
+
+    stats = asyncio.run(run())
+    # 第一个任务的失败没能记录，仍停在extract；唯一的extract worker继续处理了第二个任务
+    assert stats["failed"] == 1
+    assert db.get_ingest_job(job_id)["stages"] == {"extract": 1, "failed": 1}
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def graph(db):
+    pages = {
+        "北大": {"学校名称": "北京大学", "城市": ["北京"], "类型": ["综合", "研究型"]},
+        "清华": {"学校名称": "清华大学", "城市": ["北京"], "类型": ["研究型"]},
+        "复旦": {"学校名称": "复旦大学", "城市": ["上海"], "类型": ["综合", "研究型"]},
+    }
+    ids = {}
+    for title, knowledge in pages.items():
+        ids[title] = db.store_page(f"https://example.invalid/{title}", title, "")
+        db.store_knowledge_only(ids[title], knowledge)
+    return ids
+
+
+def test_category_values_are_counted_by_page(db, graph):
+    assert db.get_category_values("类型") == [{"value": "研究型", "pages": 3}, {"value": "综合", "pages": 2}]
+    assert db.get_category_values("不存在") == []
+    assert db.get_graph_categories()[0] == {"category": "类型", "facts": 5}
+
+
+def test_find_pages_by_value(db, graph):
+    pages = db.find_pages_by_value("北京")
+    assert [page["page_id"] for page in pages] == [graph["清华"], graph["北大"]]
+    assert {page["category"] for page in pages} == {"城市"}
+    assert db.find_pages_by_value("北京", category="类型") == []
+    assert db.find_pages_by_value("广州") == []
+
+
+def test_value_neighbors(db, graph):
+    neighbors = db.get_value_neighbors("北京")
+    assert neighbors[0] == {"value": "研究型", "category": "类型", "shared_pages": 2}
+    assert {n["value"] for n in neighbors} == {"研究型", "综合", "北京大学", "清华大学"}
+
+
+def test_updating_knowledge_replaces_page_facts(db, graph):
+    db.store_knowledge_only(graph["北大"], {"学校名称": "北京大学", "城市": ["北京"], "校训": "爱国 进步 民主 科学"})
+    assert db.get_page_facts(graph["北大"]) == {"城市": ["北京"], "学校名称": ["北京大学"], "校训": ["爱国 进步 民主 科学"]}
+    assert db.get_category_values("类型") == [{"value": "研究型", "pages": 2}, {"value": "综合", "pages": 1}]
+
+
+def test_backfill_indexes_legacy_knowledge_once(db):
+    page_id = db.store_page("https://example.invalid/legacy", "旧页面", "")
+    db.conn.execute("INSERT INTO knowledge (page_id, knowledge_json, kg_indexed) VALUES (?, ?, 0)",
+                    (page_id, json.dumps({"城市": ["杭州"]}, ensure_ascii=False)))
+    db.conn.commit()
+    assert db.find_pages_by_value("杭州") == []
+    assert db.backfill_knowledge_graph() == 1
+    assert [page["page_id"] for page in db.find_pages_by_value("杭州")] == [page_id]
+    assert db.backfill_knowledge_graph() == 0
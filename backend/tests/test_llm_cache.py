@@ -0,0 +1,39 @@
+import asyncio
+
+from llm_cache import CachedMoonshotAPI
+
+
+class FakeMoonshot:
+    def __init__(self):
+        self.calls = 0
+
+    async def extract_knowledge(self, content: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"内容": [content]}
+
+    async def close(self):
+        pass
+
+
+def test_llm_cache_coalesces_and_evicts(db):
+    api = FakeMoonshot()
+    cache = CachedMoonshotAPI(api, db, memory_entries=0, max_entries=2, evict_every=1)
+
+    async def run():
+        first = await asyncio.gather(*[cache.extract_knowledge("甲") for _ in range(5)])
+        for text in ("乙", "丙"):
+            await cache.extract_knowledge(text)
+        return first
+
+    results = asyncio.run(run())
+    assert results == [{"内容": ["甲"]}] * 5
+    assert api.calls == 3
+    assert cache.stats["coalesced"] == 4
+    assert db.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 2
+
+    # 命中SQLite时返回新的dict，调用方修改结果不影响缓存
+    result = asyncio.run(cache.extract_knowledge("丙"))
+    result["内容"].append("修改")
+    assert asyncio.run(cache.extract_knowledge("丙")) == {"内容": ["丙"]}
+    assert api.calls == 3 and cache.stats["db_hits"] == 2
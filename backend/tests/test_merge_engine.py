@@ -0,0 +1,56 @@
+import pytest
+
+from merge_engine import CategoryAliases, merge_local, new_value_set
+
+
+@pytest.mark.parametrize("a, b", [
+    ("100人", "1000人"),
+    ("3.5分", "35分"),
+    ("C#", "C"),
+    ("C++", "C"),
+    ("010-12345678", "010-12345679"),
+    ("-5°C", "5°C"),
+    ("增长5%", "增长5"),
+    ("成立于1998年", "成立于1999年"),
+])
+def test_values_differing_in_numbers_or_symbols_are_kept(a, b):
+    result = merge_local([{"信息": [a]}, {"信息": [b]}])
+    assert result.merged == {"信息": [a, b]}
+
+
+def test_short_near_duplicates_are_ambiguous_instead_of_merged():
+    result = merge_local([{"学校名称": ["清华大学"]}, {"学校名称": ["清华大学校"]}])
+    assert result.merged == {"学校名称": ["清华大学", "清华大学校"]}
+    assert result.ambiguous == ["学校名称"]
+
+
+def test_long_near_duplicates_are_merged():
+    result = merge_local([
+        {"机构": ["北京大学信息科学技术学院"]},
+        {"机构": ["北京大学信息科学技术学院。"]},
+        {"机构": [" 北京大学 信息科学技术学院 "]},
+    ])
+    assert result.merged == {"机构": ["北京大学信息科学技术学院"]}
+    assert result.ambiguous == []
+
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    result = merge_local([{"语言": ["Python", "python "]}, {"语言": ["PYTHON", "Go"]}])
+    assert result.merged == {"语言": ["Python", "Go"]}
+
+
+def test_category_aliases_group_categories():
+    aliases = CategoryAliases({"人物": ["人名", "People"]})
+    result = merge_local([{"人名": ["张三"]}, {"people": ["李四"]}, {"人物": ["张三"]}], aliases=aliases)
+    assert result.merged == {"人物": ["张三", "李四"]}
+
+
+def test_incremental_value_set_matches_merge_local():
+    batches = [["北京大学信息科学技术学院", "100人"], ["北京大学信息科学技术学院。", "1000人"], ["清华大学", "清华大学校"]]
+    value_set = new_value_set()
+    for batch in batches:
+        for value in batch:
+            value_set.add(value)
+    expected = merge_local([{"x": batch} for batch in batches])
+    assert value_set.values == expected.merged["x"]
+    assert value_set.ambiguous == ("x" in expected.ambiguous)
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import os
+import signal
+
+import aiohttp
+import pytest
+import uvicorn
+
+import config
+import main
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "serve.db"))
+    monkeypatch.setattr(config, "INGEST_ENABLED", False)
+    monkeypatch.setattr(main, "MOONSHOT_API_KEY", "test")
+    monkeypatch.setattr(main, "readiness", {"vector_index": "pending", "knowledge_graph": "pending",
+                                            "ingest": "disabled", "draining": False})
+    # uvicorn退出时会按原处理函数重新发出捕获到的信号，这里换成空操作，避免结束测试进程
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    yield
+    signal.signal(signal.SIGTERM, previous)
+
+
+def test_ready_until_exit_signal(app_env):
+    seen = {}
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+
+        async def probe():
+            while not server.started:
+                await asyncio.sleep(0.01)
+            port = server.servers[0].sockets[0].getsockname()[1]
+            async with aiohttp.ClientSession() as session:
+                while True:
+                    async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                        if response.status == 200:
+                            seen["ready"] = await response.json()
+                            break
+                    await asyncio.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.sleep(0)
+            # 信号处理函数执行后、uvicorn关闭连接之前，/ready已经返回503
+            response = await main.ready()
+            seen["draining"] = (response.status_code, json.loads(response.body)["draining"], server.should_exit)
+
+        prober = asyncio.create_task(probe())
+        await server.serve()
+        await prober
+
+    asyncio.run(run())
+    assert seen["ready"]["ready"] is True and seen["ready"]["pid"] == os.getpid()
+    assert seen["draining"] == (503, True, True)
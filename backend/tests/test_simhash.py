@@ -0,0 +1,37 @@
+from simhash import SIMHASH_BANDS, band_values, hamming_distance, simhash, to_signed
+
+ARTICLE = ("北京大学创办于1898年，初名京师大学堂，是中国第一所国立综合性大学，也是当时中国最高教育行政机关。"
+           "辛亥革命后，于1912年改为现名。学校现有哲学、经济学、法学、教育学、文学、历史学、理学、工学、医学、"
+           "管理学、艺术学等学科门类，在校学生四万余人。") * 3
+
+
+def test_fingerprint_is_signed_64_bit():
+    fingerprint = simhash(ARTICLE)
+    assert -(1 << 63) <= fingerprint < (1 << 63)
+    assert to_signed((1 << 64) - 1) == -1
+
+
+def test_identical_text_after_normalization():
+    assert simhash(ARTICLE) == simhash("  " + ARTICLE.upper() + "\n")
+
+
+def test_small_edit_is_near_duplicate():
+    edited = ARTICLE.replace("四万余人", "四万多人", 1)
+    assert hamming_distance(simhash(ARTICLE), simhash(edited)) <= 3
+
+
+def test_unrelated_text_is_far():
+    other = "Python是一种广泛使用的解释型、高级和通用的编程语言，由吉多·范罗苏姆创造，第一版发布于1991年。" * 3
+    assert hamming_distance(simhash(ARTICLE), simhash(other)) > 10
+
+
+def test_empty_text():
+    assert simhash("") == 0
+
+
+def test_close_fingerprints_share_a_band():
+    fingerprint = simhash(ARTICLE)
+    # 翻转分布在不同段上的 SIMHASH_BANDS-1 位，仍至少有一段完全相同
+    flipped = to_signed((fingerprint & ((1 << 64) - 1)) ^ (1 << 0) ^ (1 << 20) ^ (1 << 40))
+    assert hamming_distance(fingerprint, flipped) == SIMHASH_BANDS - 1
+    assert set(band_values(fingerprint)) & set(band_values(flipped))
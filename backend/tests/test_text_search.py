@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from text_search import build_match_query, query_terms, short_terms
+
+ITEMS = ["北京大学生活指南", "北京天气", "上海大学生活", "大学生活与北京", "Python数据分析"]
+
+
+@pytest.fixture
+def items(db):
+    page_id = db.store_page("https://example.invalid/page", "页面", "")
+    vectors = [np.eye(8, dtype=np.float32)[i].tolist() for i in range(len(ITEMS))]
+    db.store_knowledge(page_id, {"人物": ITEMS}, {"人物": vectors})
+    return {item["content"]: item["id"] for item in db.iter_knowledge()}
+
+
+def _contents(hits):
+    return sorted(hit["content"] for hit in hits)
+
+
+def test_match_query_ands_terms_and_ors_trigrams_within_a_term():
+    assert build_match_query(["大学生活", "python"]) == '("大学生" OR "学生活") AND "python"'
+    assert build_match_query(["北京", "大学"]) == ""
+    assert short_terms(query_terms("北京 大学生活")) == ["北京"]
+
+
+def test_every_term_must_match(db, items):
+    assert db.fts_enabled
+    hits = db.search_knowledge_text("北京 大学生活", limit=10)
+    assert _contents(hits) == ["北京大学生活指南", "大学生活与北京"]
+
+
+@pytest.mark.parametrize("query", ["北京", "北京 天气", "数据 python", "大学生活 北京"])
+def test_fts_and_like_fallback_agree(db, items, query):
+    with_fts = _contents(db.search_knowledge_text(query, limit=10))
+    db.fts_enabled = False
+    assert _contents(db.search_knowledge_text(query, limit=10)) == with_fts
+
+
+def test_search_pages_text_filters_short_terms(db):
+    db.store_page("https://example.invalid/a", "北京", "大学生活指南")
+    db.store_page("https://example.invalid/b", "上海", "大学生活指南")
+    hits = db.search_pages_text("大学生活 北京")
+    assert [hit["url"] for hit in hits] == ["https://example.invalid/a"]
+
+
+def test_hybrid_without_vector_follows_text_ranking(db, items):
+    text = db.search_knowledge_text("大学生活", limit=10)
+    hybrid = db.search_hybrid("大学生活", limit=10)
+    assert [hit["id"] for hit in hybrid] == [hit["id"] for hit in text]
+    assert all(hit["vector_rank"] is None for hit in hybrid)
+
+
+def test_hybrid_fuses_text_and_vector_hits(db, items):
+    # 查询向量与"Python数据分析"完全相同，但它不含关键词，只能由向量这一路召回
+    query_vector = np.eye(8, dtype=np.float32)[4].tolist()
+    hits = db.search_hybrid("北京大学", query_vector=query_vector, limit=10)
+    by_id = {hit["id"]: hit for hit in hits}
+    vector_only = by_id[items["Python数据分析"]]
+    assert vector_only["text_rank"] is None and vector_only["vector_rank"] == 1
+    both = by_id[items["北京大学生活指南"]]
+    assert both["text_rank"] == 1 and both["vector_rank"] is not None
+    assert hits[0]["id"] == items["北京大学生活指南"]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from vector_codec import decode_vector, decode_vector_dict, encode_vector, encode_vector_dict, is_encoded
+
+
+@pytest.fixture
+def vector():
+    return np.random.default_rng(0).standard_normal(1024).astype(np.float32)
+
+
+def test_float32_round_trip_is_exact(vector):
+    blob = encode_vector(vector, 'float32')
+    assert is_encoded(blob)
+    assert decode_vector(blob).dtype == np.float32
+    np.testing.assert_array_equal(decode_vector(blob), vector)
+
+
+def test_float16_round_trip_is_close(vector):
+    blob = encode_vector(vector, 'float16')
+    assert len(blob) < len(encode_vector(vector, 'float32'))
+    np.testing.assert_allclose(decode_vector(blob), vector, rtol=1e-3, atol=1e-3)
+
+
+def test_int8_round_trip_keeps_direction(vector):
+    decoded = decode_vector(encode_vector(vector, 'int8'))
+    assert np.abs(decoded - vector).max() <= np.abs(vector).max() / 127
+    cosine = decoded @ vector / np.linalg.norm(decoded) / np.linalg.norm(vector)
+    assert cosine > 0.999
+
+
+def test_int8_zero_vector():
+    np.testing.assert_array_equal(decode_vector(encode_vector(np.zeros(8), 'int8')), np.zeros(8))
+
+
+def test_legacy_float64_blob_is_decoded(vector):
+    blob = vector.astype(np.float64).tobytes()
+    assert not is_encoded(blob)
+    np.testing.assert_array_equal(decode_vector(blob), vector)
+
+
+@pytest.mark.parametrize("dtype", ['float32', 'float16', 'int8'])
+def test_vector_dict_round_trip(dtype):
+    rng = np.random.default_rng(1)
+    vectors = {"人物": rng.standard_normal((3, 16)).tolist(), "地点": [], "事件": rng.standard_normal((1, 16)).tolist()}
+    decoded = decode_vector_dict(encode_vector_dict(vectors, dtype))
+    assert list(decoded) == list(vectors)
+    for category, items in vectors.items():
+        assert len(decoded[category]) == len(items)
+        if items:
+            np.testing.assert_allclose(decoded[category], items, atol=0.05)
+
+
+def test_vector_dict_rejects_other_blobs(vector):
+    with pytest.raises(ValueError):
+        decode_vector_dict(encode_vector(vector))
@@ -0,0 +1,108 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from vector_index import IVFIndex, VectorIndex
+
+
+def _unit_vectors(count: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def mapped(tmp_path):
+    """从内存映射的.npy加载、100条向量（id 1..100，奇数id为类别a）的索引"""
+    vectors = _unit_vectors(100)
+    index = VectorIndex()
+    index.add(list(range(1, 101)), ["a" if i % 2 else "b" for i in range(1, 101)], vectors)
+    index.save_sidecar(str(tmp_path / "kb.vectors"))
+    return VectorIndex.load_sidecar(str(tmp_path / "kb.vectors"), mmap=True), vectors
+
+
+def test_writes_to_memory_mapped_index_go_to_delta_segment(mapped):
+    index, vectors = mapped
+    fresh = _unit_vectors(2, seed=1)
+    index.add([1000, 5], ["a", "a"], fresh)
+    assert index.is_memory_mapped
+    assert len(index) == 101
+    assert index.search(fresh[0], 1) == [(1000, pytest.approx(1.0))]
+    # id 5被覆盖：旧向量不再命中，新向量从增量段返回
+    assert index.search(vectors[4], 1)[0][0] != 5
+    assert index.search(fresh[1], 1) == [(5, pytest.approx(1.0))]
+
+
+def test_removed_ids_are_not_returned(mapped):
+    index, vectors = mapped
+    index.add([1000], ["a"], vectors[:1])
+    index.remove([1, 1000])
+    assert len(index) == 99
+    assert {id_ for id_, _ in index.search(vectors[0], 5)}.isdisjoint({1, 1000})
+    assert 1 not in set(index.ids())
+
+
+def test_category_filter_covers_delta_segment(mapped):
+    index, vectors = mapped
+    index.add([1000], ["c"], vectors[:1])
+    assert index.search(vectors[0], 3, category="c") == [(1000, pytest.approx(1.0))]
+    assert all(id_ % 2 == 0 for id_, _ in index.search(vectors[0], 10, category="b"))
+
+
+def test_sidecar_round_trip_includes_delta_segment(mapped, tmp_path):
+    index, vectors = mapped
+    index.add([1000], ["c"], vectors[:1])
+    index.remove([2])
+    index.save_sidecar(str(tmp_path / "copy"))
+    reloaded = VectorIndex.load_sidecar(str(tmp_path / "copy"), mmap=True)
+    assert sorted(reloaded.ids()) == sorted(index.ids())
+    assert reloaded.search(vectors[0], 1, category="c") == [(1000, pytest.approx(1.0))]
+
+
+def test_ivf_save_and_memory_mapped_load(tmp_path):
+    vectors = _unit_vectors(400)
+    index = IVFIndex.train(vectors, nlist=8, nprobe=8)
+    index.add(list(range(400)), ["a"] * 400, vectors)
+    path = str(tmp_path / "kb.ivf.npz")
+    index.save(path)
+
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == 400
+    assert loaded.search(vectors[7], 1)[0][0] == 7
+    loaded.add([1000], ["a"], vectors[:1])
+    loaded.remove([0])
+    loaded.save(path)
+    # 旧的向量文件在新索引生效后被删除，目录中只有一份
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".npy")]) == 1
+
+    reloaded = IVFIndex.load(path)
+    assert sorted(reloaded.ids()) == [*range(1, 400), 1000]
+    assert reloaded.search(vectors[0], 1) == [(1000, pytest.approx(1.0))]
+
+
+def test_concurrent_reads_never_see_half_written_rows():
+    # 每个id的向量由id唯一确定，快照里id与向量对不上就说明读到了写了一半的行
+    vectors = _unit_vectors(64)
+    index = VectorIndex(16, initial_capacity=4)
+    index.add(range(64), ["a"] * 64, vectors)
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            for id_ in range(0, 64, 3):
+                index.remove([id_])
+            index.add(range(0, 64, 3), ["a"] * 22, vectors[0:64:3])
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(300):
+            ids, _, matrix = index.rows()
+            assert len(set(ids.tolist())) == len(ids)
+            np.testing.assert_allclose(matrix, vectors[ids], atol=1e-6)
+            for id_, score in index.search(vectors[7], 64):
+                assert score == pytest.approx(float(vectors[7] @ vectors[id_]), abs=1e-5)
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,69 @@
+"""关键词检索的查询构造和多路结果融合
+
+FTS5使用trigram分词器：不依赖分词词典，对中文按三字片段建索引。
+查询中的各个词之间是AND：超过三个字的中文词拆成三字片段，片段之间取OR，
+由BM25让包含整个词的文档排在前面；其他词按短语匹配。
+不足三个字的词（包括最常见的两字中文词）无法走索引：与可索引的词一起出现时作为LIKE条件
+过滤FTS的结果，查询中只有这样的词时由调用方退回全表LIKE扫描。
+"""
+import re
+from typing import Dict, Hashable, List, Sequence
+
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+TRIGRAM = 3
+
+
+def query_terms(query: str) -> List[str]:
+    """按空白拆分查询，去掉空词和重复词"""
+    return list(dict.fromkeys(term for term in query.split() if term))
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def build_match_query(terms: Sequence[str]) -> str:
+    """把可索引的词（至少三个字）转成FTS5 MATCH表达式，词与词之间AND，没有可索引的词时返回空串
+
+    不足三个字的词不在表达式中，调用方用short_terms取出后另加LIKE条件。
+    """
+    parts = []
+    for term in terms:
+        if len(term) < TRIGRAM:
+            continue
+        if _CJK_RE.search(term) and len(term) > TRIGRAM:
+            grams = dict.fromkeys(term[i:i + TRIGRAM] for i in range(len(term) - TRIGRAM + 1))
+            parts.append('(' + ' OR '.join(_quote(gram) for gram in grams) + ')')
+        else:
+            parts.append(_quote(term))
+    return ' AND '.join(parts)
+
+
+def short_terms(terms: Sequence[str]) -> List[str]:
+    """不足三个字、无法走trigram索引的词，需要用LIKE匹配"""
+    return [term for term in terms if len(term) < TRIGRAM]
+
+
+def make_snippet(text: str, terms: Sequence[str], width: int = 64) -> str:
+    """截取第一个命中词附近的一段文本（trigram分词下FTS5自带的snippet会重复输出重叠的片段）"""
+    text = text or ''
+    positions = [pos for pos in (text.find(term) for term in terms) if pos >= 0]
+    if not positions:
+        return text[:width]
+    start = max(0, min(positions) - width // 4)
+    snippet = text[start:start + width]
+    return ('…' if start > 0 else '') + snippet + ('…' if start + width < len(text) else '')
+
+
+def escape_like(term: str) -> str:
+    """转义LIKE通配符，配合 ESCAPE '\\' 使用"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> Dict[Hashable, float]:
+    """倒数排名融合：每一路排名第r的结果得 1/(k+r)，返回 {id: 融合得分}"""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return scores
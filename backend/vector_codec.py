@@ -0,0 +1,108 @@
+"""向量的二进制存储格式
+
+单个向量（knowledge_items.vector）：
+
+    b'KV' | 版本(1字节) | 类型(1字节) | 维度(uint32) | [int8时: scale(float32)] | 数据
+
+类型：1=float32，2=float16，3=int8（按向量的最大绝对值做对称标量量化）。
+没有头部的BLOB是旧版 np.array(vector).tobytes() 写入的float64，解码时仍然兼容。
+
+向量字典（knowledge.vectors_blob，{类别: [向量, ...]}）：
+
+    b'KD' | 版本(1字节) | JSON头长度(uint32) | JSON头 [[类别, 个数], ...] | 逐个编码的向量
+"""
+import json
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+import config
+
+VECTOR_MAGIC = b'KV'
+DICT_MAGIC = b'KD'
+FORMAT_VERSION = 1
+
+DTYPE_CODES = {'float32': 1, 'float16': 2, 'int8': 3}
+_CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+_HEADER = struct.Struct('<2sBBI')
+_SCALE = struct.Struct('<f')
+_DICT_HEADER = struct.Struct('<2sBI')
+
+
+def encode_vector(vector, dtype: str = None) -> bytes:
+    """把向量编码为带头部的BLOB"""
+    dtype = dtype or config.VECTOR_DTYPE
+    code = DTYPE_CODES[dtype]
+    array = np.asarray(vector, dtype=np.float32).reshape(-1)
+    header = _HEADER.pack(VECTOR_MAGIC, FORMAT_VERSION, code, array.size)
+    if dtype == 'int8':
+        max_abs = float(np.abs(array).max()) if array.size else 0.0
+        scale = max_abs / 127.0 if max_abs else 1.0
+        quantized = np.clip(np.rint(array / scale), -127, 127).astype(np.int8)
+        return header + _SCALE.pack(scale) + quantized.tobytes()
+    return header + array.astype(dtype).tobytes()
+
+
+def _payload_size(code: int, dim: int) -> int:
+    return dim * {1: 4, 2: 2, 3: 1}[code] + (_SCALE.size if code == 3 else 0)
+
+
+def is_encoded(blob: bytes) -> bool:
+    """BLOB是否为带头部的新格式（头部与长度都要吻合，避免把旧float64数据误判）"""
+    if len(blob) < _HEADER.size:
+        return False
+    magic, version, code, dim = _HEADER.unpack_from(blob)
+    return (magic == VECTOR_MAGIC and version == FORMAT_VERSION and code in _CODE_DTYPES
+            and len(blob) == _HEADER.size + _payload_size(code, dim))
+
+
+def decode_vector(blob: bytes) -> np.ndarray:
+    """把BLOB解码为float32向量，兼容旧版float64格式"""
+    if not is_encoded(blob):
+        return np.frombuffer(blob, dtype=np.float64).astype(np.float32)
+    return _decode_at(blob, 0)[0]
+
+
+def _decode_at(blob: bytes, offset: int) -> tuple:
+    """从offset处解码一个向量，返回 (向量, 下一个向量的offset)"""
+    magic, version, code, dim = _HEADER.unpack_from(blob, offset)
+    if magic != VECTOR_MAGIC or code not in _CODE_DTYPES:
+        raise ValueError("Corrupted vector blob")
+    offset += _HEADER.size
+    if code == 3:
+        (scale,) = _SCALE.unpack_from(blob, offset)
+        offset += _SCALE.size
+        vector = np.frombuffer(blob, dtype=np.int8, count=dim, offset=offset).astype(np.float32) * scale
+        return vector, offset + dim
+    dtype = np.dtype(_CODE_DTYPES[code])
+    vector = np.frombuffer(blob, dtype=dtype, count=dim, offset=offset).astype(np.float32)
+    return vector, offset + dim * dtype.itemsize
+
+
+def encode_vector_dict(vectors: Dict[str, List[List[float]]], dtype: str = None) -> bytes:
+    """把 {类别: [向量, ...]} 编码为一个BLOB"""
+    layout = [[category, len(items)] for category, items in vectors.items()]
+    header = json.dumps(layout, ensure_ascii=False).encode('utf-8')
+    parts = [_DICT_HEADER.pack(DICT_MAGIC, FORMAT_VERSION, len(header)), header]
+    for items in vectors.values():
+        parts.extend(encode_vector(vector, dtype) for vector in items)
+    return b''.join(parts)
+
+
+def decode_vector_dict(blob: bytes) -> Dict[str, List[List[float]]]:
+    """解码encode_vector_dict生成的BLOB"""
+    magic, version, header_size = _DICT_HEADER.unpack_from(blob)
+    if magic != DICT_MAGIC:
+        raise ValueError("Not a vector dict blob")
+    offset = _DICT_HEADER.size
+    layout = json.loads(blob[offset:offset + header_size].decode('utf-8'))
+    offset += header_size
+    result = {}
+    for category, count in layout:
+        items = []
+        for _ in range(count):
+            vector, offset = _decode_at(blob, offset)
+            items.append(vector.tolist())
+        result[category] = items
+    return result
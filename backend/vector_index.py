@@ -0,0 +1,474 @@
+"""内存向量索引
+
+- VectorIndex：精确检索。knowledge_items中的向量预先归一化后放进一块连续的float32矩阵，
+  查询时一次矩阵-向量乘积得到全部余弦相似度，再用argpartition取top-k。
+- IVFIndex：近似检索（IVF-flat），只扫描离查询最近的nprobe个倒排列表，适合数百万向量。
+"""
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行做L2归一化，零向量保持为零"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回scores中最大的k个元素的下标，按分数降序"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class VectorIndex:
+    """精确（暴力）余弦相似度索引，支持增量插入/删除和按类别过滤
+
+    读写都持有同一把锁：删除会把最后一行原地移到被删除的位置，读操作如果不加锁可能看到
+    写了一半的行或已经失效的_size。查询只在锁内完成基础段的矩阵乘积和top-k，
+    rows()和ids()在锁内复制出快照，调用方拿到的数据之后不会再被修改。
+
+    从sidecar文件以内存映射方式加载时，映射的矩阵（基础段）始终只读，由各进程共享：
+    之后加入的向量放进堆上的一个小增量段，删除或覆盖基础段中的向量只做标记，
+    查询时两段各取top-k再合并，不会把整个矩阵复制到进程自己的内存中。
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self._capacity = initial_capacity
+        self._size = 0
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32) if dim else None
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._category_codes = np.zeros(initial_capacity, dtype=np.int32)
+        self._categories: Dict[str, int] = {}
+        self._positions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._readonly = False
+        # 只读基础段上被删除的行，以及新加入向量所在的增量段
+        self._dead: Optional[np.ndarray] = None
+        self._dead_count = 0
+        self._delta: Optional["VectorIndex"] = None
+
+    def __len__(self) -> int:
+        return self._size - self._dead_count + (len(self._delta) if self._delta is not None else 0)
+
+    @property
+    def is_memory_mapped(self) -> bool:
+        return isinstance(self._matrix, np.memmap)
+
+    def _category_code(self, category: str) -> int:
+        code = self._categories.get(category)
+        if code is None:
+            code = self._categories[category] = len(self._categories)
+        return code
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        codes = np.zeros(capacity, dtype=np.int32)
+        codes[:self._size] = self._category_codes[:self._size]
+        self._matrix, self._ids, self._category_codes = matrix, ids, codes
+        self._capacity = capacity
+
+    def _kill(self, id_: int) -> bool:
+        """把只读基础段中的一行标记为已删除（需持有锁）"""
+        position = self._positions.pop(id_, None)
+        if position is None:
+            return False
+        if self._dead is None:
+            self._dead = np.zeros(self._size, dtype=bool)
+        self._dead[position] = True
+        self._dead_count += 1
+        return True
+
+    def add(self, ids: Iterable[int], categories: Iterable[str], vectors) -> int:
+        """批量加入向量（id已存在时覆盖），返回实际加入的条数"""
+        ids = list(ids)
+        categories = list(categories)
+        if not ids:
+            return 0
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            if vectors.shape[1] != self.dim:
+                logger.warning(f"Skipping {len(ids)} vectors with dim {vectors.shape[1]} (index dim {self.dim})")
+                return 0
+
+            if self._readonly:
+                for id_ in ids:
+                    self._kill(id_)
+                if self._delta is None:
+                    self._delta = VectorIndex(self.dim, initial_capacity=16)
+                return self._delta.add(ids, categories, vectors)
+
+            new_rows = [i for i, id_ in enumerate(ids) if id_ not in self._positions]
+            self._ensure_capacity(self._size + len(new_rows))
+            for i, id_ in enumerate(ids):
+                position = self._positions.get(id_)
+                if position is None:
+                    position = self._positions[id_] = self._size
+                    self._size += 1
+                self._matrix[position] = vectors[i]
+                self._ids[position] = id_
+                self._category_codes[position] = self._category_code(categories[i])
+        return len(ids)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """删除向量：把最后一行移到被删除的位置（只读基础段中的行只做标记），返回删除的条数"""
+        removed = 0
+        with self._lock:
+            if self._readonly:
+                ids = list(ids)
+                removed = sum(self._kill(id_) for id_ in ids)
+                if self._delta is not None:
+                    removed += self._delta.remove(ids)
+                return removed
+            for id_ in ids:
+                position = self._positions.pop(id_, None)
+                if position is None:
+                    continue
+                last = self._size - 1
+                if position != last:
+                    moved_id = int(self._ids[last])
+                    self._matrix[position] = self._matrix[last]
+                    self._ids[position] = moved_id
+                    self._category_codes[position] = self._category_codes[last]
+                    self._positions[moved_id] = position
+                self._size -= 1
+                removed += 1
+        return removed
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            ids = list(self._positions)
+            delta = self._delta
+        if delta is not None:
+            ids.extend(delta.ids())
+        return ids
+
+    def rows(self) -> tuple:
+        """全部有效向量：(id数组, 类别名列表, 矩阵)，包括增量段，不包括已删除的行"""
+        with self._lock:
+            size = self._size
+            names = {code: name for name, code in self._categories.items()}
+            ids, codes = self._ids[:size], self._category_codes[:size]
+            matrix = self._matrix[:size] if size else np.zeros((0, self.dim or 0), dtype=np.float32)
+            if self._dead is not None and self._dead_count:
+                live = ~self._dead[:size]
+                ids, codes, matrix = ids[live], codes[live], matrix[live]
+            elif not self._readonly:
+                # 可写的数组会被之后的add/remove原地修改，复制出快照；只读基础段不会变，不必复制
+                ids, codes, matrix = ids.copy(), codes.copy(), matrix.copy()
+            delta = self._delta
+        categories = [names[int(code)] for code in codes]
+        if delta is not None and len(delta):
+            delta_ids, delta_categories, delta_matrix = delta.rows()
+            ids = np.concatenate([ids, delta_ids])
+            categories += delta_categories
+            matrix = np.concatenate([matrix, delta_matrix])
+        return ids, categories, np.ascontiguousarray(matrix)
+
+    def _view(self, category: Optional[str]) -> tuple:
+        """返回基础段的 (矩阵, id数组, 已删除行的掩码或None)，按类别过滤时只包含该类别的行（需持有锁）"""
+        size = self._size
+        matrix, ids = self._matrix[:size], self._ids[:size]
+        dead = self._dead[:size] if self._dead is not None and self._dead_count else None
+        if category is not None:
+            code = self._categories.get(category)
+            if code is None:
+                return matrix[:0], ids[:0], None
+            mask = self._category_codes[:size] == code
+            matrix, ids = matrix[mask], ids[mask]
+            if dead is not None:
+                dead = dead[mask]
+        return matrix, ids, dead
+
+    def save_sidecar(self, prefix: str):
+        """导出为 <prefix>.npy（归一化后的float32矩阵）和 <prefix>.meta.npz（id和类别）"""
+        ids, categories, matrix = self.rows()
+        names = sorted(set(categories))
+        code_of = {name: code for code, name in enumerate(names)}
+        codes = np.array([code_of[name] for name in categories], dtype=np.int32)
+        _atomic_write(f"{prefix}.npy", lambda f: np.save(f, matrix))
+        _atomic_write(f"{prefix}.meta.npz", lambda f: np.savez(f, ids=ids, codes=codes,
+                                                               names=np.array(names, dtype=str)))
+
+    @classmethod
+    def load_sidecar(cls, prefix: str, mmap: bool = True) -> "VectorIndex":
+        """从sidecar文件加载；mmap为True时矩阵以只读内存映射方式共享"""
+        matrix = np.load(f"{prefix}.npy", mmap_mode='r' if mmap else None)
+        with np.load(f"{prefix}.meta.npz") as meta:
+            ids, codes, names = meta['ids'], meta['codes'], meta['names'].tolist()
+        return cls._from_arrays(matrix, ids, codes, names, readonly=mmap)
+
+    @classmethod
+    def _from_arrays(cls, matrix: np.ndarray, ids: np.ndarray, codes: np.ndarray, names: List[str],
+                     readonly: bool) -> "VectorIndex":
+        """用已归一化的矩阵构造索引；readonly时matrix作为只读基础段，不会被写入"""
+        index = cls(matrix.shape[1] if matrix.ndim == 2 and matrix.shape[0] else None, initial_capacity=0)
+        index._matrix, index._ids, index._category_codes = matrix, ids, codes
+        index._capacity = index._size = len(ids)
+        index._categories = {name: code for code, name in enumerate(names)}
+        index._positions = {int(id_): position for position, id_ in enumerate(ids.tolist())}
+        index._readonly = readonly
+        return index
+
+    def search(self, query_vector, k: int = 5, category: Optional[str] = None) -> List[Tuple[int, float]]:
+        """返回与查询向量最相似的k个 (id, 相似度)"""
+        return self.search_batch([query_vector], k, category)[0]
+
+    def search_batch(self, query_vectors, k: int = 5,
+                     category: Optional[str] = None) -> List[List[Tuple[int, float]]]:
+        """批量查询：一次矩阵乘积算出所有查询的相似度"""
+        queries = normalize_rows(query_vectors)
+        results = [[] for _ in queries]
+        with self._lock:
+            delta = self._delta
+            if self._size and self.dim is not None:
+                matrix, ids, dead = self._view(category)
+                scores = queries @ matrix.T
+                if dead is not None:
+                    scores[:, dead] = -np.inf
+                for result, row in zip(results, scores):
+                    best = top_k(row, k)
+                    result.extend((int(ids[i]), float(row[i])) for i in best if row[i] != -np.inf)
+        if delta is not None and len(delta):
+            for result, extra in zip(results, delta.search_batch(queries, k, category)):
+                result.extend(extra)
+                result.sort(key=lambda item: item[1], reverse=True)
+                del result[k:]
+        return results
+
+
+def _atomic_write(path: str, writer):
+    """写入同目录下的唯一临时文件后原子替换，多个进程同时写同一路径也不会互相覆盖出半个文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """分块计算每个向量最近的质心，避免一次性生成 N x nlist 的大矩阵"""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        assignment[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return assignment
+
+
+def _group_rows(labels: np.ndarray):
+    """按标签分组，依次产出 (标签, 行号数组)"""
+    order = np.argsort(labels, kind='stable')
+    groups, starts = np.unique(labels[order], return_index=True)
+    stops = np.append(starts[1:], len(order))
+    for label, start, stop in zip(groups, starts, stops):
+        yield int(label), order[start:stop]
+
+
+def train_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10,
+                 sample_size: int = 50000, seed: int = 0) -> np.ndarray:
+    """在归一化向量上训练球面k-means，返回 (nlist, dim) 的归一化质心"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_to_centroids(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        clusters, starts = np.unique(assignment[order], return_index=True)
+        # 空簇保留原质心
+        sums = centroids.copy()
+        sums[clusters] = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """IVF-flat近似最近邻索引
+
+    用k-means质心把向量分到nlist个倒排列表，每个列表是一个VectorIndex。
+    查询时只扫描与查询最相近的nprobe个列表：nprobe越大召回越高、延迟越大，
+    nprobe等于nlist时与精确检索结果相同。
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = 8, trained_size: int = 0):
+        self.centroids = normalize_rows(centroids)
+        self.dim = self.centroids.shape[1]
+        self.nprobe = nprobe
+        self.trained_size = trained_size
+        self._lists = [VectorIndex(self.dim, initial_capacity=16) for _ in range(len(self.centroids))]
+        self._list_of: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self._list_of)
+
+    @classmethod
+    def train(cls, vectors, nlist: int = 0, nprobe: int = 8) -> "IVFIndex":
+        """用一批向量训练质心；nlist为0时取 4*sqrt(N)"""
+        vectors = normalize_rows(vectors)
+        if not nlist:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+        return cls(train_kmeans(vectors, nlist), nprobe=nprobe, trained_size=len(vectors))
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._list_of)
+
+    def add(self, ids: Iterable[int], categories: Iterable[str], vectors) -> int:
+        ids = list(ids)
+        categories = list(categories)
+        if not ids:
+            return 0
+        vectors = normalize_rows(vectors)
+        if vectors.shape[1] != self.dim:
+            logger.warning(f"Skipping {len(ids)} vectors with dim {vectors.shape[1]} (index dim {self.dim})")
+            return 0
+        assignment = assign_to_centroids(vectors, self.centroids)
+        with self._lock:
+            # id已存在但被分到其他列表时，先从旧列表删除
+            for id_, list_no in zip(ids, assignment):
+                old = self._list_of.get(id_)
+                if old is not None and old != list_no:
+                    self._lists[old].remove([id_])
+                self._list_of[id_] = int(list_no)
+            for list_no, rows in _group_rows(assignment):
+                self._lists[list_no].add([ids[i] for i in rows], [categories[i] for i in rows], vectors[rows])
+        return len(ids)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        removed = 0
+        with self._lock:
+            for id_ in ids:
+                list_no = self._list_of.pop(id_, None)
+                if list_no is not None:
+                    removed += self._lists[list_no].remove([id_])
+        return removed
+
+    def search(self, query_vector, k: int = 5, category: Optional[str] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        return self.search_batch([query_vector], k, category, nprobe)[0]
+
+    def search_batch(self, query_vectors, k: int = 5, category: Optional[str] = None,
+                     nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        queries = normalize_rows(query_vectors)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe_lists = [top_k(row, nprobe) for row in queries @ self.centroids.T]
+
+        results = []
+        for query, lists in zip(queries, probe_lists):
+            candidates = []
+            for list_no in lists:
+                candidates.extend(self._lists[list_no].search(query, k, category))
+            candidates.sort(key=lambda item: item[1], reverse=True)
+            results.append(candidates[:k])
+        return results
+
+    def save(self, path: str):
+        """保存为path（.npz：质心、id、列表号、类别）和同目录下唯一命名的向量文件（.npy，按列表顺序排列）
+
+        向量文件先写好，path原子替换后才指向它，随后删除旧的向量文件；多个进程同时保存不会得到拼接出来的文件，
+        已经内存映射了旧文件的进程也不受影响。
+        """
+        ids, list_nos, categories, vectors = [], [], [], []
+        for list_no, posting in enumerate(self._lists):
+            list_ids, list_categories, matrix = posting.rows()
+            if not len(list_ids):
+                continue
+            ids.append(list_ids)
+            list_nos.append(np.full(len(list_ids), list_no, dtype=np.int32))
+            categories.extend(list_categories)
+            vectors.append(matrix)
+        names = sorted(set(categories))
+        code_of = {name: code for code, name in enumerate(names)}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        stem = os.path.basename(path[:-4] if path.endswith('.npz') else path)
+        fd, vectors_path = tempfile.mkstemp(dir=directory, prefix=stem + '.', suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32))
+            previous = _ivf_vectors_path(path)
+            _atomic_write(path, lambda f: np.savez(
+                f,
+                centroids=self.centroids,
+                nprobe=np.array(self.nprobe),
+                trained_size=np.array(self.trained_size),
+                ids=np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64),
+                list_nos=np.concatenate(list_nos) if list_nos else np.zeros(0, dtype=np.int32),
+                category_codes=np.array([code_of[name] for name in categories], dtype=np.int32),
+                category_names=np.array(names, dtype=str),
+                vectors_file=np.array(os.path.basename(vectors_path)),
+            ))
+        except BaseException:
+            os.unlink(vectors_path)
+            raise
+        if previous and previous != vectors_path and os.path.exists(previous):
+            os.unlink(previous)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        """加载save保存的索引；mmap为True时各倒排列表的向量以只读内存映射方式共享，新加入的向量放在增量段"""
+        with np.load(path) as data:
+            index = cls(data['centroids'], nprobe=int(data['nprobe']), trained_size=int(data['trained_size']))
+            ids, list_nos = data['ids'], data['list_nos']
+            if 'vectors' in data.files:
+                # 旧格式：向量直接存在.npz中，只能整体读入堆内存
+                categories, vectors = data['categories'], data['vectors']
+                for list_no, rows in _group_rows(list_nos):
+                    index._lists[list_no].add(ids[rows].tolist(), categories[rows].tolist(), vectors[rows])
+                    for id_ in ids[rows].tolist():
+                        index._list_of[id_] = int(list_no)
+                return index
+            codes, names = data['category_codes'], data['category_names'].tolist()
+        vectors = np.load(_ivf_vectors_path(path), mmap_mode='r' if mmap else None)
+        # 保存时按列表顺序写入，每个列表是连续的一段，切片仍是内存映射
+        present, starts = np.unique(list_nos, return_index=True)
+        stops = np.append(starts[1:], len(list_nos))
+        for list_no, start, stop in zip(present.tolist(), starts.tolist(), stops.tolist()):
+            index._lists[list_no] = VectorIndex._from_arrays(vectors[start:stop], ids[start:stop],
+                                                             codes[start:stop], names, readonly=mmap)
+        index._list_of = dict(zip(ids.tolist(), list_nos.tolist()))
+        return index
+
+
+def _ivf_vectors_path(path: str) -> Optional[str]:
+    """IVF索引文件当前指向的向量文件，旧格式或文件不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if 'vectors_file' not in data.files:
+            return None
+        return os.path.join(os.path.dirname(os.path.abspath(path)), str(data['vectors_file']))
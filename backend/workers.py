@@ -0,0 +1,78 @@
+"""多worker部署时进程之间的协调
+
+- prepare_shared_state：启动worker之前在父进程中执行一次的准备工作（建表迁移、补建图谱、
+  导出/训练向量索引），避免N个worker同时做同一件事，并让各worker以内存映射方式共享向量文件；
+- WorkerLock：基于文件锁的互斥，用于只让一个worker运行入库流水线。进程退出（包括崩溃）时
+  操作系统自动释放锁，其他worker可以接手。
+"""
+import logging
+import os
+
+import config
+from db_manager import DBManager
+from vector_index import VectorIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有fcntl，只支持单进程部署
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerLock:
+    """非阻塞的进程间排他锁，path为None时总能获得（单进程、内存数据库）"""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.held = False
+        self._file = None
+
+    def acquire(self) -> bool:
+        """尝试获得锁，已被其他进程持有时立即返回False"""
+        if self.held:
+            return True
+        if self.path is not None and fcntl is not None:
+            f = open(self.path, 'a+')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            # 记下持有者的pid，便于排查
+            f.seek(0)
+            f.truncate()
+            f.write(str(os.getpid()))
+            f.flush()
+            self._file = f
+        self.held = True
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.held = False
+
+
+def prepare_shared_state(db_path: str = None) -> dict:
+    """在启动worker之前执行：完成数据库迁移和图谱补建，并把向量索引落盘供各worker加载
+
+    精确索引导出为 <db>.vectors.npy，各worker以只读内存映射方式打开，向量只在页缓存中存一份；
+    IVF索引训练一次并保存，worker以只读内存映射方式加载，不再各自训练或写回。
+    """
+    db = DBManager(db_path or config.DB_PATH, persist_vector_index=True)
+    try:
+        graph_pages = db.backfill_knowledge_graph()
+        index = db.vector_index
+        vectors = len(index)
+        if isinstance(index, VectorIndex):
+            if config.VECTOR_SIDECAR and db.vector_sidecar_prefix and vectors:
+                db.export_vector_sidecar()
+        else:
+            db.save_vector_index()
+    finally:
+        db.close()
+    logger.info(f"Prepared shared state: {vectors} vectors, {graph_pages} pages added to the knowledge graph")
+    return {'vectors': vectors, 'graph_pages': graph_pages}